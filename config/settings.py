@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -78,9 +79,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # トランザクションの開始時に書き込みロックを取る（読んでから書く途中でロックを取れずに失敗しない）
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+        },
     }
 }
 
+# SQLite settings
+# API・task_worker・run_task・MCPサーバーが同じDBに書き込むので、接続ごとにPRAGMAを設定する（todo/sqlite.py）
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal')
+# ロックが解放されるまで待つ時間（ミリ秒）
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '10000'))
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'normal')
+# メモリマップするサイズ（バイト）と1接続あたりのページキャッシュ（負の値はKiB）
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', '-65536'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -128,8 +143,106 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # JSONはorjsonでエンコード・デコードする（todo/renderers.py）
+    'DEFAULT_RENDERER_CLASSES': [
+        'todo.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'todo.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+# ブラウザで閲覧できるAPI（HTMLの描画が重い）は開発時のみ
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
 
 # Worktree settings
-import os
 WORKTREE_ROOT = os.environ.get('WORKTREE_ROOT', os.path.expanduser('~/work/worktrees'))
+
+# Extension pool settings
+# 例: http://127.0.0.1:8765 （python manage.py extension_pool で起動したプール）
+EXTENSION_POOL_URL = os.environ.get('EXTENSION_POOL_URL', '')
+EXTENSION_POOL_IDLE_TIMEOUT = int(os.environ.get('EXTENSION_POOL_IDLE_TIMEOUT', '600'))
+EXTENSION_POOL_HEALTH_INTERVAL = int(os.environ.get('EXTENSION_POOL_HEALTH_INTERVAL', '30'))
+
+# Agent output settings
+# エージェントのstdout/stderrはTodoごとに {AGENT_LOG_ROOT}/todo-{id}/ に出力する
+AGENT_LOG_ROOT = os.environ.get('AGENT_LOG_ROOT', str(BASE_DIR / 'logs'))
+# Todo.output・コミットメッセージに使うstdout末尾のバイト数
+AGENT_OUTPUT_TAIL_BYTES = int(os.environ.get('AGENT_OUTPUT_TAIL_BYTES', '65536'))
+
+# Context bundle settings
+# 有効にすると参照用ファイルの内容をレシピに添付する（run_task --context-bundle でも有効化可能）
+CONTEXT_BUNDLE_ENABLED = os.environ.get('CONTEXT_BUNDLE_ENABLED', '') in ('1', 'true', 'True')
+CONTEXT_BUNDLE_MAX_FILE_BYTES = int(os.environ.get('CONTEXT_BUNDLE_MAX_FILE_BYTES', str(256 * 1024)))
+CONTEXT_BUNDLE_MAX_BYTES = int(os.environ.get('CONTEXT_BUNDLE_MAX_BYTES', str(1024 * 1024)))
+# blobハッシュをキーにしたキャッシュの保存先と合計サイズ上限
+CONTEXT_STORE_ROOT = os.environ.get('CONTEXT_STORE_ROOT', os.path.expanduser('~/.cache/mcp-todo/context'))
+CONTEXT_STORE_MAX_BYTES = int(os.environ.get('CONTEXT_STORE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Emoji settings
+# 有効な場合、コミットは仮の絵文字で即座に行い、LLMによる絵文字選択はバックグラウンドで差し替える
+EMOJI_ASYNC = os.environ.get('EMOJI_ASYNC', '1') in ('1', 'true', 'True')
+# 入力テキストのハッシュをキーにした絵文字選択結果のキャッシュ
+EMOJI_CACHE_ROOT = os.environ.get('EMOJI_CACHE_ROOT', os.path.expanduser('~/.cache/mcp-todo/emoji'))
+EMOJI_CACHE_MAX_BYTES = int(os.environ.get('EMOJI_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# Commit settings
+# 有効にするとedit_filesが指定されたTodoではその範囲の変更のみコミットする（run_task --edit-files-only でも有効化可能）
+COMMIT_EDIT_FILES_ONLY = os.environ.get('COMMIT_EDIT_FILES_ONLY', '') in ('1', 'true', 'True')
+
+# Validation settings
+# run_taskがエージェント終了後に実行するvalidation_commandのタイムアウト（秒）
+VALIDATION_TIMEOUT = int(os.environ.get('VALIDATION_TIMEOUT', '600'))
+
+# Cache settings
+# 'git': ブランチ・worktree一覧のキャッシュ（.git以下のmtimeで無効化、APIのワーカープロセス間で共有）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'git': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('GIT_CACHE_ROOT', os.path.expanduser('~/.cache/mcp-todo/git')),
+        'TIMEOUT': int(os.environ.get('GIT_CACHE_TIMEOUT', '86400')),
+    },
+}
+
+# Async git views
+# gitを実行するAPI（worktrees, branches, create_branch など）の1リポジトリあたりのgitの同時実行数
+# イベントループ単位で制限するので、ASGIで動かした場合のみ有効（todo/async_views.py）
+GIT_REPO_CONCURRENCY = int(os.environ.get('GIT_REPO_CONCURRENCY', '4'))
+
+# Pagination settings
+# Todo一覧で ?count=1 を指定した場合の総件数のキャッシュ秒数
+TODO_COUNT_CACHE_TTL = int(os.environ.get('TODO_COUNT_CACHE_TTL', '30'))
+
+# Dashboard settings
+# /api/dashboard/ の集計結果のキャッシュ秒数（Todo・TodoListの更新でも無効になる）
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', '5'))
+
+# Todo events (SSE) settings
+# ステータス変更の通知を追記するファイル（task_worker・MCPサーバー・APIで共有する。空なら通知しない）
+TODO_EVENTS_PATH = os.environ.get('TODO_EVENTS_PATH', os.path.expanduser('~/.cache/mcp-todo/events.jsonl'))
+# このサイズ（バイト）を超えたら ".1" にローテーションする
+TODO_EVENTS_MAX_BYTES = int(os.environ.get('TODO_EVENTS_MAX_BYTES', str(1024 * 1024)))
+# SSEのストリームがファイルの追記を確認する間隔（秒）
+TODO_EVENTS_POLL_INTERVAL = float(os.environ.get('TODO_EVENTS_POLL_INTERVAL', '0.5'))
+# イベントがない場合にコメントを送る間隔（秒、プロキシによる切断を防ぐ）
+TODO_EVENTS_KEEPALIVE = float(os.environ.get('TODO_EVENTS_KEEPALIVE', '15'))
+# 切断時にブラウザが再接続するまでの時間（ミリ秒）
+TODO_EVENTS_RETRY_MS = int(os.environ.get('TODO_EVENTS_RETRY_MS', '3000'))
+
+# Conditional GET settings
+# アーカイブ済みTodoの詳細APIに付ける Cache-Control の max-age（秒）
+# （完了済みのTodoは再開されうるので no-cache）
+TODO_ARCHIVED_MAX_AGE = int(os.environ.get('TODO_ARCHIVED_MAX_AGE', '3600'))
+
+# Archive settings
+# 終了からこの日数が経ったTodoをtask_workerが ArchivedTodo に移す（0なら自動ではアーカイブしない、todo/archive.py）
+TODO_ARCHIVE_DAYS = int(os.environ.get('TODO_ARCHIVE_DAYS', '0'))
+# 1トランザクションで移す件数（書き込みロックを持つ時間を短くする）
+TODO_ARCHIVE_BATCH_SIZE = int(os.environ.get('TODO_ARCHIVE_BATCH_SIZE', '200'))
+# task_workerがアーカイブ対象を確認する間隔（秒）
+TODO_ARCHIVE_INTERVAL = int(os.environ.get('TODO_ARCHIVE_INTERVAL', '3600'))
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Agent, Todo, TodoList
+from .models import Agent, ArchivedTodo, Todo, TodoList
+from .search import search_todos
 
 
 @admin.register(TodoList)
@@ -11,13 +12,32 @@ class TodoListAdmin(admin.ModelAdmin):
 
 @admin.register(Agent)
 class AgentAdmin(admin.ModelAdmin):
-    list_display = ["name", "created_at", "updated_at"]
+    list_display = ["name", "runner", "created_at", "updated_at"]
     search_fields = ["name", "system_message"]
 
 
 @admin.register(Todo)
 class TodoAdmin(admin.ModelAdmin):
-    list_display = ["id", "todo_list", "agent", "prompt", "status", "validation_command", "created_at"]
+    list_display = ["id", "todo_list", "agent", "prompt", "status", "validation_command", "validation_status", "created_at"]
     search_fields = ["prompt", "output", "context"]
-    list_filter = ["status", "created_at", "agent"]
+    list_filter = ["status", "validation_status", "created_at", "agent"]
     filter_horizontal = []
+
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE '%q%' で本文を全件読む代わりに全文検索インデックスを使う
+        if not search_term.strip():
+            return queryset, False
+        return search_todos(queryset, search_term), False
+
+
+@admin.register(ArchivedTodo)
+class ArchivedTodoAdmin(admin.ModelAdmin):
+    list_display = ["id", "todo_list", "agent", "title", "status", "finished_at", "archived_at"]
+    list_filter = ["status", "archived_at"]
+
+    # アーカイブは読み取り専用
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
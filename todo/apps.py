@@ -1,5 +1,37 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from .search import ensure_search_index
+
+    ensure_search_index(using)
+
+
+def ensure_version_triggers(sender, using, **kwargs):
+    from .conditional import ensure_version_triggers
+
+    ensure_version_triggers(using)
 
 
 class TodoConfig(AppConfig):
     name = 'todo'
+
+    def ready(self):
+        # 複数のプロセスが同じSQLiteに書き込むためのPRAGMA（WAL・busy_timeoutなど）
+        from .sqlite import configure_connection
+
+        connection_created.connect(configure_connection)
+
+        # テーブルを作り直すマイグレーションで消えた全文検索のトリガーを復元する
+        post_migrate.connect(ensure_search_index, sender=self)
+        # 同じく一覧のETag・ダッシュボードのキャッシュキーに使う更新カウンタのトリガーを復元する
+        post_migrate.connect(ensure_version_triggers, sender=self)
+
+        # ステータス変更をSSEのストリームに通知する
+        from . import events
+        from .models import Todo
+
+        post_save.connect(events.on_todo_saved, sender=Todo)
+        post_delete.connect(events.on_todo_deleted, sender=Todo)
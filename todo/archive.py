@@ -0,0 +1,81 @@
+"""
+完了済みTodoのアーカイブ
+
+完了・キャンセル・エラー・タイムアウトのTodoは output の全文を持ったまま todo_todo に残り続け、
+キューや一覧のクエリが読むテーブルが大きくなる。終了から一定日数が経ったTodoを
+ArchivedTodo（todo_archivedtodo）に移し、todo_todo を小さく保つ（ページキャッシュに収まるように）。
+
+- 1バッチ（batch_size 件）ずつ INSERT ... SELECT と DELETE を1つの短いトランザクションで実行する。
+  バッチの間は書き込みロックを手放すので、task_worker・APIの書き込みを長く待たせない
+- 移したTodoは ?archived=1 を付けると一覧・詳細APIで読める（読み取り専用）
+- 全文検索の索引（todo_todo_fts）からはDELETEのトリガーで消える
+
+手動: python manage.py archive_todos / 自動: TODO_ARCHIVE_DAYS を設定するとtask_workerが定期的に実行する
+"""
+
+import datetime
+import time
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedTodo, Todo
+
+# アーカイブする（以降は変化しない）ステータス
+FINISHED_STATUSES = [Todo.Status.COMPLETED, Todo.Status.CANCELLED, Todo.Status.TIMEOUT, Todo.Status.ERROR]
+
+
+def archivable(before: datetime.datetime):
+    """before より前に終了したTodo（finished_at がなければ updated_at で判断する）"""
+    return Todo.objects.filter(status__in=FINISHED_STATUSES).filter(
+        Q(finished_at__lt=before) | Q(finished_at=None, updated_at__lt=before)
+    )
+
+
+def archive_batch(before: datetime.datetime, batch_size: int) -> int:
+    """アーカイブ対象のTodoを最大 batch_size 件移し、移した件数を返す"""
+    columns = [f.column for f in ArchivedTodo._meta.concrete_fields if f.name != "archived_at"]
+    quoted = ", ".join(connection.ops.quote_name(column) for column in columns)
+    with transaction.atomic():
+        ids = list(archivable(before).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return 0
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {archive} ({columns}, archived_at) SELECT {columns}, %s FROM {todo} WHERE id IN ({ids})".format(
+                    archive=ArchivedTodo._meta.db_table, todo=Todo._meta.db_table, columns=quoted, ids=placeholders
+                ),
+                [timezone.now(), *ids],
+            )
+            # post_delete（SSEの "deleted" 通知）は送らない
+            cursor.execute("DELETE FROM {} WHERE id IN ({})".format(Todo._meta.db_table, placeholders), ids)
+    return len(ids)
+
+
+def archive_todos(days: int, batch_size: int = 200, pause: float = 0.0, max_batches: int | None = None) -> int:
+    """
+    終了から days 日以上経ったTodoをバッチごとにアーカイブする
+
+    Args:
+        days: 終了からの日数
+        batch_size: 1トランザクションで移す件数
+        pause: バッチの間に待つ秒数（他のプロセスの書き込みを先に通す）
+        max_batches: 実行するバッチ数の上限（Noneなら対象がなくなるまで）
+
+    Returns:
+        int: アーカイブした件数
+    """
+    before = timezone.now() - datetime.timedelta(days=days)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(before, batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
@@ -0,0 +1,514 @@
+"""
+gitを実行するAPI（非同期ビュー）
+
+TodoList・Todoのgitのアクション（worktrees, branches, create_branch, add_worktree, remove_worktree）は
+同期ワーカースレッド上で subprocess.run を実行すると、遅いリポジトリ（NFS上など）があると
+サーバーのスレッドを使い切ってしまう。ここでは
+
+- asyncio.create_subprocess_exec でgitを実行（ASGIではイベントループ上で待つのでスレッドを占有しない）
+- リポジトリごとの同時実行数を GIT_REPO_CONCURRENCY までに制限（ASGIのみ。下記）
+- クライアントが切断してビューがキャンセルされたら、実行中のgitをkillする
+
+として実装し、urls.py でルーターより前に登録する（DRFのViewSetと同じURL・同じレスポンス）。
+git出力の解析結果はgit_cacheでキャッシュする。
+
+同時実行数の制限はイベントループ単位のSemaphoreなので、ASGIサーバー（uvicornなど）で動かした場合だけ効く。
+WSGI・runserverではリクエストごとに別のイベントループで実行されるため制限されない
+（同時実行数はWSGIサーバーのスレッド数で決まる）。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+import subprocess
+import weakref
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import git_cache
+from .models import Todo, TodoList
+
+logger = logging.getLogger(__name__)
+
+GIT_TIMEOUT = 30
+
+# ブランチ名・worktree名に使える文字
+NAME_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+# イベントループごとの {リポジトリ: Semaphore}
+# WSGIではリクエストごとにループが作られるので、制限が効くのはASGIで動かした場合のみ（モジュールのdocstring）
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def parse_worktrees(output):
+    """
+    `git worktree list --porcelain` の出力を [{"path": "...", "branch": "..."}, ...] に変換する
+    """
+    worktrees = []
+    # porcelain format: 各worktreeは "worktree <path>" で始まり、"branch <branch>" が続く
+    current_entry = {}
+    for line in output.splitlines():
+        if line.startswith('worktree '):
+            if current_entry:
+                # 前のエントリを追加
+                worktrees.append(current_entry)
+            current_entry = {'path': line[9:].strip()}  # "worktree " を除去
+        elif line.startswith('branch '):
+            branch = line[7:].strip()  # "branch " を除去
+            # refs/heads/ プレフィックスを除去
+            if branch.startswith('refs/heads/'):
+                branch = branch[11:]
+            current_entry['branch'] = branch
+        elif line == '':
+            # 空行はエントリの区切り
+            if current_entry:
+                worktrees.append(current_entry)
+                current_entry = {}
+    
+    # 最後のエントリを追加
+    if current_entry:
+        worktrees.append(current_entry)
+
+    return worktrees
+
+
+def parse_branches(output):
+    """
+    `git branch` の出力をローカルブランチ名のリストに変換する（'* ', '+ ' は除去）
+    """
+    branches = []
+    for line in output.splitlines():
+        branch = line.strip()
+        # 先頭の '* ' または '+ ' を除去
+        # '* ' = 現在のチェックアウトブランチ
+        # '+ ' = 別のワークツリーでチェックアウトされているブランチ
+        if branch.startswith('* '):
+            branch = branch[2:]
+        elif branch.startswith('+ '):
+            branch = branch[2:]
+        branches.append(branch)
+
+    return branches
+
+
+# get_branch_statuses で使う for-each-ref の引数
+BRANCH_STATUS_FORMAT = '--format=%(refname:lstrip=2)%00%(HEAD)%00%(worktreepath)'
+MERGED_BRANCH_FORMAT = '--format=%(refname:lstrip=2)'
+
+
+def parse_branch_statuses(lines, merged):
+    """
+    BRANCH_STATUS_FORMAT の出力行とマージ済みブランチ名の集合から [{"name": "...", "can_delete": bool}, ...] を作る
+    """
+    branches = []
+    for line in lines:
+        name, head, worktree_path = line.split('\0')
+        # 現在のブランチ（head == '*'）とworktreeでチェックアウトされているブランチは削除不可
+        checked_out = head == '*' or bool(worktree_path)
+        branches.append({'name': name, 'can_delete': not checked_out and name in merged})
+    return branches
+
+
+def _repo_semaphore(workdir):
+    """リポジトリ（worktreeは共通gitディレクトリ単位）ごとのSemaphoreを返す"""
+    dirs = git_cache.find_git_dirs(workdir)
+    key = dirs[1] if dirs else os.path.realpath(workdir)
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if key not in per_loop:
+        per_loop[key] = asyncio.Semaphore(settings.GIT_REPO_CONCURRENCY)
+    return per_loop[key]
+
+
+def _kill(process):
+    # gitが起動した子プロセス（フック・エイリアスなど）もパイプを持つので、プロセスグループごと止める
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def run_git(workdir, *args, timeout=GIT_TIMEOUT):
+    """
+    gitを非同期に実行する
+
+    タイムアウト・キャンセル（クライアント切断）時はプロセスをkillする
+
+    Returns:
+        tuple: (終了コード, stdout, stderr)
+
+    Raises:
+        subprocess.TimeoutExpired: タイムアウトした場合
+        OSError: gitを起動できなかった場合（workdirが存在しないなど）
+    """
+    async with _repo_semaphore(workdir):
+        process = await asyncio.create_subprocess_exec(
+            'git', *args,
+            cwd=workdir,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except TimeoutError:
+            _kill(process)
+            await process.wait()
+            raise subprocess.TimeoutExpired(['git', *args], timeout)
+        except asyncio.CancelledError:
+            _kill(process)
+            await process.wait()
+            raise
+    return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+@git_cache.cached('repository')
+async def check_git_repository(workdir):
+    """指定されたパスがgit repositoryかどうかをチェックする（git repositoryでない場合はValueError）"""
+    if not workdir:
+        raise ValueError("workdirが指定されていません")
+    if not os.path.exists(workdir):
+        raise ValueError(f"指定されたパスが存在しません: {workdir}")
+
+    try:
+        returncode, stdout, stderr = await run_git(workdir, 'rev-parse', '--is-inside-work-tree')
+    except subprocess.TimeoutExpired:
+        raise ValueError(f"git repositoryのチェックがタイムアウトしました: {workdir}")
+    except OSError:
+        raise ValueError(f"指定されたパスはgit repositoryではありません: {workdir}")
+
+    if returncode != 0:
+        logger.error(f"git rev-parse failed in {workdir}: {stderr}")
+    if returncode != 0 or stdout.strip() != 'true':
+        raise ValueError(f"指定されたパスはgit repositoryではありません: {workdir}")
+    return True
+
+
+async def _git_output(workdir, *args):
+    """gitの標準出力を返す（失敗時はログを出してNone）"""
+    try:
+        returncode, stdout, stderr = await run_git(workdir, *args)
+    except subprocess.TimeoutExpired:
+        logger.error(f"git {args[0]} timeout in {workdir}")
+        return None
+    except OSError as e:
+        logger.error(f"git {args[0]} error in {workdir}: {e}")
+        return None
+    if returncode != 0:
+        logger.error(f"git {' '.join(args)} failed in {workdir}: {stderr}")
+        return None
+    return stdout
+
+
+@git_cache.cached('worktrees')
+async def get_git_worktrees(workdir):
+    """git worktree list の結果を [{"path": "...", "branch": "..."}, ...] で返す（エラー時は空リスト）"""
+    await check_git_repository(workdir)
+    output = await _git_output(workdir, 'worktree', 'list', '--porcelain')
+    return parse_worktrees(output) if output is not None else []
+
+
+@git_cache.cached('branches')
+async def get_git_branches(workdir):
+    """ローカルブランチ名一覧を返す（エラー時は空リスト）"""
+    output = await _git_output(workdir, 'branch')
+    return parse_branches(output) if output is not None else []
+
+
+@git_cache.cached('branch_statuses')
+async def get_branch_statuses(workdir):
+    """
+    ローカルブランチ一覧を削除可否フラグつきで返す（エラー時は空リスト）
+
+    ブランチ数に関係なくgitの実行は2回だけ（並行して実行する）:
+    - `git for-each-ref refs/heads` で全ブランチと、チェックアウト中かどうか（%(HEAD), %(worktreepath)）を取得
+    - `git for-each-ref --merged=HEAD refs/heads` でHEADにマージ済みのブランチを取得
+
+    現在のブランチ・worktreeで使用中のブランチは削除不可、それ以外はマージ済みなら削除可
+    """
+    output, merged = await asyncio.gather(
+        _git_output(workdir, 'for-each-ref', BRANCH_STATUS_FORMAT, 'refs/heads'),
+        _git_output(workdir, 'for-each-ref', '--merged=HEAD', MERGED_BRANCH_FORMAT, 'refs/heads'),
+    )
+    if output is None:
+        return []
+    return parse_branch_statuses(output.splitlines(), set((merged or '').splitlines()))
+
+
+async def get_current_branch(workdir):
+    """現在のチェックアウト中のブランチ名（取得できなければNone）"""
+    output = await _git_output(workdir, 'rev-parse', '--abbrev-ref', 'HEAD')
+    return output.strip() if output is not None else None
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def validate_name(value, label):
+    """ブランチ名・worktree名を検証し、エラーメッセージを返す（問題なければNone）"""
+    if not value:
+        return f'{label}は必須です'
+    if not NAME_RE.match(value):
+        return f'{label}は英数字、ハイフン、アンダースコアのみ使用できます'
+    return None
+
+
+async def run_git_action(workdir, failure, *args):
+    """
+    gitで変更を行い、失敗した場合はエラーのレスポンスを返す（成功したらNone）
+
+    Args:
+        failure: エラーメッセージの先頭（例: "ブランチの作成に失敗しました"）
+    """
+    try:
+        returncode, _, stderr = await run_git(workdir, *args)
+    except (subprocess.TimeoutExpired, OSError) as e:
+        logger.error(f"git {args[0]} error in {workdir}: {e}")
+        return error_response(f'{failure}: {str(e)}', 500)
+    if returncode != 0:
+        logger.error(f"git {' '.join(args[:2])} failed in {workdir}: {stderr}")
+        return error_response(f'{failure}: {stderr}', 500)
+    return None
+
+
+def not_found_response(model):
+    """DRFのget_objectと同じ形式の404"""
+    return JsonResponse({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+def parse_body(request):
+    """JSONのリクエストボディを辞書で返す（空・不正な場合は空の辞書）"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@require_http_methods(['GET'])
+async def todolist_worktrees(request, pk):
+    """GET /api/todolists/{id}/worktrees/ - git worktree一覧取得"""
+    try:
+        todolist = await TodoList.objects.aget(pk=pk)
+    except TodoList.DoesNotExist:
+        return not_found_response(TodoList)
+    try:
+        worktrees = await get_git_worktrees(todolist.workdir)
+    except ValueError as e:
+        return error_response(str(e))
+    return JsonResponse({'workdir': todolist.workdir, 'worktrees': worktrees})
+
+
+@require_http_methods(['GET'])
+async def todolist_branches(request, pk):
+    """GET /api/todolists/{id}/branches/ - ローカルブランチ一覧を削除可否フラグつきで取得"""
+    try:
+        todolist = await TodoList.objects.aget(pk=pk)
+    except TodoList.DoesNotExist:
+        return not_found_response(TodoList)
+    try:
+        await check_git_repository(todolist.workdir)
+    except ValueError as e:
+        return error_response(str(e))
+    return JsonResponse({'branches': await get_branch_statuses(todolist.workdir)})
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def todolist_create_branch(request, pk):
+    """
+    POST /api/todolists/{id}/create_branch/ - 新しいブランチを作成
+
+    Request body: {"new_branch_name": "新しいブランチ名", "base_branch": "ベースのブランチ名"}
+    """
+    try:
+        todolist = await TodoList.objects.aget(pk=pk)
+    except TodoList.DoesNotExist:
+        return not_found_response(TodoList)
+    data = parse_body(request)
+    new_branch_name = str(data.get('new_branch_name', '')).strip()
+    base_branch = str(data.get('base_branch', '')).strip()
+
+    error = validate_name(new_branch_name, 'new_branch_name')
+    if error:
+        return error_response(error)
+    if not base_branch:
+        return error_response('base_branchは必須です')
+
+    workdir = todolist.workdir
+    existing_branches = await get_git_branches(workdir)
+    if new_branch_name in existing_branches:
+        return error_response(f'ブランチ "{new_branch_name}" は既に存在します')
+    if base_branch not in existing_branches:
+        return error_response(f'ベースブランチ "{base_branch}" が存在しません')
+
+    error = await run_git_action(workdir, 'ブランチの作成に失敗しました', 'branch', new_branch_name, base_branch)
+    if error:
+        return error
+
+    return JsonResponse({
+        'new_branch_name': new_branch_name,
+        'base_branch': base_branch,
+        'message': f'ブランチ "{new_branch_name}" を作成しました'
+    })
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def todolist_add_worktree(request, pk):
+    """
+    POST /api/todolists/{id}/worktrees/add/ - 新しいworktreeを追加
+
+    Request body: {"name": "ディレクトリ名", "branch": "ブランチ名"}
+    ブランチが存在しない場合は現在のブランチから作成する
+    """
+    try:
+        todolist = await TodoList.objects.aget(pk=pk)
+    except TodoList.DoesNotExist:
+        return not_found_response(TodoList)
+    data = parse_body(request)
+    worktree_name = str(data.get('name', '')).strip()
+    branch = str(data.get('branch', '')).strip()
+
+    if '/' in worktree_name:
+        return error_response('nameに / を含めることはできません')
+    error = validate_name(worktree_name, 'name')
+    if error:
+        return error_response(error)
+    if not branch:
+        return error_response('branchは必須です')
+
+    worktree_path = os.path.join(settings.WORKTREE_ROOT, worktree_name)
+    if os.path.exists(worktree_path):
+        return error_response(f'同名ディレクトリが既に存在します: {worktree_path}')
+
+    branch_created = False
+    if branch not in await get_git_branches(todolist.workdir):
+        # ブランチが存在しない場合は現在のチェックアウト中のブランチから作成する
+        base_branch = await get_current_branch(todolist.workdir) or 'main'
+        error = await run_git_action(todolist.workdir, 'ブランチの作成に失敗しました', 'branch', branch, base_branch)
+        if error:
+            return error
+        branch_created = True
+
+    error = await run_git_action(todolist.workdir, 'worktreeの作成に失敗しました', 'worktree', 'add', worktree_path, branch)
+    if error:
+        return error
+
+    response_data = {
+        'name': worktree_name,
+        'path': worktree_path,
+        'branch': branch,
+        'message': f'worktree "{worktree_name}" を作成しました'
+    }
+    if branch_created:
+        response_data['branch_created'] = True
+    return JsonResponse(response_data)
+
+
+@csrf_exempt
+@require_http_methods(['DELETE'])
+async def todolist_remove_worktree(request, pk, name):
+    """DELETE /api/todolists/{id}/worktrees/{name}/ - worktreeを削除"""
+    try:
+        todolist = await TodoList.objects.aget(pk=pk)
+    except TodoList.DoesNotExist:
+        return not_found_response(TodoList)
+
+    worktree_path = os.path.join(settings.WORKTREE_ROOT, name)
+    if not os.path.exists(worktree_path):
+        return error_response(f'worktreeが存在しません: {worktree_path}', 404)
+
+    error = await run_git_action(
+        todolist.workdir, 'worktreeの削除に失敗しました', 'worktree', 'remove', worktree_path, '--force'
+    )
+    if error:
+        return error
+    # 成功時はボディなし
+    return HttpResponse()
+
+
+async def _get_todo(pk):
+    try:
+        return await Todo.objects.select_related('todo_list').aget(pk=pk)
+    except Todo.DoesNotExist:
+        return None
+
+
+@require_http_methods(['GET'])
+async def todo_worktrees(request, pk):
+    """GET /api/todos/{id}/worktrees/ - Todoが所属するTodoListのworktree一覧取得"""
+    todo = await _get_todo(pk)
+    if todo is None:
+        return not_found_response(Todo)
+    if not todo.todo_list:
+        return error_response('このTodoにはTodoListが紐づいていません')
+    workdir = todo.todo_list.workdir
+    if not workdir:
+        return error_response('TodoListにworkdirが設定されていません')
+
+    try:
+        worktrees = await get_git_worktrees(workdir)
+    except ValueError as e:
+        return error_response(str(e))
+    return JsonResponse({'workdir': workdir, 'worktrees': worktrees})
+
+
+@require_http_methods(['GET'])
+async def todo_branches(request, pk):
+    """GET /api/todos/{id}/branches/ - Todoが所属するTodoListのブランチ名一覧取得"""
+    todo = await _get_todo(pk)
+    if todo is None:
+        return not_found_response(Todo)
+    if not todo.todo_list:
+        return error_response('このTodoにはTodoListが紐づいていません')
+    return JsonResponse({'branches': await get_git_branches(todo.todo_list.workdir)})
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def todo_create_branch(request, pk):
+    """
+    POST /api/todos/{id}/create_branch/ - 新しいブランチを作成してTodoのbranch_nameにする
+
+    Request body: {"new_branch_name": "新しいブランチ名"}
+    作成元はTodoのbranch_name（未設定なら現在のチェックアウト中のブランチ）
+    """
+    todo = await _get_todo(pk)
+    if todo is None:
+        return not_found_response(Todo)
+    new_branch_name = str(parse_body(request).get('new_branch_name', '')).strip()
+
+    if not new_branch_name:
+        return error_response('ブランチ名を入力してください')
+    error = validate_name(new_branch_name, 'ブランチ名')
+    if error:
+        return error_response(error)
+    if not todo.todo_list:
+        return error_response('このTodoにはTodoListが紐づいていません')
+
+    workdir = todo.todo_list.workdir
+    base_branch = todo.branch_name or await get_current_branch(workdir)
+    if not base_branch:
+        return error_response('現在のブランチを取得できませんでした')
+
+    if new_branch_name in await get_git_branches(workdir):
+        return error_response(f'ブランチ "{new_branch_name}" は既に存在します')
+
+    error = await run_git_action(workdir, 'ブランチの作成に失敗しました', 'branch', new_branch_name, base_branch)
+    if error:
+        return error
+
+    todo.branch_name = new_branch_name
+    await todo.asave()
+    return JsonResponse({
+        'branch_name': new_branch_name,
+        'message': f'ブランチ "{new_branch_name}" を作成しました'
+    })
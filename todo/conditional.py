@@ -0,0 +1,163 @@
+"""
+一覧・詳細APIの条件付きGET（ETag / Last-Modified / 304）
+
+- 詳細: 対象行（と表示に使う関連行）の updated_at からETagを作る
+- 一覧: CollectionVersion（テーブルごとの更新カウンタ、SQLiteトリガーで更新）からETagを作る
+
+SQLiteではテーブルを作り直すマイグレーション（列の変更など）でトリガーが消え、カウンタが増えなくなる
+（一覧が304のまま・ダッシュボードのキャッシュが古いまま）ので、post_migrate で ensure_version_triggers() を実行して作り直す。
+
+If-None-Match / If-Modified-Since が一致すれば、シリアライザを実行せずに304を返す。
+アーカイブ済みのTodo（?archived=1）は変化しないので、詳細に TODO_ARCHIVED_MAX_AGE 秒の Cache-Control を付ける。
+完了済みのTodoも再開・再キューで変わるので、それ以外はすべて no-cache（毎回ETagで再検証）。
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import CollectionVersion
+
+# コレクション名（CollectionVersion.name） -> テーブル名（migrations/0019_collectionversion と同じ）
+VERSIONED_TABLES = {"todo": "todo_todo", "todolist": "todo_todolist", "agent": "todo_agent"}
+
+VERSION_EVENTS = ("insert", "update", "delete")
+
+
+def version_triggers() -> list[str]:
+    return ["{}_version_{}".format(table, event) for table in VERSIONED_TABLES.values() for event in VERSION_EVENTS]
+
+
+def version_trigger_sql() -> list[str]:
+    """テーブルの変更のたびに CollectionVersion を増やすトリガー（既にあれば何もしない）"""
+    sql = []
+    for name, table in VERSIONED_TABLES.items():
+        sql.append(
+            "INSERT OR IGNORE INTO todo_collectionversion (name, version, updated_at) "
+            "VALUES ('{}', 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))".format(name)
+        )
+        for event in VERSION_EVENTS:
+            sql.append(
+                "CREATE TRIGGER IF NOT EXISTS {table}_version_{event} AFTER {EVENT} ON {table} BEGIN "
+                "UPDATE todo_collectionversion SET version = version + 1, "
+                "updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE name = '{name}'; END".format(
+                    table=table, event=event, EVENT=event.upper(), name=name
+                )
+            )
+    return sql
+
+
+def ensure_version_triggers(using: str = "default") -> bool:
+    """
+    消えた CollectionVersion のトリガーを作り直す
+
+    Returns:
+        bool: 作り直した場合True
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    triggers = version_triggers()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'todo_collectionversion' OR name IN ({})".format(
+                ", ".join(["%s"] * len(triggers))
+            ),
+            triggers,
+        )
+        existing = {name for (name,) in cursor.fetchall()}
+        # テーブルがない（マイグレーション前）
+        if "todo_collectionversion" not in existing:
+            return False
+        if all(name in existing for name in triggers):
+            return False
+        for sql in version_trigger_sql():
+            cursor.execute(sql)
+        # トリガーがなかった間の変更を一覧・ダッシュボードに反映させる
+        cursor.execute(
+            "UPDATE todo_collectionversion SET version = version + 1, "
+            "updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')"
+        )
+    return True
+
+
+def make_etag(*parts) -> str:
+    """値の列から強いETagを作る"""
+    digest = hashlib.sha256("\0".join(str(p) for p in parts).encode()).hexdigest()[:32]
+    return quote_etag(digest)
+
+
+def set_validators(response, etag: str, last_modified, cache_control: str):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    response.headers["Cache-Control"] = cache_control
+    # ブラウザ表示（browsable API）とJSONで表現が異なる
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ViewSetの list / retrieve に条件付きGETを追加するMixin
+
+    - etag_collections: 一覧の表現に影響するコレクション名（CollectionVersion.name）
+    - get_detail_validators(pk): 詳細の (ETagの材料のタプル, 最終更新時刻, 以降変化しないか) を返す。
+      対象がなければNone（通常の処理で404になる）
+    """
+
+    etag_collections: tuple[str, ...] = ()
+
+    def get_detail_validators(self, pk):
+        raise NotImplementedError
+
+    def _representation_key(self, request):
+        # 同じリソースでもクエリ（?fields= など）と出力形式で表現が変わる
+        return request.get_full_path(), request.accepted_media_type
+
+    def _not_modified(self, request, etag, last_modified, cache_control):
+        """条件に一致すれば304のレスポンス、そうでなければNone"""
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified.timestamp() if last_modified else None
+        )
+        if response is not None:
+            set_validators(response, etag, last_modified, cache_control)
+        return response
+
+    def _with_validators(self, response, etag, last_modified, cache_control):
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified, cache_control)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        rows = CollectionVersion.objects.filter(name__in=self.etag_collections).values_list(
+            "name", "version", "updated_at"
+        )
+        rows = sorted(rows)
+        last_modified = max((updated_at for _, _, updated_at in rows if updated_at), default=None)
+        etag = make_etag(*[(name, version) for name, version, _ in rows], *self._representation_key(request))
+
+        not_modified = self._not_modified(request, etag, last_modified, "no-cache")
+        if not_modified is not None:
+            return not_modified
+        return self._with_validators(super().list(request, *args, **kwargs), etag, last_modified, "no-cache")
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            validators = self.get_detail_validators(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (ValueError, TypeError):
+            validators = None
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        parts, last_modified, immutable = validators
+        etag = make_etag(*parts, *self._representation_key(request))
+        cache_control = "private, max-age={}".format(settings.TODO_ARCHIVED_MAX_AGE) if immutable else "no-cache"
+
+        not_modified = self._not_modified(request, etag, last_modified, cache_control)
+        if not_modified is not None:
+            return not_modified
+        return self._with_validators(super().retrieve(request, *args, **kwargs), etag, last_modified, cache_control)
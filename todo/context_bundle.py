@@ -0,0 +1,228 @@
+"""
+参照用ファイルのコンテキストバンドル
+
+Todoのref_filesの内容を `git cat-file --batch` でまとめて取得し、
+blobハッシュをキーにしたローカルのコンテンツアドレス型ストアにキャッシュする。
+同じコミットの同じ参照ファイルを使うTodo同士では、組み立て済みのバンドルも再利用する。
+
+- ストアは {root}/{xx}/{hash} にファイルとして保存する（プロセス間で共有可能）
+- 読み込み時にmtimeを更新し、合計サイズが上限を超えたらmtimeが古いものから削除する（LRU）
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+
+
+class ContentStore:
+    """ハッシュをキーにしたファイルベースのストア（サイズ上限付きLRU）"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:])
+
+    def get(self, key: str) -> bytes | None:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # LRU用にアクセス時刻を更新
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを他プロセスに読ませないよう、一時ファイルからrenameする
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def evict(self):
+        """合計サイズが上限を超えていれば、最終アクセスが古いものから削除する"""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+@dataclass
+class ContextBundle:
+    """組み立て済みのバンドル"""
+
+    text: str
+    # バンドルに内容を含めたファイル
+    paths: list[str] = field(default_factory=list)
+
+
+def resolve_blobs(workdir: str, paths: list[str]) -> dict[str, tuple[str, int]]:
+    """HEADにおける各パスのblobハッシュとサイズを取得する
+
+    HEADに存在しないファイル、作業ツリーで変更されているファイルは含めない
+    """
+    if not paths:
+        return {}
+
+    result = subprocess.run(
+        ["git", "cat-file", "--batch-check"],
+        cwd=workdir,
+        input="".join("HEAD:{}\n".format(p) for p in paths),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    blobs = {}
+    for path, line in zip(paths, result.stdout.splitlines()):
+        parts = line.split()
+        if len(parts) == 3 and parts[1] == "blob":
+            blobs[path] = (parts[0], int(parts[2]))
+
+    # 作業ツリーで変更されているファイルはHEADの内容と異なるので除外
+    if blobs:
+        dirty = subprocess.run(
+            ["git", "diff", "--name-only", "-z", "HEAD", "--", *blobs.keys()],
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+        )
+        if dirty.returncode == 0:
+            for path in dirty.stdout.split("\0"):
+                blobs.pop(path, None)
+
+    return blobs
+
+
+def fetch_blobs(workdir: str, shas: list[str]) -> dict[str, bytes]:
+    """`git cat-file --batch` で複数のblobの内容を1回で取得する"""
+    if not shas:
+        return {}
+
+    result = subprocess.run(
+        ["git", "cat-file", "--batch"],
+        cwd=workdir,
+        input="".join("{}\n".format(sha) for sha in shas).encode(),
+        capture_output=True,
+        check=True,
+    )
+    out = result.stdout
+    contents = {}
+    pos = 0
+    for sha in shas:
+        header_end = out.index(b"\n", pos)
+        header = out[pos:header_end].split()
+        pos = header_end + 1
+        if len(header) != 3:
+            # "<sha> missing"
+            continue
+        size = int(header[2])
+        contents[sha] = out[pos : pos + size]
+        pos += size + 1  # 内容の後ろの改行
+    return contents
+
+
+def code_fence(content: str) -> str:
+    """内容に含まれるバッククォートより長いフェンスを返す"""
+    fence = "```"
+    while fence in content:
+        fence += "`"
+    return fence
+
+
+def build_context_bundle(
+    workdir: str,
+    paths: list[str],
+    store: ContentStore,
+    max_file_bytes: int,
+    max_bundle_bytes: int,
+) -> ContextBundle:
+    """ref_filesの内容をまとめたバンドルを返す（キャッシュがあれば再利用）"""
+    blobs = resolve_blobs(workdir, paths)
+    if not blobs:
+        return ContextBundle(text="")
+
+    # バンドル自体もパスとblobハッシュの組でキャッシュする
+    bundle_key = hashlib.sha256(
+        "\n".join(
+            ["{}:{}".format(max_file_bytes, max_bundle_bytes)]
+            + ["{}\0{}".format(p, blobs[p][0]) for p in paths if p in blobs]
+        ).encode()
+    ).hexdigest()
+    cached = store.get(bundle_key)
+    if cached is not None:
+        data = json.loads(cached)
+        return ContextBundle(text=data["text"], paths=data["paths"])
+
+    # ストアにないblobだけgitから取得（大きすぎるものは取得しない）
+    contents = {}
+    missing = []
+    for sha in dict.fromkeys(sha for sha, size in blobs.values() if size <= max_file_bytes):
+        data = store.get(sha)
+        if data is None:
+            missing.append(sha)
+        else:
+            contents[sha] = data
+    for sha, data in fetch_blobs(workdir, missing).items():
+        store.put(sha, data)
+        contents[sha] = data
+
+    sections = []
+    included = []
+    total = 0
+    for path in paths:
+        data = contents.get(blobs[path][0]) if path in blobs else None
+        if data is None or b"\0" in data:
+            # 大きすぎるファイル・バイナリはバンドルに含めない
+            continue
+        if total + len(data) > max_bundle_bytes:
+            continue
+        content = data.decode("utf-8", errors="replace")
+        if not content.endswith("\n"):
+            content += "\n"
+        fence = code_fence(content)
+        sections.append("### {}\n{}\n{}{}".format(path, fence, content, fence))
+        included.append(path)
+        total += len(data)
+
+    bundle = ContextBundle(text="\n\n".join(sections), paths=included)
+    store.put(bundle_key, json.dumps({"text": bundle.text, "paths": bundle.paths}).encode("utf-8"))
+    store.evict()
+    return bundle
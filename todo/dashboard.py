@@ -0,0 +1,102 @@
+"""
+ダッシュボード（TodoListごとのステータス集計）
+
+Todoを全件取得してクライアントで数えたり、ステータス×TodoListごとにクエリを発行したりしないよう、
+TodoListごとの
+
+- ステータス別の件数
+- 最も古いqueuedのTodoの待ち時間
+- 最後に完了した時刻
+
+を1回のGROUP BYクエリで集計する。結果は CollectionVersion（todo・todolist）のバージョンをキーに
+DASHBOARD_CACHE_TTL 秒キャッシュするので、ヒット時のコストはバージョンを読む1クエリだけになる。
+待ち時間は時刻として保存し、応答のたびに現在時刻から計算する。
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import CollectionVersion, Todo
+
+DASHBOARD_COLLECTIONS = ("todo", "todolist")
+
+
+def aggregate_todo_lists() -> list[dict]:
+    """TodoListごとのステータス別件数などを1クエリで集計する"""
+    statuses = Todo.Status.values
+    rows = (
+        Todo.objects.values("todo_list_id", "todo_list__name", "todo_list__workdir")
+        .annotate(
+            **{"count_{}".format(s): Count("id", filter=Q(status=s)) for s in statuses},
+            # queuedになった時刻（Todo.queued_at）。updated_at はqueuedのままの編集（優先度の変更など）でも変わる
+            oldest_queued_at=Min("queued_at", filter=Q(status=Todo.Status.QUEUED)),
+            last_completed_at=Max("finished_at", filter=Q(status=Todo.Status.COMPLETED)),
+        )
+        .order_by("todo_list_id")
+    )
+
+    todo_lists = []
+    for row in rows:
+        counts = {s: row["count_{}".format(s)] for s in statuses}
+        todo_lists.append(
+            {
+                "id": row["todo_list_id"],
+                "name": row["todo_list__name"],
+                "workdir": row["todo_list__workdir"],
+                "counts": counts,
+                "total": sum(counts.values()),
+                "running": counts[Todo.Status.RUNNING],
+                "oldest_queued_at": row["oldest_queued_at"],
+                "last_completed_at": row["last_completed_at"],
+            }
+        )
+    return todo_lists
+
+
+def _cache_key() -> str:
+    versions = sorted(
+        CollectionVersion.objects.filter(name__in=DASHBOARD_COLLECTIONS).values_list("name", "version")
+    )
+    return "dashboard:{}".format(",".join("{}={}".format(name, version) for name, version in versions))
+
+
+def _age(since, now) -> float | None:
+    return round((now - since).total_seconds(), 3) if since is not None else None
+
+
+def get_dashboard() -> dict:
+    """
+    ダッシュボードのデータを返す
+
+    Returns:
+        dict: {
+            "generated_at": 集計した時刻,
+            "totals": 全体の集計（todo_listsの各要素と同じキー、id・name・workdirを除く）,
+            "todo_lists": [{"id", "name", "workdir", "counts": {ステータス: 件数}, "total", "running",
+                            "oldest_queued_at", "oldest_queued_age"（秒）, "last_completed_at"}, ...]
+        }
+    """
+    key = _cache_key()
+    cached = cache.get(key)
+    if cached is None:
+        cached = {"generated_at": timezone.now(), "todo_lists": aggregate_todo_lists()}
+        cache.set(key, cached, settings.DASHBOARD_CACHE_TTL)
+
+    now = timezone.now()
+    todo_lists = [dict(item, oldest_queued_age=_age(item["oldest_queued_at"], now)) for item in cached["todo_lists"]]
+
+    counts = {s: sum(item["counts"][s] for item in todo_lists) for s in Todo.Status.values}
+    oldest_queued_at = min((item["oldest_queued_at"] for item in todo_lists if item["oldest_queued_at"]), default=None)
+    totals = {
+        "counts": counts,
+        "total": sum(counts.values()),
+        "running": counts[Todo.Status.RUNNING],
+        "oldest_queued_at": oldest_queued_at,
+        "oldest_queued_age": _age(oldest_queued_at, now),
+        "last_completed_at": max(
+            (item["last_completed_at"] for item in todo_lists if item["last_completed_at"]), default=None
+        ),
+    }
+    return {"generated_at": cached["generated_at"], "totals": totals, "todo_lists": todo_lists}
@@ -1,8 +1,15 @@
+import hashlib
 import os
+import re
 import sys
+from dataclasses import dataclass
 
+import numpy as np
 from ollama import Client
 
+# 絵文字が決まるまでコミットに仮で付ける絵文字
+PLACEHOLDER = ":robot:"
+
 emoji = {
     ":art:": "Improve structure / format of the code.",
     ":zap:": "Improve performance.",
@@ -82,7 +89,176 @@ emoji = {
 }
 
 
-def select_emoji(prompt: str):
+# 説明文に加えて分類に使うキーワード（日本語のプロンプトにも反応させる）
+keywords = {
+    ":art:": "format formatter style indent 整形 フォーマット 構造 インデント",
+    ":zap:": "performance faster speed optimize cache latency 高速化 パフォーマンス 最適化 速度 キャッシュ 遅い",
+    ":fire:": "remove delete drop 削除 除去 消す 不要",
+    ":bug:": "bug fix error exception crash wrong broken バグ 修正 不具合 エラー 例外 直す 直して 誤り 失敗",
+    ":ambulance:": "hotfix urgent critical 緊急 致命的 至急",
+    ":sparkles:": "feature add new introduce implement support endpoint command 新機能 追加 実装 機能 対応 作成 エンドポイント",
+    ":memo:": "documentation docs readme docstring markdown ドキュメント 説明 文書 記載",
+    ":lipstick:": "ui style css design layout button svelte 見た目 デザイン 画面 スタイル レイアウト ボタン 表示",
+    ":white_check_mark:": "test tests testing pytest unittest spec assert テスト 試験 検証コード",
+    ":lock:": "security vulnerability privacy xss injection セキュリティ 脆弱性 権限漏れ",
+    ":rotating_light:": "lint linter warning ruff eslint flake8 mypy 警告 リント",
+    ":green_heart:": "ci pipeline github actions workflow",
+    ":arrow_up:": "upgrade bump 依存 アップグレード 更新",
+    ":arrow_down:": "downgrade ダウングレード",
+    ":heavy_plus_sign:": "dependency package install requirement 依存関係 パッケージ 追加",
+    ":heavy_minus_sign:": "dependency package uninstall 依存関係 パッケージ 削除",
+    ":wrench:": "config configuration settings yaml toml ini env 設定 環境変数 コンフィグ",
+    ":hammer:": "script makefile tooling スクリプト 開発用",
+    ":globe_with_meridians:": "i18n l10n translation locale 翻訳 多言語 国際化",
+    ":pencil2:": "typo spelling タイポ 誤字 脱字 綴り",
+    ":rewind:": "revert rollback 元に戻す 取り消し",
+    ":truck:": "move rename relocate path 移動 リネーム 名前変更",
+    ":recycle:": "refactor refactoring cleanup simplify restructure extract リファクタ リファクタリング 整理 共通化 分割",
+    ":boom:": "breaking 互換性 破壊的",
+    ":bulb:": "comment comments コメント",
+    ":card_file_box:": "database migration model schema sql sqlite index query データベース マイグレーション モデル スキーマ インデックス クエリ",
+    ":loud_sound:": "log logging logger ログ 出力",
+    ":mute:": "log logging remove ログ 削除",
+    ":label:": "type types typing annotation 型 型ヒント アノテーション",
+    ":goal_net:": "catch error handling exception try except エラー処理 例外処理 捕捉",
+    ":thread:": "thread threading concurrency async parallel lock 並列 並行 非同期 スレッド 排他",
+    ":safety_vest:": "validation validate validator バリデーション 検証 入力チェック",
+    ":see_no_evil:": "gitignore ignore 無視",
+    ":passport_control:": "auth authorization permission role 認可 権限 ロール",
+    ":stethoscope:": "healthcheck health ヘルスチェック 死活監視",
+    ":coffin:": "dead code unused 未使用 デッドコード",
+    ":technologist:": "developer experience dx 開発体験 開発者",
+    ":children_crossing:": "usability ux 使いやすさ 操作性",
+    ":building_construction:": "architecture architectural アーキテクチャ 設計変更 構成変更",
+    ":necktie:": "business logic ビジネスロジック 業務",
+    ":clown_face:": "mock fake stub モック スタブ",
+    ":camera_flash:": "snapshot snapshots スナップショット",
+    ":bricks:": "infrastructure docker compose nginx インフラ",
+}
+
+# 分類の確信度がこれ以上ならLLMに問い合わせない
+MIN_SCORE = 0.25
+MIN_MARGIN = 0.05
+
+_ASCII_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RUN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff]+")
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """英単語（簡易ステミング）と日本語の文字bigramに分割する"""
+    text = text.lower()
+    tokens = [_stem(w) for w in _ASCII_WORD_RE.findall(text) if len(w) >= 2]
+    for run in _CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def diff_tokens(paths: list[str], added: int = 0, deleted: int = 0) -> list[str]:
+    """変更ファイルと行数から分類用の疑似トークンを作る"""
+    if not paths:
+        return []
+
+    tokens = []
+    lowered = [p.lower() for p in paths]
+    if all("test" in p for p in lowered):
+        tokens += ["test"] * 3
+    if all(p.endswith((".md", ".rst", ".txt")) for p in lowered):
+        tokens += ["documentation"] * 3
+    if any("/migrations/" in p or p.startswith("migrations/") for p in lowered):
+        tokens += ["database", "migration"]
+    if any(os.path.basename(p) == ".gitignore" for p in lowered):
+        tokens += ["gitignore"] * 3
+    if any(os.path.basename(p) in ("pyproject.toml", "package.json", "requirements.txt", "uv.lock") for p in lowered):
+        tokens += ["dependency"]
+    if all(p.endswith((".yml", ".yaml", ".toml", ".ini", ".cfg", ".env")) for p in lowered):
+        tokens += ["configuration"] * 2
+    if all(p.endswith((".css", ".svelte", ".html")) for p in lowered):
+        tokens += ["ui", "style"]
+    if deleted and not added:
+        tokens += ["remove"] * 3
+    for p in lowered:
+        tokens += tokenize(os.path.splitext(p)[0].replace("/", " ").replace("_", " "))
+    return tokens
+
+
+def _build_index():
+    """絵文字ごとの文書（説明文＋キーワード）のTF-IDF行列を作る"""
+    names = list(emoji.keys())
+    docs = [tokenize(emoji[name] + " " + keywords.get(name, "")) for name in names]
+
+    vocab = {}
+    for doc in docs:
+        for token in doc:
+            vocab.setdefault(token, len(vocab))
+
+    df = np.zeros(len(vocab))
+    for doc in docs:
+        for token in set(doc):
+            df[vocab[token]] += 1
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+
+    matrix = np.zeros((len(docs), len(vocab)))
+    for i, doc in enumerate(docs):
+        for token in doc:
+            matrix[i, vocab[token]] += 1
+    matrix *= idf
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return names, vocab, idf, matrix
+
+
+_NAMES, _VOCAB, _IDF, _MATRIX = _build_index()
+
+
+@dataclass
+class Classification:
+    emoji: str
+    score: float
+    # 1位と2位のスコア差
+    margin: float
+
+    @property
+    def confident(self) -> bool:
+        return self.score >= MIN_SCORE and self.margin >= MIN_MARGIN
+
+
+def classify_emoji(text: str, paths: list[str] | None = None, added: int = 0, deleted: int = 0) -> Classification:
+    """説明文とのコサイン類似度で絵文字を選ぶ（ネットワーク不要）"""
+    vec = np.zeros(len(_VOCAB))
+    for token in tokenize(text) + diff_tokens(paths or [], added, deleted):
+        index = _VOCAB.get(token)
+        if index is not None:
+            vec[index] += 1
+    # 長い出力に引きずられないよう、TFは対数で抑える
+    vec = np.log1p(vec) * _IDF
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return Classification(emoji=PLACEHOLDER, score=0.0, margin=0.0)
+
+    scores = _MATRIX @ (vec / norm)
+    order = np.argsort(scores)[::-1]
+    best, second = scores[order[0]], scores[order[1]]
+    return Classification(emoji=_NAMES[order[0]], score=float(best), margin=float(best - second))
+
+
+def select_emoji(prompt: str, paths: list[str] | None = None, added: int = 0, deleted: int = 0):
+    """絵文字を選択する（ローカル分類の確信度が低い場合のみLLMに問い合わせる）"""
+    result = classify_emoji(prompt, paths, added, deleted)
+    if result.confident:
+        return result.emoji
+    return select_emoji_llm(prompt)
+
+
+def select_emoji_llm(prompt: str):
+    """LLMに絵文字を選択させる"""
     client = Client(host=os.environ["OLLAMA_HOST"])
 
     emoji_content = "\n".join([f"'{key}' : {value}" for key, value in emoji.items()])
@@ -115,3 +291,22 @@ def select_emoji(prompt: str):
     if e not in emoji:
         raise Exception("絵文字の選択に失敗しました")
     return e
+
+
+def emoji_cache_key(prompt: str) -> str:
+    """絵文字選択結果のキャッシュキー（入力テキストのハッシュ）"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def get_cached_emoji(prompt: str, store) -> str | None:
+    """キャッシュ済みの絵文字を返す（なければNone）"""
+    data = store.get(emoji_cache_key(prompt))
+    if data is None:
+        return None
+    e = data.decode("utf-8")
+    return e if e in emoji else None
+
+
+def cache_emoji(prompt: str, e: str, store):
+    """絵文字選択結果をキャッシュする"""
+    store.put(emoji_cache_key(prompt), e.encode("utf-8"))
@@ -0,0 +1,247 @@
+"""
+Todoのステータス変更の通知（Server-Sent Events用）
+
+task_worker・MCPサーバー・REST APIは別プロセスなので、変更はファイル（TODO_EVENTS_PATH）に
+1行1イベントのJSONで追記し、SSEのストリームはファイルの末尾を読む。
+
+- 書き込み: Todoの post_save / post_delete（apps.ready で接続）と、QuerySet.update() を使う一括操作から
+  publish() する。トランザクション内ではコミット後に書き込む
+- 読み込み: EventLogReader がファイルサイズの変化をstatで確認し、追記された行だけを読む。
+  DBへのクエリは発行しないので、開いているタブが多くても一覧APIのポーリングのような負荷にならない
+- ファイルが TODO_EVENTS_MAX_BYTES を超えたら ".1" にrenameして新しいファイルに切り替える。
+  読み込み側はinodeの変化で切り替えを検知し、古いファイルの残りを読んでから新しいファイルを先頭から読む
+
+イベントID（SSEの id:）は "<inode>-<読み終えた位置>" で、再接続時の Last-Event-ID から続きを読める。
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import fcntl
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# muted() の中では post_save / post_delete から通知しない（スレッド・タスクごと）
+_muted = contextvars.ContextVar("todo_events_muted", default=False)
+
+
+def todo_event(todo, status: str | None = None) -> dict:
+    """Todoの通知イベント"""
+    updated_at = todo.updated_at or timezone.now()
+    return {
+        "id": todo.pk,
+        "todo_list": todo.todo_list_id,
+        "status": status or todo.status,
+        "updated_at": updated_at.isoformat(),
+    }
+
+
+def _append(path: str, data: str):
+    while True:
+        with open(path, "a", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            stat = os.fstat(f.fileno())
+            try:
+                current = os.stat(path).st_ino
+            except OSError:
+                current = None
+            if current != stat.st_ino:
+                # ロック待ちの間に他のプロセスがローテーションした
+                continue
+            if stat.st_size > settings.TODO_EVENTS_MAX_BYTES:
+                # ロックを持っている間にrenameするので、書き込み中の行が分断されない
+                os.replace(path, path + ".1")
+                continue
+            f.write(data)
+            return
+
+
+def _write(events: list[dict]):
+    path = settings.TODO_EVENTS_PATH
+    data = "".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n" for event in events)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _append(path, data)
+    except OSError as e:
+        # 通知の失敗でTodoの保存を失敗させない
+        logger.warning("failed to publish todo events: %s", e)
+
+
+def publish(events: list[dict]):
+    """イベントを追記する（TODO_EVENTS_PATH が空なら何もしない）"""
+    if not events or not settings.TODO_EVENTS_PATH:
+        return
+    transaction.on_commit(lambda: _write(events))
+
+
+@contextlib.contextmanager
+def muted():
+    """この中の post_save / post_delete では通知しない（一括操作で呼び出し側がまとめて publish() する）"""
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def on_todo_saved(sender, instance, **kwargs):
+    if not _muted.get():
+        publish([todo_event(instance)])
+
+
+def on_todo_deleted(sender, instance, **kwargs):
+    if not _muted.get():
+        publish([todo_event(instance, status="deleted")])
+
+
+def parse_event_id(event_id: str | None) -> tuple[int, int] | None:
+    """イベントIDを (inode, 位置) に戻す（不正な場合はNone）"""
+    try:
+        inode, offset = (event_id or "").split("-")
+        return int(inode), int(offset)
+    except ValueError:
+        return None
+
+
+class EventLogReader:
+    """
+    イベントファイルの追記を読む
+
+    last_event_id が現在のファイルを指していればその続きから、そうでなければ現在の末尾から読む
+    """
+
+    def __init__(self, path: str, last_event_id: str | None = None):
+        self.path = path
+        self.file = None
+        self.inode = None
+        self.buffer = b""
+        self._open(parse_event_id(last_event_id))
+
+    def _open(self, resume: tuple[int, int] | None = None, from_start: bool = False):
+        try:
+            file = open(self.path, "rb")
+        except OSError:
+            # まだイベントがない。作成されたら先頭から読む
+            self.file = None
+            self.inode = None
+            return
+        self.file = file
+        self.inode = os.fstat(file.fileno()).st_ino
+        self.buffer = b""
+        if from_start:
+            return
+        size = os.fstat(file.fileno()).st_size
+        if resume is not None and resume[0] == self.inode and resume[1] <= size:
+            file.seek(resume[1])
+        else:
+            file.seek(size)
+
+    def _read(self) -> list[tuple[str, dict]]:
+        """現在のファイルの追記分を (イベントID, イベント) のリストで返す"""
+        chunk = self.file.read()
+        if not chunk:
+            return []
+        position = self.file.tell() - len(chunk) - len(self.buffer)
+        data = self.buffer + chunk
+        end = data.rfind(b"\n")
+        # 書き込み途中の行は次回に回す
+        self.buffer = data[end + 1 :]
+        if end < 0:
+            return []
+
+        events = []
+        for line in data[:end].split(b"\n"):
+            position += len(line) + 1
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            events.append(("{}-{}".format(self.inode, position), event))
+        return events
+
+    def poll(self) -> list[tuple[str, dict]]:
+        """前回から追記されたイベント"""
+        if self.file is None:
+            self._open(from_start=True)
+            if self.file is None:
+                return []
+
+        events = self._read()
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            inode = None
+        if inode != self.inode:
+            # ローテーションされた: 古いファイルの残りを読んでから新しいファイルに切り替える
+            events += self._read()
+            self.close()
+            self._open(from_start=True)
+            if self.file is not None:
+                events += self._read()
+        return events
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def format_sse(event_id: str, event: dict) -> str:
+    return "id: {}\nevent: todo\ndata: {}\n\n".format(
+        event_id, json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    )
+
+
+def stream_chunks(reader: EventLogReader, todo_list: int | None = None) -> str:
+    """1回のポーリングで送るSSEのテキスト（送るものがなければ空文字列）"""
+    chunks = []
+    for event_id, event in reader.poll():
+        if todo_list is None or event.get("todo_list") == todo_list:
+            chunks.append(format_sse(event_id, event))
+    return "".join(chunks)
+
+
+def sync_event_stream(reader: EventLogReader, todo_list: int | None = None):
+    """WSGI用のSSEストリーム（接続ごとにスレッドを使う）"""
+    yield "retry: {}\n\n".format(settings.TODO_EVENTS_RETRY_MS)
+    idle = 0.0
+    try:
+        while True:
+            text = stream_chunks(reader, todo_list)
+            if text:
+                idle = 0.0
+                yield text
+            elif idle >= settings.TODO_EVENTS_KEEPALIVE:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            time.sleep(settings.TODO_EVENTS_POLL_INTERVAL)
+            idle += settings.TODO_EVENTS_POLL_INTERVAL
+    finally:
+        reader.close()
+
+
+async def async_event_stream(reader: EventLogReader, todo_list: int | None = None):
+    """ASGI用のSSEストリーム（接続を待つ間スレッドを占有しない）"""
+    yield "retry: {}\n\n".format(settings.TODO_EVENTS_RETRY_MS)
+    idle = 0.0
+    try:
+        while True:
+            text = stream_chunks(reader, todo_list)
+            if text:
+                idle = 0.0
+                yield text
+            elif idle >= settings.TODO_EVENTS_KEEPALIVE:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(settings.TODO_EVENTS_POLL_INTERVAL)
+            idle += settings.TODO_EVENTS_POLL_INTERVAL
+    finally:
+        reader.close()
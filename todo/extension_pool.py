@@ -0,0 +1,258 @@
+"""
+Extensionプール
+
+stdio型のExtensionを常駐プロセスとして起動し、streamable HTTP経由で
+複数のエージェント実行（goose）から共有する。
+
+- Extensionごとに上流のstdioプロセスを1つだけ起動し、ClientSessionで多重化する
+- 初回リクエスト時に遅延起動し、一定時間使われなければ停止する（アイドル回収）
+- 起動中のExtensionには定期的にpingを送り、応答がなければ停止して次回再起動する
+
+公開するのはtoolsのみ（list_tools / call_tool）。
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+import urllib.request
+
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+from mcp.server.lowlevel import Server
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+logger = logging.getLogger(__name__)
+
+
+class PooledExtension:
+    """常駐させる1つのExtension（上流のstdioプロセスとそのセッション）"""
+
+    def __init__(self, name: str, cmd: str, args: list, envs: dict, timeout: int):
+        self.name = name
+        self.cmd = cmd
+        self.args = list(args or [])
+        self.envs = dict(envs or {})
+        self.timeout = timeout
+
+        self.session: ClientSession | None = None
+        self.tools: list[types.Tool] = []
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self.starts = 0
+        self.failures = 0
+
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._ready: asyncio.Event | None = None
+        self._stop: asyncio.Event | None = None
+        self._error: BaseException | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.session is not None
+
+    async def _run(self):
+        """上流プロセスを起動し、停止要求が来るまで保持する
+
+        stdio_clientはanyioのタスクグループを使うため、開始と終了を同じタスクで行う必要がある
+        """
+        params = StdioServerParameters(
+            command=self.cmd,
+            args=self.args,
+            env={**os.environ, **{k: str(v) for k, v in self.envs.items()}},
+        )
+        try:
+            async with stdio_client(params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await asyncio.wait_for(session.initialize(), timeout=self.timeout)
+                    result = await session.list_tools()
+                    self.tools = list(result.tools)
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except BaseException as e:
+            self._error = e
+            raise
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def ensure_started(self) -> ClientSession:
+        """上流プロセスが起動していなければ起動する"""
+        async with self._lock:
+            if self.session is not None:
+                return self.session
+
+            logger.info(f"Extension起動: {self.name}")
+            self._ready = asyncio.Event()
+            self._stop = asyncio.Event()
+            self._error = None
+            self._task = asyncio.create_task(self._run())
+            await self._ready.wait()
+
+            if self.session is None:
+                with contextlib.suppress(BaseException):
+                    await self._task
+                self._task = None
+                self.failures += 1
+                raise RuntimeError(f"Extensionの起動に失敗しました: {self.name}: {self._error}")
+
+            self.starts += 1
+            self.last_used = time.monotonic()
+            return self.session
+
+    async def stop(self):
+        """上流プロセスを停止する"""
+        async with self._lock:
+            if self._task is None:
+                return
+            logger.info(f"Extension停止: {self.name}")
+            self._stop.set()
+            with contextlib.suppress(BaseException):
+                await asyncio.wait_for(self._task, timeout=10)
+            self._task = None
+            self.session = None
+
+    async def list_tools(self) -> list[types.Tool]:
+        await self.ensure_started()
+        self.last_used = time.monotonic()
+        return self.tools
+
+    async def call_tool(self, name: str, arguments: dict) -> types.CallToolResult:
+        session = await self.ensure_started()
+        self.in_flight += 1
+        try:
+            return await session.call_tool(name, arguments)
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    async def health_check(self) -> bool:
+        """起動中ならpingを送り、応答がなければ停止する（次回リクエストで再起動）"""
+        session = self.session
+        if session is None:
+            return True
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout=10)
+            return True
+        except Exception as e:
+            logger.warning(f"Extensionのヘルスチェックに失敗しました: {self.name}: {e}")
+            self.failures += 1
+            await self.stop()
+            return False
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "in_flight": self.in_flight,
+            "idle_seconds": int(time.monotonic() - self.last_used),
+            "starts": self.starts,
+            "failures": self.failures,
+        }
+
+
+class SessionManagerApp:
+    """/{name}/mcp のリクエストをExtension名に対応するStreamableHTTPSessionManagerに渡すASGIアプリ
+
+    Extension名はURLのパスから取るので、プールに設定されたExtension以外は404を返す
+    """
+
+    def __init__(self, managers: dict[str, StreamableHTTPSessionManager]):
+        self.managers = managers
+
+    async def __call__(self, scope, receive, send):
+        name = scope["path_params"]["name"]
+        manager = self.managers.get(name)
+        if manager is None:
+            response = JSONResponse({"error": f"Extensionがありません: {name}"}, status_code=404)
+            await response(scope, receive, send)
+            return
+        await manager.handle_request(scope, receive, send)
+
+
+def build_proxy_server(ext: PooledExtension) -> Server:
+    """PooledExtensionのtoolsをそのまま公開するMCPサーバーを作成"""
+    server = Server(ext.name)
+
+    @server.list_tools()
+    async def list_tools() -> list[types.Tool]:
+        return await ext.list_tools()
+
+    # 入力検証は上流のExtensionに任せる
+    @server.call_tool(validate_input=False)
+    async def call_tool(name: str, arguments: dict) -> types.CallToolResult:
+        return await ext.call_tool(name, arguments)
+
+    return server
+
+
+class ExtensionPool:
+    """PooledExtensionの集合とアイドル回収・ヘルスチェックのループ"""
+
+    def __init__(self, extensions: list[PooledExtension], idle_timeout: int = 600, health_interval: int = 30):
+        self.extensions = {ext.name: ext for ext in extensions}
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+
+    async def maintain(self):
+        """アイドル回収とヘルスチェックを定期実行する"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for ext in self.extensions.values():
+                if not ext.running:
+                    continue
+                if ext.in_flight == 0 and now - ext.last_used >= self.idle_timeout:
+                    await ext.stop()
+                    continue
+                await ext.health_check()
+
+    async def shutdown(self):
+        for ext in self.extensions.values():
+            await ext.stop()
+
+    def build_app(self) -> Starlette:
+        """/{name}/mcp に各Extensionを、/health に状態をマウントしたASGIアプリを作成"""
+        managers = {
+            name: StreamableHTTPSessionManager(app=build_proxy_server(ext), stateless=True)
+            for name, ext in self.extensions.items()
+        }
+
+        async def health(request):
+            return JSONResponse({name: ext.status() for name, ext in self.extensions.items()})
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            async with contextlib.AsyncExitStack() as stack:
+                for manager in managers.values():
+                    await stack.enter_async_context(manager.run())
+                maintainer = asyncio.create_task(self.maintain())
+                try:
+                    yield
+                finally:
+                    maintainer.cancel()
+                    await self.shutdown()
+
+        routes = [
+            Route("/health", health),
+            Route("/{name}/mcp", endpoint=SessionManagerApp(managers)),
+        ]
+        return Starlette(routes=routes, lifespan=lifespan)
+
+
+def get_pooled_extension_names(pool_url: str, timeout: float = 1.0) -> set[str]:
+    """プールが提供しているExtension名を取得する（到達できなければ空集合）"""
+    if not pool_url:
+        return set()
+    try:
+        with urllib.request.urlopen(pool_url.rstrip("/") + "/health", timeout=timeout) as res:
+            return set(json.loads(res.read()).keys())
+    except Exception as e:
+        logger.warning(f"Extensionプールに接続できません: {pool_url}: {e}")
+        return set()
@@ -0,0 +1,126 @@
+"""
+LLMを使わない決定的なエージェント（FakeRunnerから起動される）
+
+レシピのpromptから編集対象ファイルと（一括実行時の）Todo IDを読み取り、
+設定に従って待機・ファイル編集・出力・失敗を行う。
+乱数のシードはpromptのハッシュ（またはseedオプション）から決めるので、同じレシピなら同じ動作になる。
+
+使用方法:
+    python todo/fake_agent.py --recipe RECIPE --options '{"sleep": 1, "fail_rate": 0.1}'
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import yaml
+
+DEFAULT_OPTIONS = {
+    # 待機秒数（sleep ± sleep_jitter の一様分布）
+    "sleep": 0.0,
+    "sleep_jitter": 0.0,
+    # stdout / stderr に出力する行数と1行のバイト数
+    "output_lines": 10,
+    "stderr_lines": 0,
+    "line_bytes": 80,
+    # 失敗（終了コード1）する確率
+    "fail_rate": 0.0,
+    # 編集対象ファイルに追記するか（編集対象ファイルがなければ fake/ 以下に作成する）
+    "edit": True,
+    # 1ファイルあたりに追記する行数
+    "edit_lines": 1,
+    # 乱数のシード（省略時はpromptのハッシュ）
+    "seed": None,
+}
+
+TASK_RE = re.compile(r"^# タスク \d+/\d+（Todo ID: (\d+)）", re.MULTILINE)
+EDIT_FILES_RE = re.compile(r"^## 編集対象ファイル\n((?:- .*\n?)+)", re.MULTILINE)
+
+
+def load_prompt(recipe_file: str) -> str:
+    """レシピのpromptを取り出す（jinja2のraw囲みを外す）"""
+    with open(recipe_file) as f:
+        recipe = yaml.safe_load(f)
+    prompt = recipe.get("prompt", "")
+    if prompt.startswith("{% raw %}") and prompt.endswith("{% endraw %}"):
+        prompt = prompt[len("{% raw %}") : -len("{% endraw %}")]
+    return prompt
+
+
+def parse_tasks(prompt: str) -> list[tuple[int | None, list[str]]]:
+    """promptを (Todo ID, 編集対象ファイル) のリストに分割する（単体実行ならIDはNone）"""
+    headers = list(TASK_RE.finditer(prompt))
+    if not headers:
+        sections = [(None, prompt)]
+    else:
+        sections = []
+        for i, m in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(prompt)
+            sections.append((int(m.group(1)), prompt[m.start() : end]))
+
+    tasks = []
+    for todo_id, text in sections:
+        files = []
+        m = EDIT_FILES_RE.search(text)
+        if m:
+            files = [line[2:].strip() for line in m.group(1).splitlines() if line.startswith("- ")]
+        tasks.append((todo_id, files))
+    return tasks
+
+
+def edit_file(path: str, rng: random.Random, lines: int):
+    """ファイルに行を追記する（親ディレクトリがなければ作成）"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        for _ in range(lines):
+            f.write("# fake edit {:08x}\n".format(rng.getrandbits(32)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLMを使わない決定的なエージェント")
+    parser.add_argument("--recipe", required=True)
+    parser.add_argument("--options", default="{}")
+    args = parser.parse_args(argv)
+
+    options = {**DEFAULT_OPTIONS, **json.loads(args.options)}
+    prompt = load_prompt(args.recipe)
+    seed = options["seed"]
+    if seed is None:
+        seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:16], 16)
+    rng = random.Random(seed)
+
+    tasks = parse_tasks(prompt)
+    line = "x" * max(options["line_bytes"] - 1, 0)
+    for todo_id, files in tasks:
+        delay = options["sleep"] + rng.uniform(-options["sleep_jitter"], options["sleep_jitter"])
+        if delay > 0:
+            time.sleep(delay)
+
+        for _ in range(options["output_lines"]):
+            print(line)
+        for _ in range(options["stderr_lines"]):
+            print(line, file=sys.stderr)
+
+        if rng.random() < options["fail_rate"]:
+            print("fake agent: failed", file=sys.stderr)
+            return 1
+
+        if options["edit"]:
+            for path in files or ["fake/{}.txt".format(todo_id if todo_id is not None else "task")]:
+                edit_file(path, rng, options["edit_lines"])
+
+        if todo_id is not None:
+            print("TODO-DONE #{}".format(todo_id), flush=True)
+
+    sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+gitのメタデータ（ブランチ・worktree一覧など）のキャッシュ
+
+REST APIの画面表示のたびに git を何度も起動しないよう、結果をリポジトリごとに
+CACHES['git']（デフォルトはファイルベースでAPIのワーカープロセス間で共有）に保存する。
+
+キャッシュの有効性は .git 以下のメタデータのmtimeから作る指紋で判定する:
+
+- HEAD（現在のworktreeと共通ディレクトリ）・packed-refs・index
+- refs/heads 以下のすべてのディレクトリ（refの作成・更新・削除はロックファイルのrenameなのでディレクトリのmtimeが変わる。
+  run_taskのブランチ "ai/<日付>/<時刻>/<id>" のように深い階層も再帰的にたどる。statするのはディレクトリのみでref本体は読まない）
+- worktrees/ とその下の各worktreeのディレクトリ（worktreeのHEADの更新・追加・削除）
+
+ヒット時のコストは数回のstatだけで、gitは起動しない。
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+
+from django.core.cache import caches
+
+
+def find_git_dirs(workdir: str) -> tuple[str, str] | None:
+    """workdirの (gitディレクトリ, 共通gitディレクトリ) をgitを起動せずに求める
+
+    workdirから親方向に .git を探す。見つからなければNone
+    """
+    path = os.path.abspath(workdir)
+    while True:
+        dotgit = os.path.join(path, ".git")
+        if os.path.isdir(dotgit):
+            git_dir = dotgit
+            break
+        if os.path.isfile(dotgit):
+            # worktree: ".git" ファイルに "gitdir: <path>" が書かれている
+            try:
+                with open(dotgit) as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if not content.startswith("gitdir:"):
+                return None
+            git_dir = os.path.normpath(os.path.join(path, content[len("gitdir:") :].strip()))
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        pass
+    return git_dir, common_dir
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _extend_subdirs(paths: list[str], directory: str, recursive: bool = False):
+    """directory の下のディレクトリを paths に追加する（recursiveなら再帰的にたどる）"""
+    try:
+        with os.scandir(directory) as entries:
+            subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return
+    paths.extend(subdirs)
+    if recursive:
+        for subdir in subdirs:
+            _extend_subdirs(paths, subdir, recursive)
+
+
+def fingerprint(workdir: str) -> tuple | None:
+    """refs・HEAD・worktreeの状態を表す指紋（gitリポジトリでなければNone）"""
+    dirs = find_git_dirs(workdir)
+    if dirs is None:
+        return None
+    git_dir, common_dir = dirs
+
+    heads_dir = os.path.join(common_dir, "refs", "heads")
+    paths = [
+        os.path.join(git_dir, "HEAD"),
+        os.path.join(git_dir, "index"),
+        os.path.join(common_dir, "HEAD"),
+        os.path.join(common_dir, "packed-refs"),
+        heads_dir,
+    ]
+    # "ai/<日付>/<時刻>/<id>" のようなブランチは refs/heads/ai/<日付>/<時刻> の中で作成・更新されるので、下のディレクトリをすべて見る
+    _extend_subdirs(paths, heads_dir, recursive=True)
+    worktrees_dir = os.path.join(common_dir, "worktrees")
+    paths.append(worktrees_dir)
+    _extend_subdirs(paths, worktrees_dir)
+
+    return tuple((path, _mtime(path)) for path in sorted(paths))
+
+
+_MISS = object()
+
+
+def _lookup(name: str, workdir: str) -> tuple[tuple | None, str | None, object]:
+    """(指紋, キャッシュキー, キャッシュされた値) を返す。キャッシュできない・ヒットしない場合の値は_MISS"""
+    fp = fingerprint(workdir) if workdir else None
+    if fp is None:
+        return None, None, _MISS
+
+    key = "{}:{}".format(name, hashlib.sha256(os.path.realpath(workdir).encode()).hexdigest())
+    entry = caches["git"].get(key)
+    if entry is not None and entry[0] == fp:
+        return fp, key, entry[1]
+    return fp, key, _MISS
+
+
+def _store(fp: tuple | None, key: str | None, value):
+    # 計算中にrefが変わった場合は古い指紋で保存されるので、次回は再計算される
+    if fp is not None and value:
+        caches["git"].set(key, (fp, value))
+
+
+def cached(name: str):
+    """workdirを第1引数にとる関数の結果を指紋つきでキャッシュするデコレータ
+
+    gitリポジトリが見つからない場合・例外・空の結果（エラー時を含む）はキャッシュしない。
+    コルーチン関数にも使え、同じnameなら同期版とキャッシュを共有する
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(workdir, *args, **kwargs):
+                # statやキャッシュファイルの読み書きでイベントループを止めないようスレッドで実行する
+                fp, key, value = await asyncio.to_thread(_lookup, name, workdir)
+                if value is not _MISS:
+                    return value
+                value = await func(workdir, *args, **kwargs)
+                await asyncio.to_thread(_store, fp, key, value)
+                return value
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(workdir, *args, **kwargs):
+            fp, key, value = _lookup(name, workdir)
+            if value is not _MISS:
+                return value
+            value = func(workdir, *args, **kwargs)
+            _store(fp, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,335 @@
+"""
+Gitのplumbingコマンドを使った操作
+
+`git add -A` と `git commit` は作業ツリー全体を走査してindexを更新するため、
+大きなリポジトリでは変更量に関係なく遅い。ここでは
+
+1. `git status --porcelain=v2 -z` を1回だけ実行して変更パスを得る
+   （core.fsmonitor・core.untrackedCache が設定されていればそのまま利用される）
+2. 変更パスだけを `git update-index --add --remove --stdin` でステージ
+3. `git write-tree` / `git commit-tree` / `git update-ref` でコミット
+
+の順に処理し、コミットにかかる時間が変更量に比例するようにする。
+"""
+
+import contextlib
+import fcntl
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+
+ZERO_OID = "0" * 40
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+# Todoごとのスナップショットを置くref名前空間
+SNAPSHOT_REF_PREFIX = "refs/todo/"
+
+# ブランチの先頭を書き換える処理を直列化するロックファイル（共通gitディレクトリに置く）
+BRANCH_LOCK_FILE = "todo-branch.lock"
+
+
+@dataclass
+class StatusSnapshot:
+    """`git status` 1回分の結果"""
+
+    # 作業ツリーで変更・追加・削除されたパス（未追跡を含む）
+    changed: list[str] = field(default_factory=list)
+    # ステージ済みのパス
+    staged: list[str] = field(default_factory=list)
+    # コンフリクト中のパス
+    unmerged: list[str] = field(default_factory=list)
+
+
+def git(workdir: str, *args: str, input: str | None = None, check: bool = True, env: dict | None = None) -> str:
+    """gitコマンドを実行して標準出力を返す"""
+    result = subprocess.run(
+        ["git", *args],
+        cwd=workdir,
+        input=input,
+        capture_output=True,
+        text=True,
+        check=False,
+        env={**os.environ, **env} if env else None,
+    )
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, ["git", *args], result.stdout, result.stderr)
+    return result.stdout
+
+
+def status_snapshot(workdir: str, pathspecs: list[str] | None = None, env: dict | None = None) -> StatusSnapshot:
+    """`git status --porcelain=v2 -z` を1回実行し、変更パスを分類する
+
+    pathspecsを指定した場合はその範囲だけを調べる
+    """
+    args = ["status", "--porcelain=v2", "-z", "--untracked-files=all", "--no-renames"]
+    if pathspecs:
+        args += ["--", *pathspecs]
+    out = git(workdir, *args, env=env)
+
+    snapshot = StatusSnapshot()
+    for entry in out.split("\0"):
+        if not entry:
+            continue
+        kind = entry[0]
+        if kind == "?":
+            snapshot.changed.append(entry[2:])
+        elif kind == "1":
+            # 1 XY sub mH mI mW hH hI path
+            fields = entry.split(" ", 8)
+            xy, path = fields[1], fields[8]
+            if xy[0] != ".":
+                snapshot.staged.append(path)
+            if xy[1] != ".":
+                snapshot.changed.append(path)
+        elif kind == "u":
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path
+            snapshot.unmerged.append(entry.split(" ", 10)[10])
+    return snapshot
+
+
+def stage_paths(workdir: str, paths: list[str], env: dict | None = None):
+    """指定したパスだけをindexに反映する（削除されたファイルはindexから外す）"""
+    if not paths:
+        return
+    git(
+        workdir,
+        "update-index",
+        "--add",
+        "--remove",
+        "-z",
+        "--stdin",
+        input="".join(p + "\0" for p in paths),
+        env=env,
+    )
+
+
+def resolve_head(workdir: str) -> str | None:
+    """HEADのコミットハッシュ（まだコミットがなければNone）"""
+    out = git(workdir, "rev-parse", "--verify", "-q", "HEAD^{commit}", check=False).strip()
+    return out or None
+
+
+@contextlib.contextmanager
+def branch_lock(workdir: str):
+    """リポジトリ（全worktree共通）の排他ロック
+
+    run_taskのコミット（HEADの読み取りからupdate-refまで）とdecorate_commitの先頭の書き換えは
+    どちらも動いているブランチに対するcompare-and-swapなので、このロックで順番に実行する
+    """
+    common_dir = git(workdir, "rev-parse", "--git-common-dir").strip()
+    with open(os.path.join(workdir, common_dir, BRANCH_LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def write_tree(workdir: str, env: dict | None = None) -> str:
+    return git(workdir, "write-tree", env=env).strip()
+
+
+def commit_tree(workdir: str, tree: str, parents: list[str], message: str) -> str:
+    """treeからコミットオブジェクトを作成（メッセージは標準入力で渡す）"""
+    args = ["commit-tree", tree]
+    for parent in parents:
+        args += ["-p", parent]
+    return git(workdir, *args, input=message).strip()
+
+
+def update_ref(workdir: str, ref: str, new: str, old: str | None = None, reason: str = ""):
+    """refを更新する
+
+    oldを指定した場合は現在値がoldと一致しなければ失敗する（compare-and-swap）。
+    ZERO_OIDを指定するとrefが存在しない場合のみ作成する
+    """
+    args = ["update-ref"]
+    if reason:
+        args += ["-m", reason]
+    args += [ref, new]
+    if old is not None:
+        args.append(old)
+    git(workdir, *args)
+
+
+def diff_tree_numstat(workdir: str, old_tree: str | None, new_tree: str) -> tuple[list[str], int, int]:
+    """2つのtree間の変更ファイルと追加・削除行数
+
+    treeハッシュが一致するサブツリーは辿らないので、変更量に比例する時間で済む
+    """
+    if old_tree is None:
+        args = ["diff-tree", "-r", "--numstat", "-z", "--root", new_tree]
+    else:
+        args = ["diff-tree", "-r", "--numstat", "-z", old_tree, new_tree]
+    out = git(workdir, *args)
+    paths, added, deleted = [], 0, 0
+    for entry in out.split("\0"):
+        fields = entry.split("\t")
+        if len(fields) != 3:
+            continue
+        paths.append(fields[2])
+        added += int(fields[0]) if fields[0].isdigit() else 0
+        deleted += int(fields[1]) if fields[1].isdigit() else 0
+    return paths, added, deleted
+
+
+def tree_of(workdir: str, commit: str | None) -> str | None:
+    if commit is None:
+        return None
+    return git(workdir, "rev-parse", commit + "^{tree}").strip()
+
+
+def stage_changes(workdir: str, limit_to: list[str] | None = None) -> tuple[list[str], list[str]]:
+    """1回のステータス取得結果から変更パスだけをステージする
+
+    limit_toを指定した場合はそのパス（ディレクトリ可）配下のみステージする。
+    ステージ済みの範囲外のパスはindexに残るので、範囲だけをコミットするには write_limited_tree を使う。
+
+    Returns:
+        (ステージしたパス, 変更があったがステージしなかったパス)
+    """
+    snapshot = status_snapshot(workdir)
+    if snapshot.unmerged:
+        raise RuntimeError("コンフリクト中のファイルがあります: {}".format(", ".join(snapshot.unmerged)))
+
+    if limit_to:
+        _, allowed = _limit_matcher(limit_to)
+        excluded = [p for p in snapshot.changed if not allowed(p)]
+        changed = [p for p in snapshot.changed if allowed(p)]
+    else:
+        excluded = []
+        changed = snapshot.changed
+
+    stage_paths(workdir, changed)
+    return list(dict.fromkeys(snapshot.staged + changed)), excluded
+
+
+def _limit_matcher(limit_to: list[str]):
+    targets = [os.path.normpath(p).rstrip("/") for p in limit_to]
+
+    def allowed(path: str) -> bool:
+        return any(path == t or path.startswith(t + "/") for t in targets)
+
+    return targets, allowed
+
+
+def filter_paths(paths: list[str], limit_to: list[str]) -> list[str]:
+    """paths のうち limit_to（ディレクトリ可）配下のものを返す"""
+    _, allowed = _limit_matcher(limit_to)
+    return [p for p in paths if allowed(p)]
+
+
+def _limited_tree(workdir: str, head: str | None, targets: list[str]) -> tuple[str, list[str]]:
+    """HEADから作った一時的なindexに targets 配下の作業ツリーの変更だけを加えてtreeを作る"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        if head:
+            git(workdir, "read-tree", head, env=env)
+        # 一時的なindexはHEADと同じなので、範囲内のHEADからの変更がすべて「未ステージ」として出る
+        limited = status_snapshot(workdir, pathspecs=targets, env=env)
+        stage_paths(workdir, limited.changed + limited.unmerged, env=env)
+        return write_tree(workdir, env=env), limited.changed
+
+
+def write_limited_tree(workdir: str, limit_to: list[str]) -> tuple[str, list[str], list[str]]:
+    """HEADのtreeに limit_to（ディレクトリ可）配下の作業ツリーの変更だけを加えたtreeを作る
+
+    HEADから作った一時的なindexを使うので、本来のindexでステージ済みの範囲外のパス
+    （エージェントが git add したもの、一括実行の他のTodoのファイル）は含めない。本来のindexは変更しない。
+
+    Returns:
+        (treeハッシュ, treeに含めたパス, 変更があったが含めなかったパス)
+    """
+    snapshot = status_snapshot(workdir)
+    if snapshot.unmerged:
+        raise RuntimeError("コンフリクト中のファイルがあります: {}".format(", ".join(snapshot.unmerged)))
+    targets, allowed = _limit_matcher(limit_to)
+    excluded = [p for p in dict.fromkeys(snapshot.staged + snapshot.changed) if not allowed(p)]
+
+    tree, included = _limited_tree(workdir, resolve_head(workdir), targets)
+    return tree, included, excluded
+
+
+def snapshot_ref(todo_id: int, name: str = "snapshot") -> str:
+    """Todoのスナップショットref名（refs/todo/<id>/<name>）"""
+    return "{}{}/{}".format(SNAPSHOT_REF_PREFIX, todo_id, name)
+
+
+def create_snapshot(workdir: str, ref: str, message: str, limit_to: list[str] | None = None) -> str | None:
+    """作業ツリーの状態（未追跡ファイルを含む）をHEADを親とするコミットにしてrefに保存する
+
+    `git stash create` と同様に、indexの一時コピーを使うので本来のindexもstashリストも変更しない。
+    limit_toを指定した場合はそのパス（ディレクトリ可）配下の変更のみ保存する（一括実行で他のTodoの変更を含めない）。
+    変更がなければNoneを返す
+    """
+    head = resolve_head(workdir)
+    if limit_to:
+        tree, _ = _limited_tree(workdir, head, _limit_matcher(limit_to)[0])
+        return _save_snapshot_tree(workdir, ref, message, head, tree)
+
+    index_path = os.path.join(workdir, git(workdir, "rev-parse", "--git-path", "index").strip())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 既存のindexをコピーすればstat情報が使えるので、変更のないファイルはハッシュし直さない
+        tmp_index = os.path.join(tmp, "index")
+        if os.path.exists(index_path):
+            shutil.copyfile(index_path, tmp_index)
+        env = {"GIT_INDEX_FILE": tmp_index}
+
+        snapshot = status_snapshot(workdir, env=env)
+        stage_paths(workdir, snapshot.changed + snapshot.unmerged, env=env)
+        tree = write_tree(workdir, env=env)
+    return _save_snapshot_tree(workdir, ref, message, head, tree)
+
+
+def _save_snapshot_tree(workdir: str, ref: str, message: str, head: str | None, tree: str) -> str | None:
+    if tree == (tree_of(workdir, head) or EMPTY_TREE):
+        return None
+
+    commit = commit_tree(workdir, tree, [head] if head else [], message)
+    update_ref(workdir, ref, commit, reason=message)
+    return commit
+
+
+def restore_snapshot(workdir: str, commit: str):
+    """スナップショットの変更（親コミットとの差分）を作業ツリーに適用する
+
+    indexには反映しない（`git stash pop` と同様に未ステージの変更として戻る）
+    """
+    parent = git(workdir, "rev-parse", "--verify", "-q", commit + "^1", check=False).strip() or EMPTY_TREE
+    diff = subprocess.run(
+        ["git", "diff", "--binary", "--no-renames", parent, commit],
+        cwd=workdir,
+        capture_output=True,
+        check=True,
+    ).stdout
+    if not diff:
+        return
+    subprocess.run(["git", "apply", "--whitespace=nowarn"], cwd=workdir, input=diff, capture_output=True, check=True)
+
+
+def discard_changes(workdir: str):
+    """作業ツリーとindexをHEADに戻し、未追跡ファイルを削除する（ignoreされたファイルは残す）"""
+    git(workdir, "reset", "--hard", "-q")
+    git(workdir, "clean", "-fdq")
+
+
+def list_snapshot_refs(workdir: str) -> list[tuple[str, str, int]]:
+    """refs/todo/ 以下のrefを (ref名, コミット, コミット時刻) で返す"""
+    out = git(
+        workdir,
+        "for-each-ref",
+        "--format=%(refname)%00%(objectname)%00%(committerdate:unix)",
+        SNAPSHOT_REF_PREFIX,
+    )
+    refs = []
+    for line in out.splitlines():
+        ref, commit, timestamp = line.split("\0")
+        refs.append((ref, commit, int(timestamp or 0)))
+    return refs
+
+
+def delete_refs(workdir: str, refs: list[str]):
+    """複数のrefを1回のupdate-refでまとめて削除する"""
+    if not refs:
+        return
+    git(workdir, "update-ref", "--stdin", input="".join("delete {}\n".format(ref) for ref in refs))
@@ -0,0 +1,83 @@
+"""
+TodoListの階層（リポジトリとworktree）
+
+get_or_create_todolist_with_parent はworktreeのTodoListの parent にリポジトリのTodoListを設定する。
+ここでは指定したTodoListとその子孫を再帰CTEの1クエリで読み、Todoのステータス別件数と一緒に木にする。
+"""
+
+from django.db import connection
+
+from .models import Todo
+
+# parent が循環している場合に備えた深さの上限
+MAX_DEPTH = 32
+
+
+def _tree_sql() -> str:
+    statuses = Todo.Status.values
+    counts = ", ".join("COUNT(CASE WHEN todo.status = %s THEN 1 END) AS count_{}".format(s) for s in statuses)
+    return """
+        WITH RECURSIVE tree (id, parent_id, depth) AS (
+            SELECT id, parent_id, 0 FROM todo_todolist WHERE id = %s
+            UNION ALL
+            SELECT child.id, child.parent_id, tree.depth + 1
+            FROM todo_todolist AS child JOIN tree ON child.parent_id = tree.id
+            WHERE tree.depth < %s
+        )
+        SELECT tree.id, tree.parent_id, tree.depth, todolist.name, todolist.workdir, {}
+        FROM tree
+        JOIN todo_todolist AS todolist ON todolist.id = tree.id
+        LEFT JOIN todo_todo AS todo ON todo.todo_list_id = tree.id
+        GROUP BY tree.id, tree.parent_id, tree.depth, todolist.name, todolist.workdir
+        ORDER BY tree.depth, tree.id
+    """.format(counts)
+
+
+def get_todolist_tree(pk: int) -> dict | None:
+    """
+    TodoListとその子孫の木を返す（存在しなければNone）
+
+    Returns:
+        dict: {"id", "name", "workdir", "depth",
+               "counts": {ステータス: 件数}, "total",  # このTodoListのTodo
+               "rollup": {"counts": {...}, "total"},  # 子孫を含めた合計
+               "children": [同じ形の子TodoList, ...]}
+    """
+    statuses = Todo.Status.values
+    with connection.cursor() as cursor:
+        cursor.execute(_tree_sql(), [pk, MAX_DEPTH, *statuses])
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    nodes = {}
+    for row in rows:
+        node_id, parent_id, depth, name, workdir, *values = row
+        if node_id in nodes:
+            # parentが循環している
+            continue
+        counts = dict(zip(statuses, values))
+        nodes[node_id] = {
+            "id": node_id,
+            "parent": parent_id if depth > 0 else None,
+            "name": name,
+            "workdir": workdir,
+            "depth": depth,
+            "counts": counts,
+            "total": sum(counts.values()),
+            "rollup": {"counts": dict(counts), "total": sum(counts.values())},
+            "children": [],
+        }
+
+    # 深い順に親へ合計を足していく（行は depth, id の順）
+    for node in reversed(list(nodes.values())):
+        parent = nodes.get(node["parent"])
+        if parent is None:
+            continue
+        parent["children"].insert(0, node)
+        for s in statuses:
+            parent["rollup"]["counts"][s] += node["rollup"]["counts"][s]
+        parent["rollup"]["total"] += node["rollup"]["total"]
+    for node in nodes.values():
+        del node["parent"]
+    return nodes[int(pk)]
@@ -0,0 +1,52 @@
+"""
+完了済みの古いTodoをアーカイブするDjango管理コマンド
+
+終了（完了・キャンセル・エラー・タイムアウト）から指定日数が経ったTodoを、
+短いトランザクションのバッチごとに ArchivedTodo に移す（todo/archive.py）。
+移したTodoはAPIの ?archived=1 で読める。
+
+使用方法:
+    python manage.py archive_todos [--days N] [--batch-size N] [--pause SECONDS] [--dry-run]
+"""
+
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from todo import archive
+
+
+class Command(BaseCommand):
+    help = "終了から指定日数が経ったTodoを ArchivedTodo に移す"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="終了からこの日数が経ったTodoをアーカイブする（デフォルトはTODO_ARCHIVE_DAYS、未設定なら30）",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="1トランザクションで移す件数（デフォルトはTODO_ARCHIVE_BATCH_SIZE）",
+        )
+        parser.add_argument("--pause", type=float, default=0.1, help="バッチの間に待つ秒数")
+        parser.add_argument("--dry-run", action="store_true", help="対象の件数を表示するだけで移さない")
+
+    def handle(self, days: int | None, batch_size: int | None, pause: float, dry_run: bool, **options):
+        if days is None:
+            days = settings.TODO_ARCHIVE_DAYS or 30
+        if batch_size is None:
+            batch_size = settings.TODO_ARCHIVE_BATCH_SIZE
+
+        if dry_run:
+            count = archive.archivable(timezone.now() - datetime.timedelta(days=days)).count()
+            self.stdout.write(self.style.WARNING("アーカイブ対象: {}件（dry-run）".format(count)))
+            return
+
+        total = archive.archive_todos(days, batch_size=batch_size, pause=pause)
+        self.stdout.write(self.style.SUCCESS("{}件のTodoをアーカイブしました".format(total)))
@@ -0,0 +1,124 @@
+"""
+REST APIのJSONエンコードのマイクロベンチマーク
+
+一時的なTodo（長い prompt・output）を作成し、Todo一覧・詳細のAPIを
+標準のJSONRenderer と ORJSONRenderer（todo/renderers.py）で繰り返し呼び出して、
+1リクエストあたりのCPU時間とエンコードだけの時間を比較する。作成したデータは最後にロールバックする。
+
+使用方法:
+    python manage.py bench_api [--todos 50] [--prompt-size 4000] [--output-size 20000] [--repeat 200]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from todo.models import Todo, TodoList
+from todo.renderers import ORJSONParser, ORJSONRenderer
+from todo.serializers import TodoSerializer
+from todo.views import TodoViewSet
+
+CONFIGS = [
+    ("json", [JSONRenderer], [JSONParser]),
+    ("orjson", [ORJSONRenderer], [ORJSONParser]),
+]
+
+
+# 計測を分割する回数
+ROUNDS = 5
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Todo一覧・詳細APIのJSONエンコードを標準のJSONRendererとorjsonで比較する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--todos", type=int, default=50, help="一覧に含めるTodoの数")
+        parser.add_argument("--prompt-size", type=int, default=4000, help="promptの文字数")
+        parser.add_argument("--output-size", type=int, default=20000, help="outputの文字数")
+        parser.add_argument("--repeat", type=int, default=200, help="1つの計測での呼び出し回数")
+
+    def handle(self, todos: int, prompt_size: int, output_size: int, repeat: int, **kw):
+        try:
+            with transaction.atomic():
+                self.run(todos, prompt_size, output_size, repeat)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def create_todos(self, count: int, prompt_size: int, output_size: int) -> list[Todo]:
+        todo_list = TodoList.objects.create(workdir="/tmp/bench-api", name="bench-api")
+        # 日本語とASCIIが混じった現実的な本文（エスケープが必要な文字を含む）
+        prompt = ("ログイン画面の \"バリデーション\" を修正する。\n" * prompt_size)[:prompt_size]
+        output = ("tests/test_login.py::test_validation PASSED\t✓\n" * output_size)[:output_size]
+        return Todo.objects.bulk_create(
+            [
+                Todo(todo_list=todo_list, title="bench {}".format(i), prompt=prompt, output=output, context=prompt)
+                for i in range(count)
+            ]
+        )
+
+    def measure(self, func, repeat: int) -> tuple[float, float]:
+        """(1回あたりのCPU時間, 1回あたりの経過時間) をミリ秒で返す"""
+        func()
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.process_time() - cpu) * 1000 / repeat, (time.perf_counter() - wall) * 1000 / repeat
+
+    def run(self, count: int, prompt_size: int, output_size: int, repeat: int):
+        todos = self.create_todos(count, prompt_size, output_size)
+        client = Client()
+        detail_url = "/api/todos/{}/".format(todos[0].pk)
+        list_url = "/api/todos/?todo_list={}&limit={}".format(todos[0].todo_list_id, count)
+        detail_data = TodoSerializer(todos[0]).data
+        list_data = TodoSerializer(todos, many=True).data
+
+        self.stdout.write(
+            "Todo {}件, prompt {}文字, output {}文字, {}回ずつ".format(count, prompt_size, output_size, repeat)
+        )
+        self.stdout.write("{:<28} {:>12} {:>12} {:>10}".format("", "cpu ms/req", "wall ms/req", "bytes"))
+
+        cases = {
+            "GET list": lambda renderer: client.get(list_url).content,
+            "GET detail": lambda renderer: client.get(detail_url).content,
+            "render full list": lambda renderer: renderer.render(list_data, "application/json"),
+            "render detail": lambda renderer: renderer.render(detail_data, "application/json"),
+        }
+        # 実行順による差（GC・キャッシュの状態）が出ないよう、設定を交互に切り替えて計測する
+        totals = {(case, name): [0.0, 0.0] for case in cases for name, _, _ in CONFIGS}
+        sizes = {}
+        original_renderers, original_parsers = TodoViewSet.renderer_classes, TodoViewSet.parser_classes
+        try:
+            for _ in range(ROUNDS):
+                for case, func in cases.items():
+                    for name, renderers, parsers in CONFIGS:
+                        TodoViewSet.renderer_classes, TodoViewSet.parser_classes = renderers, parsers
+                        renderer = renderers[0]()
+                        sizes[case] = len(func(renderer))
+                        cpu, wall = self.measure(lambda: func(renderer), max(repeat // ROUNDS, 1))
+                        totals[(case, name)][0] += cpu / ROUNDS
+                        totals[(case, name)][1] += wall / ROUNDS
+        finally:
+            TodoViewSet.renderer_classes, TodoViewSet.parser_classes = original_renderers, original_parsers
+
+        for (case, name), (cpu, wall) in totals.items():
+            self.stdout.write(
+                "{:<28} {:>12.3f} {:>12.3f} {:>10}".format("{} ({})".format(case, name), cpu, wall, sizes[case])
+            )
+        results = {key: cpu for key, (cpu, _) in totals.items()}
+
+        for case in cases:
+            before, after = results[(case, "json")], results[(case, "orjson")]
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "{}: {:.3f} ms -> {:.3f} ms（{:.1f}倍）".format(case, before, after, before / after if after else 0)
+                )
+            )
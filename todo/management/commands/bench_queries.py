@@ -0,0 +1,196 @@
+"""
+主要なクエリの実行計画とスケールのベンチマーク
+
+一時的なSQLiteデータベースを作ってマイグレーションし、大量のTodo（デフォルト100万件）を生成して、
+task_worker・REST API・MCPサーバーの主要なクエリについて
+
+- EXPLAIN QUERY PLAN に全件スキャン（インデックスを使わない SCAN、ORDER BY用の一時B-tree）がないこと
+- 実行時間（中央値）
+
+を確認する。全件スキャンがあればエラーで終了する。
+
+使用方法:
+    python manage.py bench_queries [--todos 1000000] [--todolists 1000] [--repeat 20] [--path bench.sqlite3]
+"""
+
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from todo.models import Todo, TodoList
+
+ALIAS = "bench"
+
+# 実行計画のうち全件スキャンを表す行（"SCAN todo_todo USING INDEX ..." はインデックス順の走査なので許可する）
+FULL_SCAN = re.compile(r"^SCAN (\w+)( AS \w+)?$")
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+# Todoのステータスの分布（完了済みが大半を占める）
+STATUS_DISTRIBUTION = [
+    ("completed", 880),
+    ("cancelled", 40),
+    ("error", 20),
+    ("timeout", 10),
+    ("waiting", 30),
+    ("queued", 15),
+    ("running", 5),
+]
+
+
+def hot_queries(workdirs: list[str], todo_list_id: int) -> dict:
+    """計測するクエリ（名前 -> QuerySet）"""
+    todos = Todo.objects.using(ALIAS)
+    return {
+        # task_worker.process_loop
+        "worker: next queued": todos.filter(status=Todo.Status.QUEUED).order_by("-priority", "created_at")[:1],
+        "worker: next queued (busy workdirs)": todos.filter(status=Todo.Status.QUEUED)
+        .exclude(todo_list__workdir__in=workdirs)
+        .order_by("-priority", "created_at")[:1],
+        # task_worker.collect_batch
+        "worker: batch candidates": todos.filter(
+            status=Todo.Status.QUEUED, todo_list_id=todo_list_id, agent_id=None, branch_name="", stash_id=""
+        ).order_by("-priority", "created_at")[:20],
+        # REST API（TodoViewSet.list）・MCPサーバー（listExternalTask）
+        "api: list": todos.order_by("id")[:51],
+        "api: list by todo_list": todos.filter(todo_list_id=todo_list_id).order_by("-created_at", "-id")[:51],
+        "api: list by todo_list and status": todos.filter(todo_list_id=todo_list_id, status=Todo.Status.COMPLETED)
+        .order_by("-created_at", "-id")[:51],
+        "api: list by status": todos.filter(status=Todo.Status.WAITING).order_by("-created_at", "-id")[:51],
+        "api: list by -updated_at": todos.order_by("-updated_at", "-id")[:51],
+        "api: list by todo_list -updated_at": todos.filter(todo_list_id=todo_list_id).order_by("-updated_at", "-id")[
+            :51
+        ],
+        # get_or_create_todolist_with_parent
+        "todolist: by workdir": TodoList.objects.using(ALIAS).filter(workdir=workdirs[0])[:1],
+        "todolist: children": TodoList.objects.using(ALIAS).filter(parent_id=todo_list_id),
+    }
+
+
+def is_rowid_order(queryset) -> bool:
+    """条件なしで主キー順にLIMITを付けて読むクエリか"""
+    query = queryset.query
+    return not query.where and query.high_mark is not None and list(query.order_by) in (["id"], ["pk"])
+
+
+class Command(BaseCommand):
+    help = "大量のTodoで主要なクエリの実行計画（全件スキャンがないこと）と実行時間を確認する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--todos", type=int, default=1_000_000, help="生成するTodoの数")
+        parser.add_argument("--todolists", type=int, default=1000, help="生成するTodoListの数")
+        parser.add_argument("--repeat", type=int, default=20, help="各クエリの実行回数")
+        parser.add_argument(
+            "--path",
+            type=str,
+            default=None,
+            help="ベンチマーク用のデータベースファイル（既にデータがあれば再利用する。省略時は一時ファイル）",
+        )
+
+    def handle(self, todos: int, todolists: int, repeat: int, path: str | None, **kw):
+        tmpdir = None
+        if path is None:
+            tmpdir = tempfile.TemporaryDirectory()
+            path = os.path.join(tmpdir.name, "bench.sqlite3")
+        connections.settings[ALIAS] = dict(connections.settings["default"], NAME=path, TEST={})
+        try:
+            call_command("migrate", database=ALIAS, verbosity=0)
+            if not Todo.objects.using(ALIAS).exists():
+                self.generate(todos, todolists)
+            self.run(repeat)
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.settings[ALIAS]
+            if tmpdir is not None:
+                tmpdir.cleanup()
+
+    def generate(self, count: int, todolists: int):
+        """TodoListとTodoをSQLで一括生成する（10個に1つがリポジトリ、残りはそのworktree）"""
+        start = time.perf_counter()
+        cases = " ".join(
+            "WHEN r < {} THEN '{}'".format(sum(weight for _, weight in STATUS_DISTRIBUTION[: i + 1]), status)
+            for i, (status, _) in enumerate(STATUS_DISTRIBUTION)
+        )
+        total_weight = sum(weight for _, weight in STATUS_DISTRIBUTION)
+        connection = connections[ALIAS]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s)
+                INSERT INTO todo_todolist (id, name, workdir, parent_id, created_at, updated_at)
+                SELECT i, 'list-' || i,
+                       CASE WHEN i %% 10 = 1 THEN '/bench/repo-' || i ELSE '/bench/worktrees/wt-' || i END,
+                       CASE WHEN i %% 10 = 1 THEN NULL ELSE i - (i - 1) %% 10 END,
+                       datetime('now'), datetime('now')
+                FROM n
+                """,
+                [todolists],
+            )
+            # created_at は1件ごとに1秒ずつ進め、完了済みは1時間後に更新された扱いにする。
+            # r は CASE の分岐ごとに評価し直されるので random() ではなく i から決める
+            cursor.execute(
+                """
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s),
+                rows AS (
+                    SELECT i, (i * 7919) %% {total} AS r,
+                           datetime('now', '-' || (%s - i) || ' seconds') AS created_at
+                    FROM n
+                )
+                INSERT INTO todo_todo (
+                    todo_list_id, title, priority, system_prompt, ref_files, edit_files, prompt, context, status,
+                    output, validation_command, validation_status, validation_output, timeout, created_at,
+                    updated_at, branch_name, auto_stash, keep_branch, stash_id, interrupted_files
+                )
+                SELECT 1 + abs(random()) %% %s, 'task ' || i, abs(random()) %% 3, '', '[]', '[]',
+                       'bench prompt ' || i, '', CASE {cases} END,
+                       NULL, '', '', '', 900, created_at,
+                       datetime(created_at, '+1 hour'), '', 1, 0, '', '[]'
+                FROM rows
+                """.format(total=total_weight, cases=cases),
+                [count, count, todolists],
+            )
+            cursor.execute("ANALYZE")
+        self.stdout.write(
+            "{}件のTodo・{}件のTodoListを生成しました（{:.1f}秒）".format(count, todolists, time.perf_counter() - start)
+        )
+
+    def explain(self, queryset) -> list[str]:
+        sql, params = queryset.query.sql_with_params()
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def run(self, repeat: int):
+        todo_lists = TodoList.objects.using(ALIAS).order_by("id")
+        workdirs = list(todo_lists.values_list("workdir", flat=True)[:4])
+        todo_list_id = todo_lists.values_list("id", flat=True).first()
+
+        failures = []
+        for name, queryset in hot_queries(workdirs, todo_list_id).items():
+            plan = self.explain(queryset)
+            scans = [line for line in plan if FULL_SCAN.match(line) or TEMP_SORT in line]
+            if is_rowid_order(queryset):
+                # 条件なしで主キー順に読むのはrowid順の走査で、LIMITの件数で止まる
+                scans = [line for line in scans if TEMP_SORT in line]
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset._chain())
+                timings.append((time.perf_counter() - start) * 1000)
+
+            style = self.style.ERROR if scans else self.style.SUCCESS
+            self.stdout.write(style("{:<40} {:>9.3f} ms".format(name, statistics.median(timings))))
+            for line in plan:
+                self.stdout.write("    " + line)
+            if scans:
+                failures.append(name)
+
+        if failures:
+            raise CommandError("全件スキャンがあります: {}".format(", ".join(failures)))
+        self.stdout.write(self.style.SUCCESS("全件スキャンはありません"))
@@ -0,0 +1,188 @@
+"""
+SQLiteへの同時書き込みのベンチマーク
+
+一時的なSQLiteデータベースを作ってマイグレーションし、N個のプロセスから同時に書き込む。
+プロセスは次の役割を順に割り当てる（実際のプロセスの書き込みを模したもの）:
+
+- api: Todoを作成し、一覧を読む（REST API）
+- worker: queuedのTodoを1件選んでrunningにする（task_worker）
+- run_task: runningのTodoの output を更新する（run_taskの子プロセス）
+- mcp: queuedのTodoを作成し、同じTodoListの一覧を読む（MCPサーバー）
+
+SQLiteの既定の設定（journal_mode=DELETE・synchronous=FULL・DEFERREDトランザクション）と
+settingsの SQLITE_*（todo/sqlite.py）を比べ、1秒あたりの操作数・"database is locked" の件数・
+1操作あたりの時間（ロック待ちを含む）を表示する。
+
+使用方法:
+    python manage.py bench_sqlite [--writers 8] [--duration 5]
+"""
+
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test import override_settings
+
+from todo.models import Todo, TodoList
+
+ALIAS = "bench"
+
+ROLES = ["api", "worker", "run_task", "mcp"]
+
+# 比較する設定: (名前, transaction_mode, settingsの上書き)
+CONFIGS = [
+    (
+        "sqlite default",
+        "DEFERRED",
+        {
+            "SQLITE_JOURNAL_MODE": "delete",
+            # Pythonのsqlite3の既定のtimeout（5秒）と同じ
+            "SQLITE_BUSY_TIMEOUT": 5000,
+            "SQLITE_SYNCHRONOUS": "full",
+            "SQLITE_MMAP_SIZE": 0,
+            "SQLITE_CACHE_SIZE": -2000,
+        },
+    ),
+    ("settings", None, {}),
+]
+
+# 事前に作成するqueuedのTodoの数
+INITIAL_QUEUED = 200
+
+
+def do_api(todo_list_id: int, i: int):
+    todos = Todo.objects.using(ALIAS)
+    todos.create(todo_list_id=todo_list_id, title="api {}".format(i), prompt="bench")
+    list(todos.filter(todo_list_id=todo_list_id).order_by("-created_at", "-id")[:20])
+
+
+def do_worker(todo_list_id: int, i: int):
+    with transaction.atomic(using=ALIAS):
+        todo = (
+            Todo.objects.using(ALIAS).filter(status=Todo.Status.QUEUED).order_by("-priority", "created_at").first()
+        )
+        if todo is not None:
+            todo.status = Todo.Status.RUNNING
+            todo.save(using=ALIAS, update_fields=["status", "updated_at"])
+
+
+def do_run_task(todo_list_id: int, i: int):
+    todo = Todo.objects.using(ALIAS).filter(todo_list_id=todo_list_id, status=Todo.Status.RUNNING).last()
+    if todo is None:
+        todo = Todo.objects.using(ALIAS).filter(todo_list_id=todo_list_id).last()
+    todo.output = "step {}\n".format(i) * 50
+    todo.save(using=ALIAS, update_fields=["output", "updated_at"])
+
+
+def do_mcp(todo_list_id: int, i: int):
+    todos = Todo.objects.using(ALIAS)
+    todos.create(todo_list_id=todo_list_id, title="mcp {}".format(i), prompt="bench", status=Todo.Status.QUEUED)
+    list(todos.filter(todo_list_id=todo_list_id).order_by("-created_at", "-id")[:10])
+
+
+OPERATIONS = {"api": do_api, "worker": do_worker, "run_task": do_run_task, "mcp": do_mcp}
+
+
+def writer(role: str, todo_list_id: int, overrides: dict, start_at: float, duration: float, results):
+    """1つの書き込みプロセス（forkした子プロセスで実行する）"""
+    with override_settings(TODO_EVENTS_PATH="", **overrides):
+        operation = OPERATIONS[role]
+        latencies = []
+        locked = 0
+        time.sleep(max(start_at - time.time(), 0))
+        end = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end:
+            i += 1
+            start = time.perf_counter()
+            try:
+                operation(todo_list_id, i)
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+        connections[ALIAS].close()
+    results.put((role, latencies, locked))
+
+
+class Command(BaseCommand):
+    help = "複数のプロセスからSQLiteに同時に書き込み、既定の設定とSQLITE_*の設定のスループット・ロック待ちを比べる"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8, help="同時に書き込むプロセスの数")
+        parser.add_argument("--duration", type=float, default=5.0, help="1つの設定で書き込む秒数")
+
+    def handle(self, writers: int, duration: float, **kw):
+        self.stdout.write(
+            "{}プロセス（{}）、{}秒ずつ".format(
+                writers, ", ".join(ROLES[i % len(ROLES)] for i in range(writers)), duration
+            )
+        )
+        self.stdout.write(
+            "{:<16} {:>8} {:>8} {:>8} {:>9} {:>9} {:>9}".format(
+                "", "ops", "ops/s", "locked", "p50 ms", "p99 ms", "max ms"
+            )
+        )
+        for name, transaction_mode, overrides in CONFIGS:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                result = self.run(os.path.join(tmpdir, "bench.sqlite3"), transaction_mode, overrides, writers, duration)
+            self.stdout.write(self.style.SUCCESS("{:<16} {}".format(name, result)))
+
+    def run(self, path: str, transaction_mode: str | None, overrides: dict, writers: int, duration: float) -> str:
+        database = dict(connections.settings["default"], NAME=path, TEST={})
+        if transaction_mode is not None:
+            database["OPTIONS"] = dict(database.get("OPTIONS", {}), transaction_mode=transaction_mode)
+        connections.settings[ALIAS] = database
+        try:
+            with override_settings(TODO_EVENTS_PATH="", **overrides):
+                call_command("migrate", database=ALIAS, verbosity=0)
+                todo_list = TodoList.objects.using(ALIAS).create(workdir="/bench/sqlite", name="bench-sqlite")
+                Todo.objects.using(ALIAS).bulk_create(
+                    [
+                        Todo(todo_list=todo_list, title="queued {}".format(i), status=Todo.Status.QUEUED)
+                        for i in range(INITIAL_QUEUED)
+                    ]
+                )
+            # forkする前に接続を閉じる（子プロセスはそれぞれ接続を開く）
+            connections.close_all()
+
+            context = multiprocessing.get_context("fork")
+            results = context.Queue()
+            start_at = time.time() + 0.5
+            processes = [
+                context.Process(
+                    target=writer,
+                    args=(ROLES[i % len(ROLES)], todo_list.pk, overrides, start_at, duration, results),
+                )
+                for i in range(writers)
+            ]
+            for process in processes:
+                process.start()
+            outputs = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.settings[ALIAS]
+
+        latencies = sorted(latency for _, values, _ in outputs for latency in values)
+        locked = sum(count for _, _, count in outputs)
+        if not latencies:
+            return "{:>8} {:>8} {:>8}".format(0, 0, locked)
+        p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+        return "{:>8} {:>8.0f} {:>8} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+            len(latencies),
+            len(latencies) / duration,
+            locked,
+            statistics.median(latencies),
+            p99,
+            latencies[-1],
+        )
@@ -0,0 +1,123 @@
+"""
+コミットの絵文字を差し替えるDjango管理コマンド
+
+run_task は仮の絵文字（:robot:）で即座にコミットし、このコマンドをバックグラウンドで起動する。
+LLMで絵文字を選択し（入力テキストのハッシュでキャッシュ）、
+
+- ブランチの先頭がまだ対象コミットなら、メッセージだけ差し替えたコミットでブランチを更新する
+- ブランチが既に進んでいれば、コミットは書き換えず refs/notes/emoji にnoteとして記録する
+
+同じブランチで次のTodoのコミット（run_task）と競合しないよう、書き換えは git_utils.branch_lock の中で行う。
+優先されるのはTodoのコミットで、先にコミットされていればこちらはnoteになる。
+こちらが先に書き換えた場合は、run_taskがロックを取った後に新しい先頭の上にコミットし直す。
+
+使用方法:
+    python manage.py decorate_commit --workdir WORKDIR --commit SHA --branch BRANCH --input-file FILE
+"""
+
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from todo import git_utils
+from todo.context_bundle import ContentStore
+from todo.emoji import PLACEHOLDER, cache_emoji, get_cached_emoji, select_emoji_llm
+
+NOTES_REF = "refs/notes/emoji"
+
+
+class Command(BaseCommand):
+    help = "コミットの仮の絵文字をLLMで選択した絵文字に差し替える"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workdir", type=str, required=True, help="リポジトリのworkdir")
+        parser.add_argument("--commit", type=str, required=True, help="対象コミット")
+        parser.add_argument("--branch", type=str, required=True, help="対象コミットを先頭に持つブランチ")
+        parser.add_argument("--input-file", type=str, required=True, help="絵文字選択の入力テキスト（処理後に削除）")
+
+    def handle(self, workdir: str, commit: str, branch: str, input_file: str, **options):
+        try:
+            with open(input_file) as f:
+                summary = f.read()
+        finally:
+            if os.path.exists(input_file):
+                os.unlink(input_file)
+
+        store = ContentStore(settings.EMOJI_CACHE_ROOT, settings.EMOJI_CACHE_MAX_BYTES)
+        emoji = get_cached_emoji(summary, store)
+        if emoji is None:
+            try:
+                emoji = select_emoji_llm(summary)
+            except Exception as e:
+                raise CommandError("絵文字選択エラー: {}".format(e))
+            cache_emoji(summary, emoji, store)
+            store.evict()
+
+        if emoji == PLACEHOLDER:
+            return
+
+        with git_utils.branch_lock(workdir):
+            rewritten = self.rewrite_tip(workdir, commit, branch, emoji)
+        if rewritten:
+            self.stdout.write(self.style.SUCCESS("{} の絵文字を {} に差し替えました".format(branch, emoji)))
+        else:
+            subprocess.run(
+                ["git", "notes", "--ref", NOTES_REF, "add", "-f", "-m", emoji, commit],
+                cwd=workdir,
+                check=True,
+                capture_output=True,
+            )
+            self.stdout.write(self.style.WARNING("{} は既に進んでいるため {} をnoteに記録しました".format(branch, emoji)))
+
+    def rewrite_tip(self, workdir, commit, branch, emoji):
+        """ブランチの先頭がcommitなら、メッセージの仮の絵文字を差し替えたコミットに置き換える"""
+        raw = subprocess.run(
+            ["git", "cat-file", "commit", commit], cwd=workdir, capture_output=True, text=True, check=True
+        ).stdout
+        message = raw.split("\n\n", 1)[1]
+        if not message.startswith(PLACEHOLDER):
+            return False
+
+        # 作者・日時は元のコミットのものを引き継ぐ
+        fields = subprocess.run(
+            ["git", "log", "-1", "--format=%an%x00%ae%x00%ad%x00%cn%x00%ce%x00%cd%x00%T%x00%P", "--date=raw", commit],
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.rstrip("\n").split("\0")
+        an, ae, ad, cn, ce, cd, tree, parents = fields
+        env = os.environ.copy()
+        env.update(
+            {
+                "GIT_AUTHOR_NAME": an,
+                "GIT_AUTHOR_EMAIL": ae,
+                "GIT_AUTHOR_DATE": ad,
+                "GIT_COMMITTER_NAME": cn,
+                "GIT_COMMITTER_EMAIL": ce,
+                "GIT_COMMITTER_DATE": cd,
+            }
+        )
+        cmd = ["git", "commit-tree", tree]
+        for parent in parents.split():
+            cmd += ["-p", parent]
+        new_commit = subprocess.run(
+            cmd,
+            cwd=workdir,
+            input=emoji + message[len(PLACEHOLDER) :],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout.strip()
+
+        # ブランチが動いていなければ更新する（old-valueを指定したcompare-and-swap）
+        result = subprocess.run(
+            ["git", "update-ref", "-m", "decorate_commit: emoji", "refs/heads/{}".format(branch), new_commit, commit],
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+        )
+        return result.returncode == 0
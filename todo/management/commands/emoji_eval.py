@@ -0,0 +1,81 @@
+"""
+絵文字のローカル分類をオフライン評価するDjango管理コマンド
+
+完了したTodoについて、ローカル分類（classify_emoji）の結果とLLMの選択を比較し、
+一致率を確信度の有無ごとに集計する。
+LLMの選択は絵文字キャッシュにあればそれを使い、なければLLMに問い合わせる（--cached-onlyで無効化）。
+
+使用方法:
+    python manage.py emoji_eval [--limit N] [--cached-only] [--verbose]
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.context_bundle import ContentStore
+from todo.emoji import cache_emoji, classify_emoji, get_cached_emoji, select_emoji_llm
+from todo.models import Todo
+
+
+class Command(BaseCommand):
+    help = "絵文字のローカル分類とLLMの選択の一致率を評価する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="評価するTodoの最大件数（新しい順）")
+        parser.add_argument("--cached-only", action="store_true", help="キャッシュ済みのLLMの選択のみで評価する")
+        parser.add_argument("--verbose", action="store_true", help="不一致のTodoを表示する")
+
+    def handle(self, limit: int, cached_only: bool, verbose: bool, **options):
+        store = ContentStore(settings.EMOJI_CACHE_ROOT, settings.EMOJI_CACHE_MAX_BYTES)
+        todos = Todo.objects.filter(status=Todo.Status.COMPLETED).order_by("-finished_at", "-id")[:limit]
+
+        # confident(bool) -> Counter({"total": n, "agree": m})
+        stats = {True: Counter(), False: Counter()}
+        skipped = 0
+        for todo in todos:
+            # run_task.commit_changes と同じ入力
+            summary = "\n".join(["# {}".format(todo.title), "# 修正内容", todo.prompt, "# 結果", todo.output or ""])
+
+            expected = get_cached_emoji(summary, store)
+            if expected is None and not cached_only:
+                try:
+                    expected = select_emoji_llm(summary)
+                    cache_emoji(summary, expected, store)
+                except Exception as e:
+                    self.stderr.write(self.style.WARNING("Todo #{}: LLMエラー: {}".format(todo.id, e)))
+            if expected is None:
+                skipped += 1
+                continue
+
+            local = classify_emoji(summary)
+            agree = local.emoji == expected
+            stats[local.confident]["total"] += 1
+            stats[local.confident]["agree"] += int(agree)
+            if verbose and not agree:
+                self.stdout.write(
+                    "Todo #{}: local={} (score={:.2f}, margin={:.2f}) llm={}".format(
+                        todo.id, local.emoji, local.score, local.margin, expected
+                    )
+                )
+        store.evict()
+
+        total = stats[True]["total"] + stats[False]["total"]
+        if total == 0:
+            self.stdout.write(self.style.WARNING("評価できるTodoがありません（スキップ: {}件）".format(skipped)))
+            return
+
+        for confident, label in ((True, "確信度高（LLM不要）"), (False, "確信度低（LLMへフォールバック）")):
+            c = stats[confident]
+            rate = c["agree"] / c["total"] * 100 if c["total"] else 0.0
+            self.stdout.write("{}: {}件, 一致 {}件 ({:.1f}%)".format(label, c["total"], c["agree"], rate))
+
+        agree = stats[True]["agree"] + stats[False]["agree"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                "全体: {}件, 一致率 {:.1f}%, ローカルで確定 {:.1f}%（スキップ: {}件）".format(
+                    total, agree / total * 100, stats[True]["total"] / total * 100, skipped
+                )
+            )
+        )
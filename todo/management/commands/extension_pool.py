@@ -0,0 +1,63 @@
+"""
+Extensionプール：Django管理コマンド
+
+pooled=True の stdio型Extensionを常駐プロセスとして起動し、
+streamable HTTP（http://HOST:PORT/{name}/mcp）で複数のTodo実行から共有する。
+
+run_task は環境変数 EXTENSION_POOL_URL（例: http://127.0.0.1:8765）が設定されていて、
+プールがそのExtensionを提供している場合にのみプール経由で接続する。
+プールに到達できない場合は従来通りTodoごとにstdioで起動する。
+
+使用方法:
+    python manage.py extension_pool [--host HOST] [--port PORT]
+"""
+
+import uvicorn
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.extension_pool import ExtensionPool, PooledExtension
+from todo.models import Extension
+
+
+class Command(BaseCommand):
+    help = "Extensionプール：pooledなExtensionを常駐させて共有する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", type=str, default="127.0.0.1", help="待ち受けホスト")
+        parser.add_argument("--port", type=int, default=8765, help="待ち受けポート")
+        parser.add_argument(
+            "--idle-timeout",
+            type=int,
+            default=None,
+            help="アイドル状態のExtensionを停止するまでの秒数（デフォルト: EXTENSION_POOL_IDLE_TIMEOUT）",
+        )
+        parser.add_argument(
+            "--health-interval",
+            type=int,
+            default=None,
+            help="ヘルスチェック間隔（秒）（デフォルト: EXTENSION_POOL_HEALTH_INTERVAL）",
+        )
+
+    def handle(self, host: str, port: int, idle_timeout: int | None, health_interval: int | None, **options):
+        extensions = [
+            PooledExtension(ext.name, ext.cmd, ext.args, ext.envs, ext.timeout)
+            for ext in Extension.objects.filter(pooled=True, type="stdio").order_by("name")
+        ]
+        if not extensions:
+            self.stdout.write(self.style.WARNING("pooled=True のstdio型Extensionがありません"))
+            return
+
+        pool = ExtensionPool(
+            extensions,
+            idle_timeout=idle_timeout if idle_timeout is not None else settings.EXTENSION_POOL_IDLE_TIMEOUT,
+            health_interval=(
+                health_interval if health_interval is not None else settings.EXTENSION_POOL_HEALTH_INTERVAL
+            ),
+        )
+
+        self.stdout.write(self.style.SUCCESS("Extensionプールを開始しました"))
+        for ext in extensions:
+            self.stdout.write(f"  {ext.name}: http://{host}:{port}/{ext.name}/mcp")
+
+        uvicorn.run(pool.build_app(), host=host, port=port, log_level="info")
@@ -0,0 +1,67 @@
+"""
+不要になったスナップショットrefを削除するDjango管理コマンド
+
+run_task / task_worker は中断時・退避時の変更を refs/todo/<id>/snapshot, refs/todo/<id>/workdir に保存する。
+どのTodo（アーカイブ済みを含む）の stash_id からも参照されていないrefのうち、指定日数より古いものをリポジトリごとにまとめて削除する。
+（Todoが削除されたもの・復元済みのもの・復元に失敗して残したものが対象）
+
+使用方法:
+    python manage.py gc_snapshots [--days N] [--workdir WORKDIR] [--dry-run]
+"""
+
+import os
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand
+
+from todo import git_utils
+from todo.models import ArchivedTodo, Todo, TodoList
+
+
+class Command(BaseCommand):
+    help = "参照されていない古いスナップショットref（refs/todo/）を削除する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="この日数より古い未参照のrefを削除する")
+        parser.add_argument("--workdir", type=str, help="対象リポジトリ（省略時はすべてのTodoListのworkdir）")
+        parser.add_argument("--dry-run", action="store_true", help="削除対象を表示するだけで削除しない")
+
+    def handle(self, days: int, workdir: str | None, dry_run: bool, **options):
+        workdirs = [workdir] if workdir else list(TodoList.objects.values_list("workdir", flat=True).distinct())
+        referenced = set(Todo.objects.exclude(stash_id="").values_list("stash_id", flat=True))
+        referenced |= set(ArchivedTodo.objects.exclude(stash_id="").values_list("stash_id", flat=True))
+        cutoff = time.time() - days * 86400
+
+        # worktreeはrefを共有するので、共通のgitディレクトリ単位で1回だけ処理する
+        seen = set()
+        total = 0
+        for path in workdirs:
+            try:
+                common_dir = os.path.realpath(
+                    os.path.join(path, git_utils.git(path, "rev-parse", "--git-common-dir").strip())
+                )
+            except (subprocess.CalledProcessError, OSError):
+                continue
+            if common_dir in seen:
+                continue
+            seen.add(common_dir)
+
+            stale = [
+                ref
+                for ref, commit, timestamp in git_utils.list_snapshot_refs(path)
+                if commit not in referenced and timestamp < cutoff
+            ]
+            if not stale:
+                continue
+
+            for ref in stale:
+                self.stdout.write("{}: {}".format(path, ref))
+            if not dry_run:
+                git_utils.delete_refs(path, stale)
+            total += len(stale)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("削除対象: {}件（dry-run）".format(total)))
+        else:
+            self.stdout.write(self.style.SUCCESS("{}件のスナップショットrefを削除しました".format(total)))
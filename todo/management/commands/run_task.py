@@ -15,13 +15,17 @@ AIエージェントを実行するDjango管理コマンド
     --worktree-root: worktreeのルートディレクトリ
 """
 
+import codecs
+import collections
 import io
 import os
 import random
 import re
 import string
 import subprocess
+import sys
 import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -29,8 +33,13 @@ import yaml
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from todo.emoji import select_emoji
-from todo.models import Agent, Todo, TodoList
+from todo import git_utils
+from todo.context_bundle import ContentStore, build_context_bundle
+from todo.emoji import PLACEHOLDER, cache_emoji, classify_emoji, get_cached_emoji, select_emoji_llm
+from todo.extension_pool import get_pooled_extension_names
+from todo.models import Agent, Todo, TodoList, ValidationResult, ValidationStatus
+from todo.runners import AgentRunner, GooseRunner, get_runner
+from todo.validation import get_clean_tree, run_validation_command
 
 
 class LiteralDumper(yaml.SafeDumper):
@@ -53,6 +62,66 @@ def str_representer(dumper, data):
 
 LiteralDumper.add_representer(str, str_representer)
 
+# ログファイルを追いかける際の1回あたりの読み込みサイズ
+LOG_CHUNK_SIZE = 64 * 1024
+
+
+def read_log_tail(path: str, max_bytes: int) -> str:
+    """ログファイルの末尾max_bytesバイトを文字列として返す
+
+    ファイル全体は読み込まず、seekで末尾のみ読む。切り詰めた場合は先頭に全文のパスを付ける。
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size <= max_bytes:
+            f.seek(0)
+            return f.read().decode("utf-8", errors="replace")
+        f.seek(size - max_bytes)
+        # 途中で切れたマルチバイト文字は捨てる
+        tail = f.read().decode("utf-8", errors="ignore")
+    return "...（省略: 全文は {}）\n{}".format(path, tail)
+
+
+# 一括実行時にエージェントがタスクごとに出力する完了マーカー
+BATCH_DONE_MARKER = "TODO-DONE"
+BATCH_DONE_RE = re.compile(re.escape(BATCH_DONE_MARKER) + r" #(\d+)")
+
+
+def split_batch_output(path: str, todo_ids: list[int], max_bytes: int) -> tuple[dict[int, str], set[int]]:
+    """一括実行のstdoutを完了マーカーでTodoごとに分割する
+
+    前のマーカーから `TODO-DONE #<id>` の行までをそのTodoの出力とする。
+    最後のマーカー以降の出力は未完了のTodoすべてに割り当てる。
+    各Todoの出力は末尾max_bytes程度までしか保持しない。
+
+    Returns:
+        ({Todo ID: 出力}, 完了マーカーが出力されたTodo IDの集合)
+    """
+    outputs = {}
+    done = set()
+    segment = collections.deque()
+    segment_size = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            segment.append(line)
+            segment_size += len(line)
+            while segment_size > max_bytes and len(segment) > 1:
+                segment_size -= len(segment.popleft())
+
+            m = BATCH_DONE_RE.search(line)
+            if m and int(m.group(1)) in todo_ids and int(m.group(1)) not in done:
+                todo_id = int(m.group(1))
+                done.add(todo_id)
+                outputs[todo_id] = "".join(segment)
+                segment.clear()
+                segment_size = 0
+
+    rest = "".join(segment)
+    for todo_id in todo_ids:
+        if todo_id not in done:
+            outputs[todo_id] = rest
+    return outputs, done
+
 
 def sanitize_prompt(text: str) -> str:
     """
@@ -87,6 +156,13 @@ def sanitize_prompt(text: str) -> str:
 class Command(BaseCommand):
     help = "AIエージェントを実行してタスクを完了する"
 
+    # 参照用ファイルの内容をレシピに添付するか
+    context_bundle = False
+    # edit_filesが指定されたTodoでは、その範囲の変更のみコミットするか
+    edit_files_only = False
+    # エージェントの実行方法（Agent.runnerから決まる）
+    runner: AgentRunner = GooseRunner()
+
     def add_arguments(self, parser):
         parser.add_argument("--todo-pk", type=int, help="実行するTodoのPK")
         parser.add_argument("--agent-pk", type=int, help="使用するAgentのPK（DBに保存された設定を使用）")
@@ -96,6 +172,23 @@ class Command(BaseCommand):
         parser.add_argument("--inplace", action="store_true", help="workdir内で実行する")
         parser.add_argument("--agent-quiet", action="store_true", help="AIエージェントの出力を表示しない")
         parser.add_argument("--dump-recipe", action="store_true", help="レシピファイルのみを出力して終了")
+        parser.add_argument(
+            "--context-bundle",
+            action="store_true",
+            help="参照用ファイルの内容をレシピに添付する（デフォルト: CONTEXT_BUNDLE_ENABLED）",
+        )
+        parser.add_argument(
+            "--edit-files-only",
+            action="store_true",
+            help="編集対象ファイル（edit_files）の変更のみコミットする（デフォルト: COMMIT_EDIT_FILES_ONLY）",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            nargs="*",
+            default=[],
+            help="同じセッションで続けて実行するTodoのPK（todo_pkと同じTodoListであること）",
+        )
 
     def handle(
         self,
@@ -105,6 +198,9 @@ class Command(BaseCommand):
         inplace: bool,
         agent_quiet: bool,
         dump_recipe: bool = False,
+        context_bundle: bool = False,
+        edit_files_only: bool = False,
+        batch: list[int] | None = None,
         **options,
     ):
         # Todo取得
@@ -131,11 +227,37 @@ class Command(BaseCommand):
         assert agent is not None
         assert agent is not None
 
-        self.stdout.write(self.style.SUCCESS("Using Agent: {}".format(agent.name)))
+        self.context_bundle = context_bundle or settings.CONTEXT_BUNDLE_ENABLED
+        self.edit_files_only = edit_files_only or settings.COMMIT_EDIT_FILES_ONLY
+
+        # 一括実行するTodo（指定順）
+        batch_todos = []
+        if batch:
+            found = Todo.objects.select_related("todo_list").in_bulk([pk for pk in batch if pk != todo.pk])
+            for pk in batch:
+                if pk == todo.pk:
+                    continue
+                if pk not in found:
+                    raise CommandError("Todo {} が存在しません".format(pk))
+                if found[pk].todo_list_id != todo.todo_list_id:
+                    raise CommandError("Todo {} はTodo {} と異なるTodoListです".format(pk, todo.pk))
+                batch_todos.append(found[pk])
+        # Todo ID -> エラー内容（成功なら空文字）。一括実行時にtask_workerが参照する
+        self.batch_results = {}
+
+        try:
+            self.runner = get_runner(agent.runner, agent.runner_options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS("Using Agent: {} (runner: {})".format(agent.name, self.runner.name)))
 
         # dump_recipe オプションが指定された場合はレシピのみ出力して終了
         if dump_recipe:
-            recipe = self.build_recipe(todo, agent)
+            if batch_todos:
+                recipe = self.build_batch_recipe([todo] + batch_todos, agent, workdir)
+            else:
+                recipe = self.build_recipe(todo, agent, workdir)
             print(recipe)
             return
 
@@ -152,8 +274,8 @@ class Command(BaseCommand):
         if inplace and (not self.is_clean(workdir)):
             if not todo.auto_stash:
                 raise CommandError("{} はダーティです。変更をコミットしてください".format(workdir))
-            self.stdout.write("作業ディレクトリはダーティです。stashします")
-            stash_id = self.create_stash(workdir)
+            self.stdout.write("作業ディレクトリはダーティです。スナップショットに退避します")
+            stash_id = self.create_snapshot(workdir, todo)
 
         try:
             # 3. ブランチ名生成（既存のbranch_nameがあれば再利用）
@@ -181,27 +303,34 @@ class Command(BaseCommand):
                     self.stdout.write("ブランチ作成: {}".format(branch_name))
                     subprocess.run(["git", "switch", "-c", branch_name, "HEAD"], cwd=workdir, check=True)
 
-                # 4. Resumeの場合：stashを復元
+                # 4. Resumeの場合：中断時のスナップショットを復元
                 if todo.stash_id:
-                    self.restore_stash(workdir, todo.stash_id)
+                    self.restore_snapshot(workdir, todo, todo.stash_id)
                     # stash_idをクリア
                     todo.stash_id = ""
                     todo.interrupted_files = []
-                    todo.save(update_fields=["stash_id", "interrupted_files"])
+                    todo.save(update_fields=["stash_id", "interrupted_files", "updated_at"])
 
                 try:
-                    # 5. 指示ファイル作成
-                    with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
-                        recipe = self.build_recipe(todo, agent)
-                        print(recipe)
-                        f.write(recipe)
-                        f.flush()
+                    if batch_todos:
+                        # 5-8. 一括実行
+                        self.run_batch([todo] + batch_todos, agent, workdir, agent_quiet)
+                    else:
+                        # 5. 指示ファイル作成
+                        with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
+                            recipe = self.build_recipe(todo, agent, workdir)
+                            print(recipe)
+                            f.write(recipe)
+                            f.flush()
+
+                            # 6. AIエージェント実行
+                            stdout_output = self.run_agent(workdir, f.name, agent_quiet, self.get_log_dir(todo))
 
-                        # 6. AIエージェント実行
-                        stdout_output = self.run_agent(workdir, f.name, agent_quiet)
+                            # 7. コミット
+                            self.commit_changes(workdir, todo, stdout_output)
 
-                        # 7. コミット
-                        self.commit_changes(workdir, todo, stdout_output)
+                            # 8. 完了判定
+                            self.run_validation(workdir, todo)
 
                 finally:
                     if current_branch_name != branch_name:
@@ -211,30 +340,39 @@ class Command(BaseCommand):
                 # 4. ブランチとworktree作成
                 worktree_path = self.create_worktree(workdir, worktree_root, branch_name)
 
-                # Resumeの場合：stashを復元
+                # Resumeの場合：中断時のスナップショットを復元
                 if todo.stash_id:
-                    self.restore_stash(worktree_path, todo.stash_id)
+                    self.restore_snapshot(worktree_path, todo, todo.stash_id)
                     # stash_idをクリア
                     todo.stash_id = ""
                     todo.interrupted_files = []
-                    todo.save(update_fields=["stash_id", "interrupted_files"])
+                    todo.save(update_fields=["stash_id", "interrupted_files", "updated_at"])
 
                 try:
-                    # 5. 指示ファイル作成
-                    with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
-                        f.write(self.build_recipe(todo, agent))
-                        # 6. AIエージェント実行
-                        stdout_output = self.run_agent(worktree_path, f.name, agent_quiet)
+                    if batch_todos:
+                        # 5-8. 一括実行
+                        self.run_batch([todo] + batch_todos, agent, worktree_path, agent_quiet)
+                    else:
+                        # 5. 指示ファイル作成
+                        with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
+                            f.write(self.build_recipe(todo, agent, worktree_path))
+                            # 6. AIエージェント実行
+                            stdout_output = self.run_agent(
+                                worktree_path, f.name, agent_quiet, self.get_log_dir(todo)
+                            )
+
+                            # 7. コミット
+                            self.commit_changes(worktree_path, todo, stdout_output)
 
-                        # 7. コミット
-                        self.commit_changes(worktree_path, todo, stdout_output)
+                            # 8. 完了判定
+                            self.run_validation(worktree_path, todo)
 
                 finally:
-                    # 8. worktree削除
+                    # 9. worktree削除
                     self.cleanup_worktree(worktree_path, workdir)
         finally:
             if stash_id:
-                self.restore_stash(workdir, stash_id)
+                self.restore_snapshot(workdir, todo, stash_id, "workdir")
 
         self.stdout.write(self.style.SUCCESS("完了しました"))
 
@@ -303,9 +441,13 @@ class Command(BaseCommand):
 
         return worktree_path
 
-    def build_instruction(self, todo):
-        """指示内容を構築"""
+    def build_instruction(self, todo, workdir=None):
+        """指示内容を構築
+
+        workdirが指定され、コンテキストバンドルが有効な場合は参照用ファイルの内容も添付する
+        """
         parts = []
+        bundle = self.build_context_bundle(todo, workdir)
 
         # # システムメッセージ
         # if system_message:
@@ -317,7 +459,17 @@ class Command(BaseCommand):
         if todo.ref_files:
             parts.append("## 参照用ファイル（読み込みのみ）")
             for f in todo.ref_files:
-                parts.append("- {}".format(f))
+                if bundle and f in bundle.paths:
+                    parts.append("- {}（内容は「参照用ファイルの内容」に添付）".format(f))
+                else:
+                    parts.append("- {}".format(f))
+            parts.append("")
+
+        if bundle and bundle.text:
+            parts.append("## 参照用ファイルの内容")
+            parts.append("以下はHEAD時点の内容です。改めて読み込む必要はありません。")
+            parts.append("")
+            parts.append(bundle.text)
             parts.append("")
 
         if todo.edit_files:
@@ -341,6 +493,7 @@ class Command(BaseCommand):
         if todo.validation_command:
             parts.append("## 完了判断")
             parts.append("次のコマンドが成功したら完了: `{}`".format(todo.validation_command))
+            parts.append("終了後にこのコマンドを実行して完了を判定します。")
             parts.append("")
 
         # # 追加指示（ファイルから）
@@ -357,15 +510,54 @@ class Command(BaseCommand):
 
         return "\n".join(parts)
 
-    def build_recipe(self, todo: Todo, agent: Agent):
+    def build_context_bundle(self, todo, workdir):
+        """参照用ファイルのコンテキストバンドルを構築（無効・失敗時はNone）"""
+        if not (workdir and todo.ref_files and self.context_bundle):
+            return None
+        try:
+            return build_context_bundle(
+                workdir,
+                todo.ref_files,
+                ContentStore(settings.CONTEXT_STORE_ROOT, settings.CONTEXT_STORE_MAX_BYTES),
+                max_file_bytes=settings.CONTEXT_BUNDLE_MAX_FILE_BYTES,
+                max_bundle_bytes=settings.CONTEXT_BUNDLE_MAX_BYTES,
+            )
+        except Exception as e:
+            self.stderr.write(self.style.WARNING("コンテキストバンドルの構築に失敗しました: {}".format(e)))
+            return None
+
+    def build_recipe(self, todo: Todo, agent: Agent, workdir=None):
+        return self.dump_recipe(agent, "タスク実行", self.build_instruction(todo, workdir))
+
+    def build_batch_recipe(self, todos: list[Todo], agent: Agent, workdir=None):
+        """複数のTodoを1つのセッションで順に実行するレシピ"""
+        return self.dump_recipe(agent, "タスク一括実行", self.build_batch_instruction(todos, workdir))
+
+    def build_batch_instruction(self, todos, workdir=None):
+        """一括実行用の指示（タスクごとに完了マーカーを出力させる）"""
+        parts = [
+            "# 一括実行",
+            "以下の{}個のタスクを順番に実行してください。".format(len(todos)),
+            "各タスクが完了するたびに、`{} #<Todo ID>` とだけ書いた行を出力してください。".format(
+                BATCH_DONE_MARKER
+            ),
+            "コミットはしないでください。タスクごとに、そのタスクの編集対象ファイル以外はなるべく変更しないでください。",
+            "",
+        ]
+        for i, todo in enumerate(todos, 1):
+            parts.append("# タスク {}/{}（Todo ID: {}）{}".format(i, len(todos), todo.id, todo.title))
+            parts.append(self.build_instruction(todo, workdir))
+        return "\n".join(parts)
+
+    def dump_recipe(self, agent: Agent, title: str, instruction: str):
         sio = io.StringIO()
         yaml.dump(
             {
-                "title": "タスク実行",
+                "title": title,
                 "description": "",
                 "instructions": sanitize_prompt(agent.system_message),
-                "prompt": sanitize_prompt(self.build_instruction(todo)),
-                "extensions": [{"type": "builtin", "name": "developer", "timeout": 300, "bundled": True}],
+                "prompt": sanitize_prompt(instruction),
+                "extensions": self.build_extensions(agent),
             },
             sio,
             allow_unicode=True,
@@ -375,62 +567,72 @@ class Command(BaseCommand):
         )
         return sio.getvalue()
 
-    def run_agent(self, worktree_path, recipe_file, agent_quiet):
-        """AIエージェントを実行（stderrリアルタイム表示、stdoutを文字列として返す）"""
+    def build_extensions(self, agent: Agent):
+        """レシピのextensionsを構築（builtinのdeveloper + Agentに設定されたExtension）
+
+        EXTENSION_POOL_URL のプールが提供しているExtensionはプール経由で接続し、
+        それ以外は従来通りstdioで起動する。
+        gooseはExtensionを名前で区別するので、builtinと同名のExtensionは追加しない
+        """
+        extensions = [{"type": "builtin", "name": "developer", "timeout": 300, "bundled": True}]
+
+        agent_extensions = list(agent.extensions.exclude(name__in=[e["name"] for e in extensions]).order_by("name"))
+        pool_url = settings.EXTENSION_POOL_URL
+        pooled_names = set()
+        if pool_url and any(ext.pooled for ext in agent_extensions):
+            pooled_names = get_pooled_extension_names(pool_url)
+
+        for ext in agent_extensions:
+            if ext.pooled and ext.name in pooled_names:
+                extensions.append(
+                    {
+                        "type": "streamable_http",
+                        "name": ext.name,
+                        "uri": "{}/{}/mcp".format(pool_url.rstrip("/"), ext.name),
+                        "timeout": ext.timeout,
+                    }
+                )
+            else:
+                extensions.append(
+                    {
+                        "type": ext.type,
+                        "name": ext.name,
+                        "cmd": ext.cmd,
+                        "args": ext.args,
+                        "envs": ext.envs,
+                        "timeout": ext.timeout,
+                    }
+                )
+        return extensions
+
+    def get_log_dir(self, todo):
+        """Todoごとのエージェント出力ログディレクトリを作成して返す"""
+        log_dir = os.path.join(settings.AGENT_LOG_ROOT, "todo-{}".format(todo.id))
+        os.makedirs(log_dir, exist_ok=True)
+        return log_dir
+
+    def run_agent(self, worktree_path, recipe_file, agent_quiet, log_dir):
+        """AIエージェントを実行（stdout/stderrはログファイルへ直接出力し、stdoutの末尾を文字列として返す）"""
         self.stdout.write("AIエージェント実行中...")
 
-        # 出力をため込むStringIO
-        output_buffer = io.StringIO()
-
-        cmd = ["goose", "run", "--recipe", recipe_file]
-        if agent_quiet:
-            cmd.append("-q")
-
-        env = os.environ.copy()  # 既存環境をコピー
-        env["GOOSE_TEMPERATURE"] = "0.3"
-        # Popenでstdout/stderrを別々に扱う
-        process = subprocess.Popen(
-            cmd,
-            cwd=worktree_path,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            env=env,
-        )
+        stdout_path = os.path.join(log_dir, "stdout.log")
+        stderr_path = os.path.join(log_dir, "stderr.log")
+        self.stdout.write("ログ: {}".format(log_dir))
+
+        cmd = self.runner.build_command(recipe_file, agent_quiet)
+        env = self.runner.build_env()
+        # stdout/stderrのfdをログファイルに直接つなぐ（Python側で行単位に中継しない）
+        with open(stdout_path, "wb") as out, open(stderr_path, "wb") as err:
+            process = subprocess.Popen(
+                cmd,
+                cwd=worktree_path,
+                stdout=out,
+                stderr=err,
+                env=env,
+            )
 
-        # リアルタイムでstdout/stderrを出力
-        import select
-        import sys
-
-        while True:
-            # 読み込み可能なfdを監視
-            reads = [process.stdout.fileno(), process.stderr.fileno()]
-            readable, _, _ = select.select(reads, [], [])
-
-            if process.stdout.fileno() in readable:
-                line = process.stdout.readline()
-                if line:
-                    self.stdout.write(line, ending="")
-                    output_buffer.write(line)
-
-            if process.stderr.fileno() in readable:
-                line = process.stderr.readline()
-                if line:
-                    self.stderr.write(line, ending="")
-
-            # プロセスが終了した場合
-            if process.poll() is not None:
-                # 残りの出力を読み込む
-                remaining_stdout = process.stdout.read()
-                if remaining_stdout:
-                    self.stdout.write(remaining_stdout, ending="")
-                    output_buffer.write(remaining_stdout)
-
-                remaining_stderr = process.stderr.read()
-                if remaining_stderr:
-                    self.stderr.write(remaining_stderr, ending="")
-                break
+        # ログファイルを追いかけて表示
+        self.follow_logs(process, stdout_path, stderr_path)
 
         returncode = process.returncode
 
@@ -440,75 +642,384 @@ class Command(BaseCommand):
             )
             raise CommandError("エージェントがエラーで終了しました")
 
-        # stdoutの内容を文字列として返す
-        return output_buffer.getvalue()
+        # stdoutの末尾のみを文字列として返す
+        return read_log_tail(stdout_path, settings.AGENT_OUTPUT_TAIL_BYTES)
 
-    def commit_changes(self, worktree_path, todo, stdout_output):
-        """変更をコミット"""
-        # 変更を追加
-        subprocess.run(["git", "add", "-A"], cwd=worktree_path, check=True)
-
-        emoji = ":robot:"
+    def follow_logs(self, process, stdout_path, stderr_path, interval=0.2):
+        """プロセス終了までログファイルに追記された分を表示する"""
+        followers = [
+            (open(stdout_path, "rb"), codecs.getincrementaldecoder("utf-8")(errors="replace"), self.stdout),
+            (open(stderr_path, "rb"), codecs.getincrementaldecoder("utf-8")(errors="replace"), self.stderr),
+        ]
         try:
-            emoji = select_emoji(
-                "\n".join(["# {}".format(todo.title), "# 修正内容", todo.prompt, "# 結果", stdout_output])
+            while True:
+                finished = process.poll() is not None
+                read_any = False
+                for f, decoder, stream in followers:
+                    chunk = f.read(LOG_CHUNK_SIZE)
+                    if chunk:
+                        read_any = True
+                        stream.write(decoder.decode(chunk), ending="")
+
+                # 終了後は読み切るまで続ける
+                if finished and not read_any:
+                    break
+                if not read_any:
+                    time.sleep(interval)
+        finally:
+            for f, decoder, stream in followers:
+                rest = decoder.decode(b"", final=True)
+                if rest:
+                    stream.write(rest, ending="")
+                f.close()
+
+    def run_batch(self, todos, agent, worktree_path, agent_quiet):
+        """複数のTodoを1つのエージェントセッションで実行し、Todoごとに結果を記録する
+
+        - 完了マーカーでstdoutを分割してTodoごとのoutputにする
+        - edit_filesが指定された完了済みTodoは、その範囲の変更をTodoごとにコミットする
+        - 残りの変更は、全Todoが完了した場合のみedit_files未指定のTodoにまとめてコミットする
+        - 結果は self.batch_results（Todo ID -> エラー内容、成功なら空文字）に格納する
+        """
+        ids = [todo.id for todo in todos]
+        log_dir = self.get_log_dir(todos[0])
+        self.stdout.write("一括実行: Todo {}".format(", ".join("#{}".format(i) for i in ids)))
+
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
+            f.write(self.build_batch_recipe(todos, agent, worktree_path))
+
+        agent_error = ""
+        try:
+            self.run_agent(worktree_path, f.name, agent_quiet, log_dir)
+        except CommandError as e:
+            agent_error = str(e)
+
+        outputs, done = split_batch_output(
+            os.path.join(log_dir, "stdout.log"), ids, settings.AGENT_OUTPUT_TAIL_BYTES
+        )
+        if not done and not agent_error:
+            # マーカーが1つも出力されなければ、正常終了をもって全Todo完了とみなす
+            done = set(ids)
+
+        results = {}
+        for todo in todos:
+            if todo.id not in done:
+                results[todo.id] = agent_error or "完了マーカー（{} #{}）が出力されませんでした".format(
+                    BATCH_DONE_MARKER, todo.id
+                )
+
+        # edit_filesが指定されたTodoはその範囲だけを個別にコミット
+        # （commit_changesはoutputも保存するので、保存済みのTodoをsavedに記録する）
+        committed = []
+        saved = set()
+        for todo in todos:
+            if todo.id in done and todo.edit_files:
+                saved.add(todo.id)
+                try:
+                    self.commit_changes(worktree_path, todo, outputs[todo.id], limit_to=todo.edit_files)
+                except CommandError as e:
+                    results[todo.id] = str(e)
+                    continue
+                committed.append(todo)
+
+        # 残りの変更はTodoごとに分けられないので、全Todoが完了した場合のみまとめてコミット
+        rest = [todo for todo in todos if todo.id in done and not todo.edit_files]
+        if rest and len(done) == len(todos):
+            saved.add(rest[0].id)
+            try:
+                self.commit_changes(worktree_path, rest[0], outputs[rest[0].id], todo_ids=[t.id for t in rest])
+                committed += rest
+            except CommandError as e:
+                for todo in rest:
+                    results[todo.id] = str(e)
+        else:
+            for todo in rest:
+                results[todo.id] = "未完了のTodoの変更と分けられないため、コミットしていません"
+
+        for todo in todos:
+            if todo.id not in saved:
+                todo.output = outputs[todo.id]
+                todo.save(update_fields=["output", "updated_at"])
+
+        # 完了判定（すべてコミットした後の作業ツリーに対して実行）
+        for todo in committed:
+            try:
+                self.run_validation(worktree_path, todo)
+            except CommandError as e:
+                results[todo.id] = str(e)
+
+        self.batch_results = {todo.id: results.get(todo.id, "") for todo in todos}
+        failed = [i for i, error in self.batch_results.items() if error]
+        if failed:
+            self.stdout.write(
+                self.style.WARNING("未完了・失敗: {}".format(", ".join("#{}".format(i) for i in failed)))
             )
-        except Exception as e:
-            self.stderr.write(self.style.ERROR("絵文字選択エラー: {}".format(e)))
+
+    def commit_changes(self, worktree_path, todo, stdout_output, limit_to=None, todo_ids=None):
+        """変更をコミット
+
+        `git add -A` / `git commit` の代わりに、1回のステータス取得で得た変更パスだけを
+        ステージし、plumbingコマンドでコミットする（時間がリポジトリの大きさではなく変更量に比例する）
+
+        limit_toを指定した場合はその範囲の変更のみコミットする。
+        todo_idsは1つのコミットに複数Todoの変更を含める場合にメッセージへ記載するID
+        """
+        if limit_to is None and self.edit_files_only and todo.edit_files:
+            limit_to = todo.edit_files
+        try:
+            if limit_to:
+                # 範囲外のステージ済みのパスを含めないよう、HEADから作った一時的なindexでtreeを作る
+                tree, limited_paths, excluded = git_utils.write_limited_tree(worktree_path, limit_to)
+            else:
+                _, excluded = git_utils.stage_changes(worktree_path)
+            if excluded:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "編集対象ファイル以外の変更はコミットしません: {}".format(", ".join(excluded))
+                    )
+                )
+
+            parent = git_utils.resolve_head(worktree_path)
+            parent_tree = git_utils.tree_of(worktree_path, parent)
+            if not limit_to:
+                tree = git_utils.write_tree(worktree_path)
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            self.stderr.write(self.style.ERROR("ステージングに失敗しました: {}".format(e)))
+            todo.output = stdout_output
+            todo.save()
+            return
+
+        if tree == parent_tree:
+            self.stdout.write(self.style.WARNING("コミットする変更がありませんでした"))
+            todo.output = stdout_output
+            todo.save()
+            return
+
+        summary = "\n".join(["# {}".format(todo.title), "# 修正内容", todo.prompt, "# 結果", stdout_output])
+        emoji, needs_decoration = self.choose_emoji(
+            summary, *git_utils.diff_tree_numstat(worktree_path, parent_tree, tree)
+        )
         message = todo.title or "AI Generated Update"
         if len(message) > 50:
             message = message[:47] + "..."
 
         # コミットメッセージ作成
         commit_msg = f"{emoji} {message}\n\n"
-        commit_msg += "Todo ID: {}\n".format(todo.id)
+        commit_msg += "Todo ID: {}\n".format(", ".join(str(i) for i in todo_ids or [todo.id]))
         commit_msg += "Output: {}\n".format(stdout_output[-200:])
         # commit_msg += "Prompt: {}".format(todo.prompt[:100])
 
-        # コミット
-        result = subprocess.run(
-            ["git", "commit", "-m", commit_msg], cwd=worktree_path, capture_output=True, text=True
-        )
-
-        if result.returncode == 0:
-            self.stdout.write(self.style.SUCCESS("コミット完了"))
-        else:
-            self.stdout.write(self.style.WARNING("コミットする変更がありませんでした"))
+        # コミット（HEADが指すブランチをcompare-and-swapで進める）
+        try:
+            self.advance_head(worktree_path, tree, parent, parent_tree, commit_msg)
+            if limit_to:
+                # 本来のindexもコミットしたパスだけ新しいHEADに合わせる（範囲外のステージ済みの変更は残す）
+                git_utils.stage_paths(worktree_path, limited_paths)
+        except subprocess.CalledProcessError as e:
+            self.stderr.write(self.style.ERROR("コミットに失敗しました: {}".format(e.stderr or e)))
+            todo.output = stdout_output
+            todo.save()
+            # 変更がコミットされていないので完了にしない
+            raise CommandError("コミットに失敗しました: {}".format((e.stderr or str(e)).strip()))
+
+        self.stdout.write(self.style.SUCCESS("コミット完了"))
+        if needs_decoration:
+            self.schedule_emoji_decoration(todo, worktree_path, summary)
 
         todo.output = stdout_output
         todo.save()
 
+    def advance_head(self, worktree_path, tree, parent, parent_tree, commit_msg):
+        """treeのコミットを作り、HEADが指すブランチをparentからcompare-and-swapで進める
+
+        parentを読んだ後にブランチが動いていた場合（decorate_commitによる絵文字の差し替えなど）、
+        新しい先頭のtreeがparentと同じ（メッセージだけの書き換え）なら新しい先頭を親にして1回だけやり直す。
+        treeが違えば他の変更を巻き戻さないよう、update-refの失敗（CalledProcessError）をそのまま送出する
+        """
+        reason = "commit: {}".format(commit_msg.splitlines()[0])
+        # decorate_commit（前のTodoのコミットの絵文字の差し替え）と同時にブランチを書き換えない
+        with git_utils.branch_lock(worktree_path):
+            commit = git_utils.commit_tree(worktree_path, tree, [parent] if parent else [], commit_msg)
+            try:
+                git_utils.update_ref(worktree_path, "HEAD", commit, parent or git_utils.ZERO_OID, reason=reason)
+                return commit
+            except subprocess.CalledProcessError:
+                current = git_utils.resolve_head(worktree_path)
+                if current is None or current == parent or git_utils.tree_of(worktree_path, current) != parent_tree:
+                    raise
+            self.stdout.write(self.style.WARNING("ブランチの先頭が書き換えられたため、新しい先頭の上にコミットし直します"))
+            commit = git_utils.commit_tree(worktree_path, tree, [current], commit_msg)
+            git_utils.update_ref(worktree_path, "HEAD", commit, current, reason=reason)
+            return commit
+
+    def run_validation(self, worktree_path, todo):
+        """validation_commandを実行し、結果をTodoに保存する（失敗時はCommandError）
+
+        作業ツリーがHEADと一致していれば (コマンド, treeハッシュ) で結果をキャッシュし、
+        同じtreeに対しては再実行しない
+        """
+        if not todo.validation_command:
+            return
+        command = todo.validation_command
+
+        try:
+            tree = get_clean_tree(worktree_path)
+        except (subprocess.CalledProcessError, RuntimeError):
+            tree = None
+
+        cached = ValidationResult.objects.filter(command=command, tree=tree).first() if tree else None
+        if cached:
+            self.stdout.write("検証結果はキャッシュ済みです（tree: {}）".format(tree[:12]))
+            status, output, duration = cached.status, cached.output, cached.duration
+        else:
+            self.stdout.write("検証コマンド実行: {}".format(command))
+            log_path = os.path.join(self.get_log_dir(todo), "validation.log")
+            status, duration = run_validation_command(command, worktree_path, settings.VALIDATION_TIMEOUT, log_path)
+            output = read_log_tail(log_path, settings.AGENT_OUTPUT_TAIL_BYTES)
+            # タイムアウト・起動失敗は環境要因の可能性があるのでキャッシュしない
+            if tree and status in (ValidationStatus.PASSED, ValidationStatus.FAILED):
+                ValidationResult.objects.update_or_create(
+                    command=command,
+                    tree=tree,
+                    defaults={"status": status, "output": output, "duration": duration},
+                )
+
+        todo.validation_status = status
+        todo.validation_output = output
+        todo.validation_duration = duration
+        todo.save(update_fields=["validation_status", "validation_output", "validation_duration", "updated_at"])
+
+        if status != ValidationStatus.PASSED:
+            raise CommandError("検証コマンドが失敗しました（{}, {:.1f}秒）: {}".format(status, duration, command))
+        self.stdout.write(self.style.SUCCESS("検証コマンド成功（{:.1f}秒）".format(duration)))
+
+    def choose_emoji(self, summary, paths=None, added=0, deleted=0):
+        """コミットに付ける絵文字を決める
+
+        キャッシュがあればそれを使い、なければローカル分類を試す。確信度が低い場合、
+        EMOJI_ASYNCならLLMを待たずに仮の絵文字でコミットし、後からバックグラウンドで差し替える。
+
+        Returns:
+            (絵文字, 後から差し替えが必要か)
+        """
+        store = ContentStore(settings.EMOJI_CACHE_ROOT, settings.EMOJI_CACHE_MAX_BYTES)
+        cached = get_cached_emoji(summary, store)
+        if cached:
+            return cached, False
+
+        local = classify_emoji(summary, paths, added, deleted)
+        if local.confident:
+            return local.emoji, False
+
+        if settings.EMOJI_ASYNC:
+            # LLMが設定されていなければ差し替えようがない
+            configured = bool(os.environ.get("OLLAMA_HOST") and os.environ.get("OLLAMA_MODEL"))
+            return PLACEHOLDER, configured
+
+        try:
+            emoji = select_emoji_llm(summary)
+            cache_emoji(summary, emoji, store)
+            store.evict()
+            return emoji, False
+        except Exception as e:
+            self.stderr.write(self.style.ERROR("絵文字選択エラー: {}".format(e)))
+            return PLACEHOLDER, False
+
+    def schedule_emoji_decoration(self, todo, worktree_path, summary):
+        """コミットの絵文字をバックグラウンドで差し替えるプロセスを起動する"""
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=worktree_path, capture_output=True, text=True, check=True
+            ).stdout.strip()
+            branch = subprocess.run(
+                ["git", "symbolic-ref", "--short", "HEAD"],
+                cwd=worktree_path,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+
+            # worktreeはこの後削除されるので、入力は一時ファイルで渡しリポジトリ本体で処理する
+            with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
+                f.write(summary)
+
+            log_dir = self.get_log_dir(todo)
+            with open(os.path.join(log_dir, "decorate.log"), "ab") as log:
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        str(settings.BASE_DIR / "manage.py"),
+                        "decorate_commit",
+                        "--workdir",
+                        todo.todo_list.workdir,
+                        "--commit",
+                        commit,
+                        "--branch",
+                        branch,
+                        "--input-file",
+                        f.name,
+                    ],
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=log,
+                    start_new_session=True,
+                )
+            self.stdout.write("絵文字はバックグラウンドで選択します")
+        except Exception as e:
+            self.stderr.write(self.style.WARNING("絵文字選択の予約に失敗しました: {}".format(e)))
+
     def cleanup_worktree(self, worktree_path, workdir):
         """worktreeを削除"""
         self.stdout.write("Worktreeクリーンアップ...")
-        subprocess.run(["git", "worktree", "remove", worktree_path], cwd=workdir, check=True)
-        self.stdout.write(self.style.SUCCESS("Worktreeを削除しました"))
-
-    def create_stash(self, workdir):
-        self.stdout.write("Stash作成...")
-        subprocess.run(["git", "stash", "push", "-u", "-m", "避難"], cwd=workdir, check=True)
-
         result = subprocess.run(
-            ["git", "rev-parse", "stash@{0}"], cwd=workdir, capture_output=True, text=True
+            ["git", "worktree", "remove", worktree_path], cwd=workdir, capture_output=True, text=True
         )
-        if result.returncode == 0:
-            self.stdout.write(self.style.SUCCESS("Stashを作成しました"))
-        else:
-            self.stdout.write(self.style.WARNING("Stashに失敗しました"))
-            raise Exception("Stashに失敗しました")
+        if result.returncode != 0:
+            # コミットしなかった変更（edit_files以外など）が残っている場合は消さずに残す
+            self.stdout.write(
+                self.style.WARNING("Worktreeを削除できませんでした（{}）: {}".format(worktree_path, result.stderr.strip()))
+            )
+            return
+        self.stdout.write(self.style.SUCCESS("Worktreeを削除しました"))
 
-        return result.stdout.strip()
+    def create_snapshot(self, workdir, todo):
+        """作業ディレクトリの変更をスナップショットrefに退避し、作業ディレクトリをクリーンにする
 
-    def restore_stash(self, workdir, stash_hash):
-        """stashを復元"""
-        self.stdout.write("Stashを復元...")
+        `git stash` のグローバルなスタックは使わず、refs/todo/<id>/workdir にコミットとして保存する
+        """
+        self.stdout.write("スナップショット作成...")
+        ref = git_utils.snapshot_ref(todo.id, "workdir")
         try:
-            subprocess.run(["git", "stash", "pop", stash_hash], cwd=workdir, check=True)
-            self.stdout.write(self.style.SUCCESS("Stashを復元しました"))
-        except Exception as e:
-            self.stderr.write(self.style.WARNING(f"Stashを復元できませんでした: {e}"))
-            # stashが既に適用されている場合もある
-            try:
-                subprocess.run(["git", "stash", "drop", stash_hash], cwd=workdir, capture_output=True)
-            except:
-                pass
+            commit = git_utils.create_snapshot(workdir, ref, "todo-{}: 作業ディレクトリの退避".format(todo.id))
+            if commit:
+                git_utils.discard_changes(workdir)
+        except subprocess.CalledProcessError as e:
+            self.stdout.write(self.style.WARNING("スナップショットの作成に失敗しました"))
+            raise Exception("スナップショットの作成に失敗しました: {}".format(e.stderr))
+
+        self.stdout.write(self.style.SUCCESS("スナップショットを作成しました: {}".format(ref)))
+        return commit
+
+    def restore_snapshot(self, workdir, todo, commit, name="snapshot"):
+        """スナップショットの変更を作業ディレクトリに適用し、成功したらrefを削除する
+
+        適用できなかった場合はrefを残す（gc_snapshotsで期限切れになるまで復旧可能）
+        """
+        self.stdout.write("スナップショットを復元...")
+        ref = git_utils.snapshot_ref(todo.id, name)
+        try:
+            git_utils.restore_snapshot(workdir, commit)
+        except subprocess.CalledProcessError as e:
+            self.stderr.write(
+                self.style.WARNING(
+                    "スナップショットを復元できませんでした（{} に残しています）: {}".format(
+                        ref, (e.stderr or b"").decode(errors="replace").strip()
+                    )
+                )
+            )
+            return
+        self.stdout.write(self.style.SUCCESS("スナップショットを復元しました"))
+        try:
+            git_utils.delete_refs(workdir, [ref])
+        except subprocess.CalledProcessError:
+            pass
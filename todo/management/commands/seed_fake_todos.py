@@ -0,0 +1,84 @@
+"""
+負荷試験用の合成Todoを作成するDjango管理コマンド
+
+runner=fake のAgent（なければ作成）で、指定したworkdirに大量のTodoを作成する。
+task_worker と組み合わせると、LLMなしでスケジューリング・git処理・コミットのスループットを計測できる。
+
+使用方法:
+    python manage.py seed_fake_todos --workdir WORKDIR [--count N] [--files N] [--status queued]
+        [--agent-name fake] [--options '{"sleep": 0.5, "fail_rate": 0.05}']
+"""
+
+import json
+import os
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.models import Agent, Todo
+from todo.utils import get_or_create_todolist_with_parent
+
+
+class Command(BaseCommand):
+    help = "負荷試験用に runner=fake のAgentで合成Todoを作成する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workdir", type=str, required=True, help="Todoを作成するworkdir（gitリポジトリ）")
+        parser.add_argument("--count", type=int, default=100, help="作成するTodoの数")
+        parser.add_argument(
+            "--files", type=int, default=20, help="編集対象にするファイルの種類数（fake/file-<n>.txt）。0なら指定しない"
+        )
+        parser.add_argument(
+            "--status",
+            type=str,
+            default=Todo.Status.QUEUED,
+            choices=[Todo.Status.WAITING, Todo.Status.QUEUED],
+            help="作成するTodoのステータス",
+        )
+        parser.add_argument("--agent-name", type=str, default="fake", help="使用するAgent名（なければ作成）")
+        parser.add_argument(
+            "--options", type=str, default=None, help="Agentのrunner_options（JSON、指定時はAgentを更新）"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+
+    def handle(
+        self, workdir: str, count: int, files: int, status: str, agent_name: str, options: str | None, seed: int, **kw
+    ):
+        try:
+            runner_options = json.loads(options) if options is not None else None
+        except json.JSONDecodeError as e:
+            raise CommandError("--options がJSONではありません: {}".format(e))
+
+        agent, created = Agent.objects.get_or_create(
+            name=agent_name, defaults={"runner": "fake", "runner_options": runner_options or {}}
+        )
+        if not created and agent.runner != "fake":
+            raise CommandError("Agent {} はrunner=fakeではありません".format(agent_name))
+        if not created and runner_options is not None:
+            agent.runner_options = runner_options
+            agent.save(update_fields=["runner_options", "updated_at"])
+
+        todo_list, _ = get_or_create_todolist_with_parent(os.path.abspath(os.path.expanduser(workdir)))
+
+        rng = random.Random(seed)
+        todos = []
+        for i in range(count):
+            edit_files = ["fake/file-{}.txt".format(rng.randrange(files))] if files > 0 else []
+            todos.append(
+                Todo(
+                    todo_list=todo_list,
+                    agent=agent,
+                    title="fake task {}".format(i),
+                    prompt="合成タスク {}: {} を編集する".format(i, ", ".join(edit_files) or "任意のファイル"),
+                    edit_files=edit_files,
+                    priority=rng.randrange(3),
+                    status=status,
+                )
+            )
+        Todo.objects.bulk_create(todos, batch_size=500)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{}件のTodoを作成しました（Agent: {}, workdir: {}）".format(count, agent.name, todo_list.workdir)
+            )
+        )
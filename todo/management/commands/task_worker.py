@@ -13,6 +13,10 @@ todo_list.workdirごとに1つずつ実行可能とし、異なるworkdirのTodo
 4. call_commandをmultiprocessingの子プロセスで実行
 5. 子プロセス終了後にstatusをcompleted/errorに設定
 6. 1-5を無限ループで繰り返す
+
+--batch-size を2以上にすると、同じTodoList・Agent・ブランチのqueuedのTodoを
+（prompt+contextの合計が --batch-budget 文字以下の範囲で）まとめて1つのエージェントセッションで実行する。
+ステータスと出力はTodoごとに記録する。
 """
 
 import os
@@ -20,15 +24,20 @@ import subprocess
 import time
 from multiprocessing import Pipe, Process, Queue
 
+from django.conf import settings
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from todo import archive, events, git_utils
 from todo.models import Todo
 
 
-def run_task_in_subprocess(todo_pk: int, pipe, output_queue: Queue, worktree_root: str):
-    """子プロセスでcall_commandを実行"""
+def run_task_in_subprocess(todo_pk: int, pipe, output_queue: Queue, worktree_root: str, batch_pks=()):
+    """子プロセスでcall_commandを実行
+
+    batch_pksを指定した場合は一括実行し、Todoごとの結果（Todo ID -> エラー内容）をresultsとして返す
+    """
     import sys
 
     import django
@@ -36,22 +45,29 @@ def run_task_in_subprocess(todo_pk: int, pipe, output_queue: Queue, worktree_roo
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
     django.setup()
 
+    from todo.management.commands.run_task import Command as RunTaskCommand
+
     try:
         # 親プロセスのstdout/stderrを取得
         parent_stdout = sys.stdout
         parent_stderr = sys.stderr
 
         # pipe.writeをstdoutとして使用する
+        command = RunTaskCommand()
         call_command(
-            "run_task",
+            command,
             todo_pk=todo_pk,
             inplace=True,
             worktree_root=worktree_root,
+            batch=list(batch_pks),
             # agent_quiet=True,
             stdout=parent_stdout,
             stderr=parent_stderr,
         )
-        pipe.send({"returncode": 0})
+        if batch_pks:
+            pipe.send({"returncode": 0, "results": command.batch_results})
+        else:
+            pipe.send({"returncode": 0})
     except Exception as e:
         pipe.send(
             {
@@ -89,16 +105,42 @@ class Command(BaseCommand):
             default=None,
             help="最大並列実行数（環境変数TASK_WORKER_MAX_PARALLELでデフォルト値5を設定可能）",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="1セッションでまとめて実行するTodoの最大数（環境変数TASK_WORKER_BATCH_SIZE、デフォルト1=一括実行しない）",
+        )
+        parser.add_argument(
+            "--batch-budget",
+            type=int,
+            default=None,
+            help="一括実行するTodoのprompt+contextの合計文字数の上限（環境変数TASK_WORKER_BATCH_BUDGET、デフォルト8000）",
+        )
 
-    def handle(self, interval: int, worktree_root: str, max_parallel: int, **options):
+    def handle(
+        self,
+        interval: int,
+        worktree_root: str,
+        max_parallel: int,
+        batch_size: int | None = None,
+        batch_budget: int | None = None,
+        **options,
+    ):
         self.stdout.write(self.style.SUCCESS("タスクワーカーを開始しました"))
         self.running_workdirs = {}
+        # 次に完了済みTodoのアーカイブを確認する時刻（time.monotonic()）
+        self.next_archive_at = 0.0
         self.worktree_root = os.path.expanduser(worktree_root)
 
         # 環境変数またはCLI引数から最大並列数を取得
         self.max_parallel = (
             max_parallel if max_parallel is not None else int(os.environ.get("TASK_WORKER_MAX_PARALLEL", "5"))
         )
+        self.batch_size = batch_size if batch_size is not None else int(os.environ.get("TASK_WORKER_BATCH_SIZE", "1"))
+        self.batch_budget = (
+            batch_budget if batch_budget is not None else int(os.environ.get("TASK_WORKER_BATCH_BUDGET", "8000"))
+        )
 
         while True:
             self.process_loop(interval)
@@ -108,6 +150,9 @@ class Command(BaseCommand):
         # 1. 実行中のプロセスをチェックし、終了/cancelled/timeoutしたら回収
         self.check_running_processes()
 
+        # 完了済みの古いTodoをアーカイブ（TODO_ARCHIVE_DAYS が設定されている場合）
+        self.archive_finished()
+
         # 2. 実行中のworkdirを除いたqueuedのTodoを priority降順・created昇順で取得
         try:
             running_workdir_list = list(self.running_workdirs.keys())
@@ -140,10 +185,30 @@ class Command(BaseCommand):
         # 3. 空いているworkdirがあれば新しいTodoを起動
         self.start_todo(next_todo)
 
+    def archive_finished(self):
+        """
+        TODO_ARCHIVE_INTERVAL 秒ごとに、終了から TODO_ARCHIVE_DAYS 日が経ったTodoをアーカイブする
+
+        Todoの起動を止めないよう1回のループでは1バッチだけ移し、対象が残っていれば次のループで続ける
+        """
+        if not settings.TODO_ARCHIVE_DAYS or time.monotonic() < self.next_archive_at:
+            return
+        batch_size = settings.TODO_ARCHIVE_BATCH_SIZE
+        try:
+            moved = archive.archive_todos(settings.TODO_ARCHIVE_DAYS, batch_size=batch_size, max_batches=1)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"アーカイブエラー: {e}"))
+            moved = 0
+        if moved:
+            self.stdout.write(f"{moved}件のTodoをアーカイブしました")
+        if moved < batch_size:
+            self.next_archive_at = time.monotonic() + settings.TODO_ARCHIVE_INTERVAL
+
     def get_interrupted_files(self, worktree_path: str) -> list:
-        """変更ファイルリストを取得（stash保存前）"""
+        """変更ファイルリストを取得（スナップショット保存前）"""
         result = subprocess.run(
-            ["git", "status", "--porcelain"],
+            # 未追跡のディレクトリもファイル単位で出す（edit_filesで絞り込めるように）
+            ["git", "status", "--porcelain", "--untracked-files=all"],
             cwd=worktree_path,
             capture_output=True,
             text=True
@@ -153,7 +218,8 @@ class Command(BaseCommand):
             return []
 
         files = []
-        for line in result.stdout.strip().split("\n"):
+        # 先頭行のステータス（" M" など）の空白を削らないように、行ごとに分ける
+        for line in result.stdout.splitlines():
             if line:
                 # "M  file.py" → {"status": "M", "path": "file.py"}
                 status = line[:2].strip()
@@ -165,62 +231,85 @@ class Command(BaseCommand):
 
         return files
 
-    def save_to_stash(self, worktree_path: str, workdir: str, todo: Todo) -> str | None:
-        """未コミットの変更をstashに保存し、stash IDを返す"""
-        # 変更があるか確認
-        result = subprocess.run(
-            ["git", "status", "--porcelain"],
-            cwd=worktree_path,
-            capture_output=True,
-            text=True
-        )
-
-        if not result.stdout.strip():
-            return None  # 変更なし
+    def save_snapshot(self, worktree_path: str, todo: Todo, limit_to: list[str] | None = None) -> str | None:
+        """未コミットの変更を refs/todo/<id>/snapshot に保存し、コミットハッシュを返す
 
-        # stashに保存
-        stash_msg = f"todo-{todo.id}-interrupted"
-        subprocess.run(
-            ["git", "stash", "push", "-u", "-m", stash_msg],
-            cwd=worktree_path,
-            capture_output=True,
-            text=True,
-            check=True
+        グローバルなstashスタックは使わない（同じリポジトリの並行worktree間で競合しない）。
+        limit_toを指定した場合はそのパス配下の変更のみ保存する
+        """
+        return git_utils.create_snapshot(
+            worktree_path, git_utils.snapshot_ref(todo.id), f"todo-{todo.id}-interrupted", limit_to
         )
 
-        # stash IDを取得
-        result = subprocess.run(
-            ["git", "rev-parse", "stash@{0}"],
-            cwd=worktree_path,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+    def save_snapshots(self, worktree_path: str, todos: list[Todo]) -> dict[int, tuple[str | None, list]]:
+        """
+        worktreeの未コミットの変更をTodoごとのスナップショットに保存し、worktreeをクリーンにする
 
-        return result.stdout.strip()
+        一括実行（複数のTodoが同じworktreeを使う）の場合、edit_filesのあるTodoにはその配下の変更だけを保存する
+        （他のTodoの変更を含めない）。どのTodoのedit_filesにも含まれない変更は保存されない。
 
-    def handle_interruption(self, worktree_path: str, workdir: str, todo: Todo):
-        """中断処理: 変更ファイル取得 → stash保存 → worktree削除 → DB更新"""
-        stash_id = None
-        interrupted_files = []
+        Returns:
+            dict: {Todo ID: (スナップショットのコミットハッシュ, 変更ファイルリスト)}
+        """
+        files = self.get_interrupted_files(worktree_path)
+        if not files:
+            return {todo.id: (None, []) for todo in todos}
+
+        snapshots = {}
+        saved_paths = set()
+        for todo in todos:
+            limit_to = todo.edit_files if len(todos) > 1 and todo.edit_files else None
+            if limit_to:
+                # リネーム（"old -> new"）は新しいパスで判断する
+                paths = set(git_utils.filter_paths([f["path"].split(" -> ")[-1] for f in files], limit_to))
+                todo_files = [f for f in files if f["path"].split(" -> ")[-1] in paths]
+            else:
+                todo_files = files
+            stash_id = self.save_snapshot(worktree_path, todo, limit_to) if todo_files else None
+            snapshots[todo.id] = (stash_id, todo_files)
+            saved_paths.update(f["path"] for f in todo_files)
 
-        if worktree_path and os.path.exists(worktree_path):
-            # 1. 変更ファイルリストを取得（stash保存前）
-            interrupted_files = self.get_interrupted_files(worktree_path)
+        dropped = [f["path"] for f in files if f["path"] not in saved_paths]
+        if dropped:
+            self.stdout.write(
+                self.style.WARNING("どのTodoの編集対象にも含まれない変更は保存しません: {}".format(", ".join(dropped)))
+            )
+        # worktreeを削除できるようにクリーンにする
+        git_utils.discard_changes(worktree_path)
+        return snapshots
 
-            # 2. stashに保存
-            if interrupted_files:
-                stash_id = self.save_to_stash(worktree_path, workdir, todo)
+    def handle_interruption(self, worktree_path: str, workdir: str, todo: Todo, batch: list[Todo] = ()):
+        """
+        中断処理: 変更ファイル取得 → スナップショット保存（Todoごと） → worktree削除 → DB更新
 
-            # 3. worktreeを削除
-            self.cleanup_worktree(worktree_path, workdir)
+        Returns:
+            dict: {Todo ID: (スナップショットのコミットハッシュ, 変更ファイルリスト)}
+        """
+        todos = [todo, *batch]
+        snapshots = {t.id: (None, []) for t in todos}
 
-        # 4. DBを更新
-        todo.stash_id = stash_id or ""
-        todo.interrupted_files = interrupted_files
-        todo.save(update_fields=["stash_id", "interrupted_files"])
+        if worktree_path and os.path.exists(worktree_path):
+            snapshots = self.save_snapshots(worktree_path, todos)
+            self.cleanup_worktree(worktree_path, workdir)
 
-        return stash_id, interrupted_files
+        for t in todos:
+            stash_id, files = snapshots[t.id]
+            t.stash_id = stash_id or ""
+            t.interrupted_files = files
+            t.save(update_fields=["stash_id", "interrupted_files", "updated_at"])
+
+        return snapshots
+
+    @staticmethod
+    def interruption_note(todo: Todo, snapshots: dict) -> str:
+        """中断時の出力に追記するスナップショットの情報"""
+        stash_id, files = snapshots.get(todo.id, (None, []))
+        note = ""
+        if stash_id:
+            note += f"\nSnapshot saved: refs/todo/{todo.id}/snapshot ({stash_id})"
+        if files:
+            note += f"\nInterrupted files: {len(files)} files"
+        return note
 
     def check_running_processes(self):
         """実行中のプロセスをチェックし、終了/cancelled/timeoutしたら回収"""
@@ -234,12 +323,25 @@ class Command(BaseCommand):
             output_queue = info["output_queue"]
             stdout_lines = info["stdout_lines"]
             stderr_lines = info["stderr_lines"]
-            timeout_seconds = todo.timeout
+            batch = info.get("batch", [])
+            # 一括実行の場合は各Todoのタイムアウトの合計
+            timeout_seconds = todo.timeout + sum(t.timeout for t in batch)
             worktree_path = info.get("worktree_path")
 
             try:
                 # DBから最新の状態を取得
                 todo.refresh_from_db()
+                for t in batch:
+                    t.refresh_from_db()
+
+                # 一括実行中のTodoがcancelledされた場合は全体を中断し、それ以外のTodoはキューに戻す
+                if any(t.status == Todo.Status.CANCELLED for t in batch) and todo.status != Todo.Status.CANCELLED:
+                    self.stdout.write(self.style.WARNING(f"一括実行中のTodoがcancelledされました (workdir: {workdir})"))
+                    self.terminate_process(process)
+                    self.handle_interruption(worktree_path, workdir, todo, batch)
+                    self.requeue_or_cancel([todo] + batch)
+                    finished_workdirs.append(workdir)
+                    continue
 
                 # cancelledチェック
                 if todo.status == Todo.Status.CANCELLED:
@@ -248,15 +350,12 @@ class Command(BaseCommand):
                     )
                     self.terminate_process(process)
 
-                    # stash保存 + worktree削除 + DB更新
-                    stash_id, files = self.handle_interruption(worktree_path, workdir, todo)
+                    # スナップショット保存 + worktree削除 + DB更新
+                    snapshots = self.handle_interruption(worktree_path, workdir, todo, batch)
 
-                    todo.output = "=== CANCELLED ===\nCancelled by user"
-                    if stash_id:
-                        todo.output += f"\nStash saved: {stash_id}"
-                    if files:
-                        todo.output += f"\nInterrupted files: {len(files)} files"
-                    todo.save(update_fields=["output"])
+                    todo.output = "=== CANCELLED ===\nCancelled by user" + self.interruption_note(todo, snapshots)
+                    todo.save(update_fields=["output", "updated_at"])
+                    self.requeue_or_cancel(batch)
                     finished_workdirs.append(workdir)
                     continue
 
@@ -270,16 +369,18 @@ class Command(BaseCommand):
                     )
                     self.terminate_process(process)
 
-                    # stash保存 + worktree削除 + DB更新
-                    stash_id, files = self.handle_interruption(worktree_path, workdir, todo)
-
-                    todo.status = Todo.Status.TIMEOUT
-                    todo.output = f"=== TIMEOUT ===\nTimed out after {timeout_seconds} seconds"
-                    if stash_id:
-                        todo.output += f"\nStash saved: {stash_id}"
-                    if files:
-                        todo.output += f"\nInterrupted files: {len(files)} files"
-                    todo.save(update_fields=["status", "output"])
+                    # スナップショット保存（Todoごと） + worktree削除 + DB更新
+                    snapshots = self.handle_interruption(worktree_path, workdir, todo, batch)
+
+                    finished_at = timezone.now()
+                    for t in [todo, *batch]:
+                        t.status = Todo.Status.TIMEOUT
+                        t.finished_at = finished_at
+                        t.output = f"=== TIMEOUT ===\nTimed out after {timeout_seconds} seconds"
+                        if t is not todo:
+                            t.output += f" (batch with #{todo.id})"
+                        t.output += self.interruption_note(t, snapshots)
+                        t.save(update_fields=["status", "output", "finished_at", "updated_at"])
                     finished_workdirs.append(workdir)
                     continue
 
@@ -304,7 +405,10 @@ class Command(BaseCommand):
 
                     result["stdout"] = "".join(stdout_lines)
                     result["stderr"] = "".join(stderr_lines)
-                    self.handle_subprocess_result(todo, result, worktree_path, workdir)
+                    if batch:
+                        self.handle_batch_result([todo] + batch, result, worktree_path, workdir)
+                    else:
+                        self.handle_subprocess_result(todo, result, worktree_path, workdir)
                     finished_workdirs.append(workdir)
 
             except Exception as e:
@@ -326,9 +430,43 @@ class Command(BaseCommand):
                 process.kill()
                 process.join()
 
+    def collect_batch(self, todo: Todo) -> list[Todo]:
+        """todoと一緒に実行できるqueuedのTodoを集める（todo自身は含まない）
+
+        同じTodoList・Agent・ブランチで、resume（スナップショットの復元）が不要なもののみ。
+        prompt+contextの合計がbatch_budget以下になる範囲で、priority降順・created昇順に選ぶ
+        """
+        if self.batch_size <= 1 or todo.stash_id:
+            return []
+
+        candidates = (
+            Todo.objects.filter(
+                status=Todo.Status.QUEUED,
+                todo_list_id=todo.todo_list_id,
+                agent_id=todo.agent_id,
+                branch_name=todo.branch_name,
+                stash_id="",
+            )
+            .exclude(pk=todo.pk)
+            .order_by("-priority", "created_at")
+        )
+        batch = []
+        total = len(todo.prompt) + len(todo.context)
+        for candidate in candidates[: self.batch_size * 4]:
+            if len(batch) + 1 >= self.batch_size:
+                break
+            size = len(candidate.prompt) + len(candidate.context)
+            if total + size > self.batch_budget:
+                continue
+            batch.append(candidate)
+            total += size
+        return batch
+
     def start_todo(self, todo: Todo):
         """新しいTodoを起動"""
         workdir = todo.todo_list.workdir
+        # ブランチ名を補完する前に、同じブランチ指定のTodoを集める
+        batch = self.collect_batch(todo)
 
         # branch_name が未設定の場合は workdir の現在のブランチ名を取得
         if not todo.branch_name:
@@ -353,7 +491,7 @@ class Command(BaseCommand):
                 random_suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=4))
                 todo.branch_name = "ai/{}/{}".format(now.strftime("%Y-%m-%d/%H-%M-%S"), random_suffix)
             
-            todo.save(update_fields=["branch_name"])
+            todo.save(update_fields=["branch_name", "updated_at"])
 
         self.stdout.write(self.style.SUCCESS(f"Todo #{todo.id} を処理開始 (workdir: {workdir})"))
         self.stdout.write(f"  ブランチ: {todo.branch_name}")
@@ -362,13 +500,43 @@ class Command(BaseCommand):
         # ステータスをrunningに変更
         todo.status = Todo.Status.RUNNING
         todo.started_at = timezone.now()
-        todo.save(update_fields=["status", "started_at"])
+        # 前回実行時の検証結果をクリア
+        todo.validation_status = ""
+        todo.validation_output = ""
+        todo.validation_duration = None
+        todo.save(
+            update_fields=[
+                "status",
+                "started_at",
+                "validation_status",
+                "validation_output",
+                "validation_duration",
+                "updated_at",
+            ]
+        )
+        if batch:
+            self.stdout.write(f"  一括実行: {', '.join(f'#{t.id}' for t in batch)}")
+            Todo.objects.filter(pk__in=[t.pk for t in batch]).update(
+                status=Todo.Status.RUNNING,
+                queued_at=None,
+                started_at=todo.started_at,
+                branch_name=todo.branch_name,
+                validation_status="",
+                validation_output="",
+                validation_duration=None,
+                updated_at=timezone.now(),
+            )
+            for t in batch:
+                t.refresh_from_db()
+            # QuerySet.update() では post_save が呼ばれないので通知する
+            events.publish([events.todo_event(t) for t in batch])
 
         # multiprocessingで子プロセスを起動
-        self.run_task_with_multiprocessing(todo, workdir)
+        self.run_task_with_multiprocessing(todo, workdir, batch)
 
-    def run_task_with_multiprocessing(self, todo: Todo, workdir: str):
+    def run_task_with_multiprocessing(self, todo: Todo, workdir: str, batch: list[Todo] | None = None):
         """multiprocessingを使ってcall_commandを実行"""
+        batch = batch or []
         parent_conn, child_conn = Pipe()
         output_queue = Queue()
 
@@ -376,7 +544,8 @@ class Command(BaseCommand):
         worktree_path = self.get_worktree_path(workdir, todo.branch_name)
 
         process = Process(
-            target=run_task_in_subprocess, args=(todo.pk, child_conn, output_queue, self.worktree_root)
+            target=run_task_in_subprocess,
+            args=(todo.pk, child_conn, output_queue, self.worktree_root, [t.pk for t in batch]),
         )
         process.start()
 
@@ -394,10 +563,68 @@ class Command(BaseCommand):
             "stdout_lines": [],
             "stderr_lines": [],
             "worktree_path": worktree_path,
+            "batch": batch,
         }
 
-    def handle_subprocess_result(self, todo: Todo, result: dict, worktree_path: str = None, workdir: str = None):
-        """子プロセスの結果を処理"""
+    def requeue_or_cancel(self, todos: list[Todo]):
+        """中断した一括実行のTodoを、cancelledのものはそのまま、それ以外はqueuedに戻す"""
+        for t in todos:
+            if t.status == Todo.Status.CANCELLED:
+                t.output = "=== CANCELLED ===\nCancelled by user"
+                t.finished_at = timezone.now()
+                t.save(update_fields=["output", "finished_at", "updated_at"])
+            else:
+                t.status = Todo.Status.QUEUED
+                t.started_at = None
+                t.save(update_fields=["status", "started_at", "updated_at"])
+                self.stdout.write(f"Todo #{t.id} をキューに戻しました")
+
+    def handle_batch_result(self, todos: list[Todo], result: dict, worktree_path: str = None, workdir: str = None):
+        """
+        一括実行の結果をTodoごとに処理する（resultsがなければ全体の結果を全Todoに適用）
+
+        エラーになったTodoの変更はTodoごとに（edit_filesの範囲で）スナップショットに保存してから、worktreeを1回だけ削除する
+        """
+        results = result.get("results")
+        todo_results = {}
+        for t in todos:
+            t.refresh_from_db()
+            if results is None:
+                todo_results[t.id] = dict(result)
+                continue
+            error = results.get(t.id, "")
+            # outputはrun_taskがTodoごとに保存済み。エラー時のみ詳細を追記する
+            todo_results[t.id] = {
+                "returncode": 1 if error else 0,
+                "stdout": t.output or "",
+                "stderr": "",
+                "error": error,
+            }
+
+        failed = [
+            t for t in todos if t.status != Todo.Status.CANCELLED and todo_results[t.id].get("returncode", -1) != 0
+        ]
+        snapshots = {}
+        if failed and worktree_path and os.path.exists(worktree_path):
+            snapshots = self.save_snapshots(worktree_path, failed)
+            self.cleanup_worktree(worktree_path, workdir)
+
+        for t in todos:
+            self.handle_subprocess_result(t, todo_results[t.id], snapshot=snapshots.get(t.id, (None, [])))
+
+    def handle_subprocess_result(
+        self,
+        todo: Todo,
+        result: dict,
+        worktree_path: str = None,
+        workdir: str = None,
+        snapshot: tuple[str | None, list] | None = None,
+    ):
+        """
+        子プロセスの結果を処理
+
+        snapshotを渡した場合（一括実行）は、エラー時にworktreeを保存・削除せずにその結果を記録する
+        """
         stdout_text = result.get("stdout", "")
         stderr_text = result.get("stderr", "")
         returncode = result.get("returncode", -1)
@@ -423,13 +650,12 @@ class Command(BaseCommand):
             todo.finished_at = timezone.now()
             self.stdout.write(self.style.SUCCESS(f"Todo #{todo.id} が正常に完了しました"))
         else:
-            # エラー終了：stash保存を試みる
-            stash_id = None
-            interrupted_files = []
-            if worktree_path and os.path.exists(worktree_path):
-                interrupted_files = self.get_interrupted_files(worktree_path)
+            # エラー終了：スナップショット保存を試みる
+            stash_id, interrupted_files = snapshot or (None, [])
+            if snapshot is None and worktree_path and os.path.exists(worktree_path):
+                snapshots = self.save_snapshots(worktree_path, [todo])
+                stash_id, interrupted_files = snapshots[todo.id]
                 if interrupted_files:
-                    stash_id = self.save_to_stash(worktree_path, workdir, todo)
                     self.cleanup_worktree(worktree_path, workdir)
 
             todo.output = full_output
@@ -441,9 +667,9 @@ class Command(BaseCommand):
                 self.style.ERROR(f"Todo #{todo.id} がエラーで終了しました（終了コード: {returncode}）")
             )
             if stash_id:
-                self.stdout.write(self.style.WARNING(f"Stash saved: {stash_id}"))
+                self.stdout.write(self.style.WARNING(f"Snapshot saved: refs/todo/{todo.id}/snapshot ({stash_id})"))
 
-        todo.save(update_fields=["status", "output", "finished_at", "stash_id", "interrupted_files"])
+        todo.save(update_fields=["status", "output", "finished_at", "stash_id", "interrupted_files", "updated_at"])
 
     def get_worktree_path(self, workdir: str, branch_name: str) -> str:
         """worktree パスを計算する
@@ -26,6 +26,7 @@ if not settings.configured:
             "default": {
                 "ENGINE": "django.db.backends.sqlite3",
                 "NAME": BASE_DIR / "db.sqlite3",
+                "OPTIONS": {"transaction_mode": os.environ.get("SQLITE_TRANSACTION_MODE", "IMMEDIATE")},
             }
         },
         INSTALLED_APPS=[
@@ -33,12 +34,22 @@ if not settings.configured:
             "django.contrib.auth",
             "todo",
         ],
+        # Todoのステータス変更の通知（config/settings.py と同じ）
+        TODO_EVENTS_PATH=os.environ.get("TODO_EVENTS_PATH", os.path.expanduser("~/.cache/mcp-todo/events.jsonl")),
+        TODO_EVENTS_MAX_BYTES=int(os.environ.get("TODO_EVENTS_MAX_BYTES", str(1024 * 1024))),
+        # SQLiteのPRAGMA（config/settings.py と同じ、todo/sqlite.py）
+        SQLITE_JOURNAL_MODE=os.environ.get("SQLITE_JOURNAL_MODE", "wal"),
+        SQLITE_BUSY_TIMEOUT=int(os.environ.get("SQLITE_BUSY_TIMEOUT", "10000")),
+        SQLITE_SYNCHRONOUS=os.environ.get("SQLITE_SYNCHRONOUS", "normal"),
+        SQLITE_MMAP_SIZE=int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        SQLITE_CACHE_SIZE=int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),
     )
     django.setup()
 
 
 from todo import validate_task
 from todo.models import Todo, TodoList
+from todo.pagination import encode_cursor, keyset_page
 from todo.utils import get_or_create_todolist_with_parent
 
 
@@ -195,17 +206,18 @@ def pushExternalTask(
 
 @mcp.tool()
 @sync_to_async
-def listExternalTask(status: str = "", page: int = 1, limit: int = 10) -> dict:
+def listExternalTask(status: str = "", page: int = 1, limit: int = 10, cursor: str = "") -> dict:
     """Todo一覧を取得する（ページング対応）
 
     Args:
         status: ステータスでフィルタリング（waiting, queued, running, completed, error, cancelled, timeout）
                空の場合はすべてのステータスを取得
-        page: ページ番号（1から開始、デフォルト1）
+        page: ページ番号（1から開始、デフォルト1）。cursor指定時は無視
         limit: 1ページあたりの件数（デフォルト10、最大100）
+        cursor: 前回の返り値の next_cursor。指定すると続きを取得する（総件数は数えないので深いページも速い）
 
     Returns:
-        todo一覧とページネーション情報
+        todo一覧とページネーション情報（次のページがあれば next_cursor）
 
     Note:
         返り値は created_at の降順（新しい順）
@@ -222,7 +234,9 @@ def listExternalTask(status: str = "", page: int = 1, limit: int = 10) -> dict:
 
     # ベースクエリ
     todos = (
-        Todo.objects.filter(todo_list=todo_list).select_related("todo_list", "agent").order_by("-created_at")
+        Todo.objects.filter(todo_list=todo_list)
+        .select_related("todo_list", "agent")
+        .order_by("-created_at", "-id")
     )
 
     # ステータスでフィルタリング（ページネーション前の総件数用）
@@ -231,15 +245,30 @@ def listExternalTask(status: str = "", page: int = 1, limit: int = 10) -> dict:
     else:
         filtered_todos = todos
 
-    # 総件数を取得
-    total_count = filtered_todos.count()
+    if cursor:
+        # キーセット方式: (created_at, id) が前ページの最後より前の行を読む
+        try:
+            paginated_todos, has_next, _ = keyset_page(filtered_todos, "-created_at", limit, cursor)
+        except ValueError as e:
+            return {"status": "failed", "message": str(e)}
+        total_count = None
+        total_pages = None
+    else:
+        # 総件数を取得
+        total_count = filtered_todos.count()
+
+        # 総ページ数を計算
+        total_pages = (total_count + limit - 1) // limit if total_count > 0 else 1
 
-    # 総ページ数を計算
-    total_pages = (total_count + limit - 1) // limit if total_count > 0 else 1
+        # ページネーション
+        offset = (page - 1) * limit
+        paginated_todos = list(filtered_todos[offset : offset + limit])
+        has_next = offset + limit < total_count
 
-    # ページネーション
-    offset = (page - 1) * limit
-    paginated_todos = filtered_todos[offset : offset + limit]
+    next_cursor = None
+    if has_next and paginated_todos:
+        last = paginated_todos[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
 
     # 優先度順にソート: running > queued > waiting > others
     paginated_todos = sorted(paginated_todos, key=sort_priority)
@@ -270,8 +299,9 @@ def listExternalTask(status: str = "", page: int = 1, limit: int = 10) -> dict:
         "todos": result,
         "total_count": total_count,
         "total_pages": total_pages,
-        "current_page": page,
+        "current_page": None if cursor else page,
         "limit": limit,
+        "next_cursor": next_cursor,
     }
 
 
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0013_todolist_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extension',
+            name='pooled',
+            field=models.BooleanField(default=False, help_text='Extensionプールで常駐プロセスとして共有する（Todoごとのworkdirに依存しないものに限る）'),
+        ),
+    ]
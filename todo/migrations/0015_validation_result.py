@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0014_extension_pooled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='validation_duration',
+            field=models.FloatField(blank=True, help_text='validation_commandの実行時間（秒）', null=True),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='validation_output',
+            field=models.TextField(blank=True, default='', help_text='validation_commandの出力（末尾）'),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='validation_status',
+            field=models.CharField(blank=True, choices=[('passed', 'Passed'), ('failed', 'Failed'), ('timeout', 'Timeout'), ('error', 'Error')], default='', help_text='validation_commandの実行結果', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ValidationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(help_text='実行したコマンド', max_length=500)),
+                ('tree', models.CharField(help_text='実行時の作業ツリーのtreeハッシュ', max_length=64)),
+                ('status', models.CharField(choices=[('passed', 'Passed'), ('failed', 'Failed'), ('timeout', 'Timeout'), ('error', 'Error')], help_text='実行結果', max_length=20)),
+                ('output', models.TextField(blank=True, default='', help_text='出力（末尾）')),
+                ('duration', models.FloatField(help_text='実行時間（秒）')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('command', 'tree'), name='unique_validation_command_tree')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0015_validation_result'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='todo',
+            name='stash_id',
+            field=models.CharField(blank=True, default='', help_text='中断時のスナップショット（refs/todo/<id>/snapshot のコミット、resume時に使用）', max_length=100),
+        ),
+    ]
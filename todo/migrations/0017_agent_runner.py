@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0016_alter_todo_stash_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='runner',
+            field=models.CharField(default='goose', help_text='実行方法（goose: goose run --recipe, fake: LLMを使わない負荷試験用エージェント）', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='runner_options',
+            field=models.JSONField(blank=True, default=dict, help_text='runnerごとの設定'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+# コレクション名 -> テーブル名
+VERSIONED_TABLES = {
+    'todo': 'todo_todo',
+    'todolist': 'todo_todolist',
+    'agent': 'todo_agent',
+}
+
+
+def trigger_sql():
+    sql = []
+    for name, table in VERSIONED_TABLES.items():
+        sql.append(
+            "INSERT INTO todo_collectionversion (name, version, updated_at) "
+            "VALUES ('{}', 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))".format(name)
+        )
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            sql.append(
+                "CREATE TRIGGER {table}_version_{event} AFTER {event} ON {table} BEGIN "
+                "UPDATE todo_collectionversion SET version = version + 1, "
+                "updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE name = '{name}'; END".format(
+                    table=table, event=event.lower(), name=name
+                )
+            )
+    return sql
+
+
+def reverse_trigger_sql():
+    return [
+        'DROP TRIGGER IF EXISTS {}_version_{}'.format(table, event)
+        for table in VERSIONED_TABLES.values()
+        for event in ('insert', 'update', 'delete')
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0018_todo_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('name', models.CharField(help_text='コレクション名（todo, todolist, agent）', max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0, help_text='更新回数')),
+                ('updated_at', models.DateTimeField(blank=True, help_text='最終更新時刻', null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='todolist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunSQL(trigger_sql(), reverse_trigger_sql()),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:34
+
+import django.db.models.deletion
+import todo.models
+from django.db import migrations, models
+
+# todo.search の COLUMNS・trigger_sql() をこのマイグレーションの時点の内容で固定する
+# （あとで検索対象の列が変わっても、このマイグレーションの結果は変わらないようにする）
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE todo_todo_fts USING fts5("
+    "title, prompt, context, output, content='todo_todo', content_rowid='id', tokenize='trigram')",
+    # タイトルの一致を本文より重く評価する
+    "INSERT INTO todo_todo_fts (todo_todo_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 1.0, 1.0)')",
+    "CREATE TRIGGER IF NOT EXISTS todo_todo_fts_insert AFTER INSERT ON todo_todo BEGIN "
+    "INSERT INTO todo_todo_fts (rowid, title, prompt, context, output) "
+    "VALUES (new.id, new.title, new.prompt, new.context, new.output); END",
+    "CREATE TRIGGER IF NOT EXISTS todo_todo_fts_delete AFTER DELETE ON todo_todo BEGIN "
+    "INSERT INTO todo_todo_fts (todo_todo_fts, rowid, title, prompt, context, output) "
+    "VALUES ('delete', old.id, old.title, old.prompt, old.context, old.output); END",
+    # 検索対象の列が変わった場合のみ索引し直す
+    "CREATE TRIGGER IF NOT EXISTS todo_todo_fts_update AFTER UPDATE OF title, prompt, context, output ON todo_todo "
+    "WHEN old.title IS NOT new.title OR old.prompt IS NOT new.prompt "
+    "OR old.context IS NOT new.context OR old.output IS NOT new.output BEGIN "
+    "INSERT INTO todo_todo_fts (todo_todo_fts, rowid, title, prompt, context, output) "
+    "VALUES ('delete', old.id, old.title, old.prompt, old.context, old.output); "
+    "INSERT INTO todo_todo_fts (rowid, title, prompt, context, output) "
+    "VALUES (new.id, new.title, new.prompt, new.context, new.output); END",
+    # 既存のTodoを索引する
+    "INSERT INTO todo_todo_fts (todo_todo_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS todo_todo_fts_insert',
+    'DROP TRIGGER IF EXISTS todo_todo_fts_delete',
+    'DROP TRIGGER IF EXISTS todo_todo_fts_update',
+    'DROP TABLE IF EXISTS todo_todo_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0019_collectionversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoSearchIndex',
+            fields=[
+                ('todo', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='todo.todo')),
+                ('document', todo.models.FullTextField(db_column='todo_todo_fts')),
+                ('title', models.TextField()),
+                ('prompt', models.TextField()),
+                ('context', models.TextField()),
+                ('output', models.TextField(null=True)),
+                ('rank', models.FloatField(help_text='bm25スコア（小さいほど関連度が高い、MATCH時のみ）')),
+            ],
+            options={
+                'db_table': 'todo_todo_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
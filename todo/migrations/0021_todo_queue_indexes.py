@@ -0,0 +1,33 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0020_todosearchindex'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['todo_list', 'status', 'created_at', 'id'], name='todo_list_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='todo_status_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('status', 'queued')), fields=['-priority', 'created_at'], name='todo_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('status', 'queued')), fields=['todo_list', '-priority', 'created_at'], name='todo_queue_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todolist',
+            index=models.Index(fields=['workdir'], name='todolist_workdir_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.1.2 on 2026-10-19 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0021_todo_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTodo',
+            fields=[
+                ('title', models.CharField(default='', help_text='タスクのタイトル', max_length=255)),
+                ('priority', models.IntegerField(default=0, help_text='優先度（数値が大きいほど優先度高）')),
+                ('system_prompt', models.TextField(blank=True, help_text='システムプロンプト')),
+                ('ref_files', models.JSONField(blank=True, default=list, help_text='参照用ファイルリスト')),
+                ('edit_files', models.JSONField(blank=True, default=list, help_text='編集対象ファイルリスト')),
+                ('prompt', models.TextField(help_text='タスク内容')),
+                ('context', models.TextField(blank=True, help_text='動的に注入するコンテキスト')),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('timeout', 'Timeout'), ('error', 'Error')], default='waiting', help_text='タスクのステータス', max_length=20)),
+                ('output', models.TextField(blank=True, help_text='実行結果', null=True)),
+                ('validation_command', models.CharField(blank=True, help_text='完了判断用コマンド', max_length=500)),
+                ('validation_status', models.CharField(blank=True, choices=[('passed', 'Passed'), ('failed', 'Failed'), ('timeout', 'Timeout'), ('error', 'Error')], default='', help_text='validation_commandの実行結果', max_length=20)),
+                ('validation_output', models.TextField(blank=True, default='', help_text='validation_commandの出力（末尾）')),
+                ('validation_duration', models.FloatField(blank=True, help_text='validation_commandの実行時間（秒）', null=True)),
+                ('timeout', models.IntegerField(default=900, help_text='タイムアウト秒数')),
+                ('branch_name', models.CharField(default='', max_length=255)),
+                ('auto_stash', models.BooleanField(default=True, help_text='自動スタッシュ')),
+                ('keep_branch', models.BooleanField(default=False, help_text='ブランチを保持する')),
+                ('started_at', models.DateTimeField(blank=True, help_text='実行開始時刻', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='実行完了時刻', null=True)),
+                ('stash_id', models.CharField(blank=True, default='', help_text='中断時のスナップショット（refs/todo/<id>/snapshot のコミット、resume時に使用）', max_length=100)),
+                ('interrupted_files', models.JSONField(blank=True, default=list, help_text='中断時の変更ファイルリスト（stash保存前の状態）')),
+                ('id', models.BigIntegerField(help_text='元のTodoのid', primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(help_text='アーカイブした時刻')),
+                ('agent', models.ForeignKey(blank=True, help_text='使用したエージェント', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_todos', to='todo.agent')),
+                ('todo_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_todos', to='todo.todolist')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='archived_created_id_idx'), models.Index(fields=['updated_at', 'id'], name='archived_updated_id_idx'), models.Index(fields=['status', 'id'], name='archived_status_id_idx'), models.Index(fields=['todo_list', 'created_at', 'id'], name='archived_list_created_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-19 09:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_queued_at(apps, schema_editor):
+    # 既存のqueuedのTodoは、queuedになった時点で更新される updated_at を近似値として使う
+    Todo = apps.get_model('todo', 'Todo')
+    Todo.objects.using(schema_editor.connection.alias).filter(status='queued').update(queued_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0022_archivedtodo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, help_text='queuedになった時刻（queued以外ではNone、ダッシュボードの待ち時間）', null=True),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, help_text='queuedになった時刻（queued以外ではNone、ダッシュボードの待ち時間）', null=True),
+        ),
+        migrations.RunPython(backfill_queued_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-19 09:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0023_todo_queued_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='todo',
+            name='todo_status_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='todo',
+            name='todo_list_status_created_idx',
+        ),
+        # AlterField のままだとSQLiteではテーブルを作り直す（全行のコピー・トリガーの削除）ので、
+        # 外部キーのインデックスだけをDROPする
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='todo',
+                    name='todo_list',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='todos', to='todo.todolist'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS "todo_todo_todo_list_id_561e0750"',
+                    'CREATE INDEX "todo_todo_todo_list_id_561e0750" ON "todo_todo" ("todo_list_id")',
+                ),
+            ],
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 
 class TodoList(models.Model):
@@ -15,6 +17,11 @@ class TodoList(models.Model):
         help_text="親TodoList",
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # get_or_create_todolist_with_parent・workdirでの絞り込み用
+        indexes = [models.Index(fields=["workdir"], name="todolist_workdir_idx")]
 
     def __str__(self):
         return self.workdir
@@ -29,6 +36,10 @@ class Extension(models.Model):
     args = models.JSONField(default=list, help_text="コマンド引数リスト")
     envs = models.JSONField(default=dict, help_text="環境変数マップ")
     timeout = models.IntegerField(default=300, help_text="タイムアウト秒数")
+    pooled = models.BooleanField(
+        default=False,
+        help_text="Extensionプールで常駐プロセスとして共有する（Todoごとのworkdirに依存しないものに限る）",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -42,6 +53,12 @@ class Agent(models.Model):
     name = models.CharField(max_length=100, unique=True, help_text="エージェント名")
     system_message = models.TextField(blank=True, help_text="システムメッセージ")
     extensions = models.ManyToManyField(Extension, blank=True, related_name="agents", help_text="使用する拡張機能")
+    runner = models.CharField(
+        max_length=50,
+        default="goose",
+        help_text="実行方法（goose: goose run --recipe, fake: LLMを使わない負荷試験用エージェント）",
+    )
+    runner_options = models.JSONField(default=dict, blank=True, help_text="runnerごとの設定")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -49,8 +66,17 @@ class Agent(models.Model):
         return self.name
 
 
-class Todo(models.Model):
-    """個別のTodoタスク"""
+class ValidationStatus(models.TextChoices):
+    """validation_commandの実行結果"""
+
+    PASSED = "passed", "Passed"
+    FAILED = "failed", "Failed"
+    TIMEOUT = "timeout", "Timeout"
+    ERROR = "error", "Error"
+
+
+class BaseTodo(models.Model):
+    """Todo・ArchivedTodoに共通のフィールド"""
 
     class Status(models.TextChoices):
         WAITING = "waiting", "Waiting"
@@ -61,15 +87,6 @@ class Todo(models.Model):
         TIMEOUT = "timeout", "Timeout"
         ERROR = "error", "Error"
 
-    todo_list = models.ForeignKey(TodoList, on_delete=models.CASCADE, related_name="todos")
-    agent = models.ForeignKey(
-        Agent,
-        on_delete=models.SET_NULL,
-        null=True,
-        blank=True,
-        related_name="todos",
-        help_text="使用するエージェント",
-    )
     title = models.CharField(max_length=255, default="", help_text="タスクのタイトル")
     priority = models.IntegerField(default=0, help_text="優先度（数値が大きいほど優先度高）")
     system_prompt = models.TextField(blank=True, help_text="システムプロンプト")
@@ -85,19 +102,31 @@ class Todo(models.Model):
     )
     output = models.TextField(null=True, blank=True, help_text="実行結果")
     validation_command = models.CharField(max_length=500, blank=True, help_text="完了判断用コマンド")
+    validation_status = models.CharField(
+        max_length=20,
+        choices=ValidationStatus.choices,
+        default="",
+        blank=True,
+        help_text="validation_commandの実行結果",
+    )
+    validation_output = models.TextField(blank=True, default="", help_text="validation_commandの出力（末尾）")
+    validation_duration = models.FloatField(null=True, blank=True, help_text="validation_commandの実行時間（秒）")
     timeout = models.IntegerField(default=900, help_text="タイムアウト秒数")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     branch_name = models.CharField(max_length=255, default="")
     auto_stash = models.BooleanField(default=True, help_text="自動スタッシュ")
     keep_branch = models.BooleanField(default=False, help_text="ブランチを保持する")
+    queued_at = models.DateTimeField(
+        null=True, blank=True, help_text="queuedになった時刻（queued以外ではNone、ダッシュボードの待ち時間）"
+    )
     started_at = models.DateTimeField(null=True, blank=True, help_text="実行開始時刻")
     finished_at = models.DateTimeField(null=True, blank=True, help_text="実行完了時刻")
     stash_id = models.CharField(
         max_length=100,
         default="",
         blank=True,
-        help_text="中断時のstash ID（resume時に使用）"
+        help_text="中断時のスナップショット（refs/todo/<id>/snapshot のコミット、resume時に使用）"
     )
     interrupted_files = models.JSONField(
         default=list,
@@ -105,5 +134,162 @@ class Todo(models.Model):
         help_text="中断時の変更ファイルリスト（stash保存前の状態）"
     )
 
+    class Meta:
+        abstract = True
+
     def __str__(self):
         return self.title if self.title else self.prompt[:50]
+
+
+class Todo(BaseTodo):
+    """個別のTodoタスク"""
+
+    # 外部キーの単独のインデックスは作らない（Meta.indexes の todo_list_created_id_idx の先頭列で代用する）
+    todo_list = models.ForeignKey(TodoList, on_delete=models.CASCADE, related_name="todos", db_index=False)
+    agent = models.ForeignKey(
+        Agent,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="todos",
+        help_text="使用するエージェント",
+    )
+
+    class Meta:
+        indexes = [
+            # 一覧のキーセットページネーション用（(並び替えフィールド, id) の順に読む）
+            models.Index(fields=["created_at", "id"], name="todo_created_id_idx"),
+            models.Index(fields=["updated_at", "id"], name="todo_updated_id_idx"),
+            # TodoListごとの一覧（ステータスでの絞り込みはTodoList内の行を順に読みながら行う）。
+            # todo_list の外部キーのインデックスも兼ねる
+            models.Index(fields=["todo_list", "created_at", "id"], name="todo_list_created_id_idx"),
+            models.Index(fields=["todo_list", "updated_at", "id"], name="todo_list_updated_id_idx"),
+            # ステータスで絞り込んだ全体の一覧
+            models.Index(fields=["status", "created_at", "id"], name="todo_status_created_id_idx"),
+            # task_workerのキュー: queuedのTodoだけを priority降順・created昇順 に読む（部分インデックス）
+            models.Index(fields=["-priority", "created_at"], name="todo_queue_idx", condition=Q(status="queued")),
+            # 一括実行の候補（同じTodoListのqueuedのTodo）
+            models.Index(
+                fields=["todo_list", "-priority", "created_at"], name="todo_queue_list_idx", condition=Q(status="queued")
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # queuedになった時刻を記録し、queued以外になったら消す
+        # （QuerySet.update() でステータスを変える場合は呼び出し側で queued_at も更新する）
+        if self.status == self.Status.QUEUED:
+            if self.queued_at is None:
+                self.queued_at = timezone.now()
+        else:
+            self.queued_at = None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "status" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "queued_at"}
+        super().save(*args, **kwargs)
+
+
+class ArchivedTodo(BaseTodo):
+    """アーカイブ済みのTodo（読み取り専用）
+
+    完了済みで古いTodoを archive_todos（todo/archive.py）が todo_todo から移したもの。
+    idは元のTodoのidのままで、APIでは ?archived=1 で読める
+    """
+
+    id = models.BigIntegerField(primary_key=True, help_text="元のTodoのid")
+    todo_list = models.ForeignKey(TodoList, on_delete=models.CASCADE, related_name="archived_todos")
+    agent = models.ForeignKey(
+        Agent,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_todos",
+        help_text="使用したエージェント",
+    )
+    # 元のTodoの値をそのまま残す（auto_now・auto_now_add を使わない）
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(help_text="アーカイブした時刻")
+
+    class Meta:
+        indexes = [
+            # 一覧のキーセットページネーション用（Todoと同じ並び順）
+            models.Index(fields=["created_at", "id"], name="archived_created_id_idx"),
+            models.Index(fields=["updated_at", "id"], name="archived_updated_id_idx"),
+            models.Index(fields=["status", "id"], name="archived_status_id_idx"),
+            models.Index(fields=["todo_list", "created_at", "id"], name="archived_list_created_id_idx"),
+        ]
+
+
+class Match(models.Lookup):
+    """FTS5の MATCH 演算子（FullTextField用）"""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return "{} MATCH {}".format(lhs, rhs), lhs_params + rhs_params
+
+
+class FullTextField(models.TextField):
+    """FTS5テーブルのテーブル名と同名の隠し列（MATCH・snippet() の対象）"""
+
+
+FullTextField.register_lookup(Match)
+
+
+class TodoSearchIndex(models.Model):
+    """Todoの全文検索インデックス（SQLite FTS5、trigramトークナイザ）
+
+    todo_todo を外部コンテンツとする仮想テーブルで、todo_todo へのINSERT / UPDATE / DELETEのたびに
+    SQLiteのトリガーで更新される（migrations/0020_todosearchindex、todo.search.ensure_search_index）
+    """
+
+    todo = models.OneToOneField(
+        Todo, on_delete=models.DO_NOTHING, primary_key=True, db_column="rowid", related_name="search_index"
+    )
+    document = FullTextField(db_column="todo_todo_fts")
+    title = models.TextField()
+    prompt = models.TextField()
+    context = models.TextField()
+    output = models.TextField(null=True)
+    rank = models.FloatField(help_text="bm25スコア（小さいほど関連度が高い、MATCH時のみ）")
+
+    class Meta:
+        managed = False
+        db_table = "todo_todo_fts"
+
+
+class ValidationResult(models.Model):
+    """validation_commandの実行結果のキャッシュ
+
+    同じコマンドを同じtree（git write-treeのハッシュ）に対して再実行しないために使う
+    """
+
+    command = models.CharField(max_length=500, help_text="実行したコマンド")
+    tree = models.CharField(max_length=64, help_text="実行時の作業ツリーのtreeハッシュ")
+    status = models.CharField(max_length=20, choices=ValidationStatus.choices, help_text="実行結果")
+    output = models.TextField(blank=True, default="", help_text="出力（末尾）")
+    duration = models.FloatField(help_text="実行時間（秒）")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["command", "tree"], name="unique_validation_command_tree")]
+
+    def __str__(self):
+        return "{} @ {}: {}".format(self.command, self.tree[:12], self.status)
+
+
+class CollectionVersion(models.Model):
+    """テーブルごとの更新カウンタ（一覧APIのETag・Last-Modified用）
+
+    todo_todo・todo_todolist・todo_agent への INSERT / UPDATE / DELETE のたびにSQLiteのトリガーで更新される
+    （migrations/0019_collectionversion）。QuerySet.update() や他プロセス（task_worker）の更新も反映される
+    """
+
+    name = models.CharField(max_length=50, primary_key=True, help_text="コレクション名（todo, todolist, agent）")
+    version = models.BigIntegerField(default=0, help_text="更新回数")
+    updated_at = models.DateTimeField(null=True, blank=True, help_text="最終更新時刻")
+
+    def __str__(self):
+        return "{}: {}".format(self.name, self.version)
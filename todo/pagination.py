@@ -0,0 +1,200 @@
+"""
+Todo一覧のキーセット（カーソル）ページネーション
+
+OFFSET は読み飛ばす行を毎回スキャンし、COUNT(*) は全件を数えるので、履歴が増えるほど深いページが遅くなる。
+ここでは (並び替えフィールド, id) の組をカーソルにして
+
+    WHERE (field < v) OR (field = v AND id < id0) ORDER BY field DESC, id DESC LIMIT n + 1
+
+のように前ページの最後の行から続きを読む。(field, id) のインデックス（models.Todo.Meta.indexes）を使うので、
+どのページも最初のページと同じコストになる。総件数は `?count=1` の場合のみ、短時間キャッシュして返す。
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(value, pk: int, reverse: bool = False) -> str:
+    """(並び替えフィールドの値, id) をカーソル文字列にする"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = {"v": value, "id": pk}
+    if reverse:
+        payload["r"] = 1
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[object, int, bool]:
+    """カーソル文字列を (値, id, 逆方向か) に戻す（不正な場合はValueError）"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return payload["v"], int(payload["id"]), bool(payload.get("r"))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("不正なカーソルです: {}".format(cursor))
+
+
+def keyset_page(queryset, ordering: str, limit: int, cursor: str | None = None):
+    """
+    キーセット方式で1ページ分を取得する
+
+    Args:
+        queryset: 並び替え前のQuerySet
+        ordering: 並び替えフィールド（'-created_at' など、'-' で降順）
+        limit: 1ページの件数
+        cursor: encode_cursor で作ったカーソル（Noneなら先頭ページ）
+
+    Returns:
+        tuple: (行のリスト, 次ページがあるか, 前ページがあるか)
+
+    Raises:
+        ValueError: カーソルが不正な場合
+    """
+    field = ordering.lstrip("-")
+    descending = ordering.startswith("-")
+    reverse = False
+
+    if cursor:
+        value, pk, reverse = decode_cursor(cursor)
+        if field.endswith("_at") and isinstance(value, str):
+            value = parse_datetime(value)
+        # 逆方向（前ページ）は並びを反転して読み、最後に元の順に戻す
+        after = descending != reverse
+        lookup = "lt" if after else "gt"
+        queryset = queryset.filter(
+            Q(**{"{}__{}".format(field, lookup): value}) | Q(**{field: value, "id__{}".format(lookup): pk})
+        )
+
+    direction = "-" if descending != reverse else ""
+    if field == "id":
+        queryset = queryset.order_by(direction + "id")
+    else:
+        queryset = queryset.order_by(direction + field, direction + "id")
+
+    rows = list(queryset[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if reverse:
+        rows.reverse()
+        return rows, True, has_more
+    return rows, has_more, cursor is not None
+
+
+def cached_count(queryset) -> int:
+    """QuerySetの件数（SQLをキーに TODO_COUNT_CACHE_TTL 秒キャッシュする）"""
+    key = "todo_count:{}".format(hashlib.sha256(str(queryset.query).encode()).hexdigest())
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.TODO_COUNT_CACHE_TTL)
+    return count
+
+
+class TodoPagination(BasePagination):
+    """
+    Todo一覧のページネーション
+
+    - デフォルト: キーセット方式。`?cursor=` で続きを取得する（next / previous のURLにカーソルが入る）
+    - `?offset=` を指定した場合: 従来のlimit/offset方式（COUNT(*) とOFFSETを実行する）
+    - `?count=1`: キーセット方式でも総件数を返す（短時間キャッシュ）
+
+    並び替えはビューの get_ordering() に従う（idで一意に順序付けする）
+    """
+
+    default_limit = 50
+    max_limit = 100
+    limit_query_param = "limit"
+    cursor_query_param = "cursor"
+
+    def __init__(self):
+        self.offset_paginator = None
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if LimitOffsetPagination.offset_query_param in request.query_params:
+            self.offset_paginator = LimitOffsetPagination()
+            self.offset_paginator.default_limit = self.default_limit
+            self.offset_paginator.max_limit = self.max_limit
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = view.get_ordering() if view is not None and hasattr(view, "get_ordering") else "id"
+        self.limit = self.get_limit(request)
+        self.count = cached_count(queryset) if request.query_params.get("count") in ("1", "true") else None
+        try:
+            rows, self.has_next, self.has_previous = keyset_page(
+                queryset, self.ordering, self.limit, request.query_params.get(self.cursor_query_param)
+            )
+        except ValueError as e:
+            raise ValidationError({self.cursor_query_param: str(e)})
+        self.rows = rows
+        return rows
+
+    def _link(self, row, reverse: bool):
+        field = self.ordering.lstrip("-")
+        url = self.request.build_absolute_uri()
+        cursor = encode_cursor(getattr(row, field), row.pk, reverse=reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self._link(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.rows:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._link(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        response = {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+        if self.count is not None:
+            response["count"] = self.count
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class TodoListPagination(TodoPagination):
+    """
+    TodoList一覧のページネーション
+
+    互換性のため、limit・cursor・offset のいずれも指定されない場合はページングせずに全件を配列で返す
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = (self.limit_query_param, self.cursor_query_param, LimitOffsetPagination.offset_query_param)
+        if not any(param in request.query_params for param in params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,52 @@
+"""
+REST APIのJSONのレンダラー・パーサー（orjson）
+
+Todoの一覧・詳細は prompt・output などの長い文字列が大半を占め、標準のJSONRenderer（json.dumps）では
+エンコードにかなりのCPU時間を使う。orjson は同じデータを数倍速くエンコード・デコードする。
+
+出力は JSONRenderer と互換にする:
+- 日時は DRF の JSONEncoder と同じ形式（UTCは末尾 "Z"）
+- orjson が扱えない型（Decimal、遅延評価の文字列など）は DRF の JSONEncoder に任せる
+- `Accept: application/json; indent=4` のようにindentを指定された場合は整形して返す（orjsonは2スペース固定）
+
+ベンチマーク: python manage.py bench_api
+"""
+
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_fallback_encoder = JSONEncoder()
+
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    return _fallback_encoder.default(obj)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        options = OPTIONS
+        if accepted_media_type and "indent=" in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=options)
+
+
+class ORJSONParser(BaseParser):
+    media_type = "application/json"
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError("JSON parse error - {}".format(e))
@@ -0,0 +1,80 @@
+"""
+エージェントの実行方法（AgentRunner）
+
+run_task はAgentの runner / runner_options から実行方法を決める。
+プロセスの起動・ログの書き出し・終了コードの判定は run_task 側で共通に行い、
+runnerは起動するコマンドと環境変数だけを決める。
+
+- goose: `goose run --recipe` を実行する（デフォルト）
+- fake: LLMを使わずにファイル編集・待機・出力・失敗を再現する（todo/fake_agent.py）。
+  スケジューリングやgit処理の負荷試験用
+"""
+
+import json
+import os
+import sys
+
+from todo import fake_agent
+
+
+class AgentRunner:
+    """エージェントの起動方法"""
+
+    name = ""
+
+    def __init__(self, options: dict | None = None):
+        self.options = dict(options or {})
+
+    def build_command(self, recipe_file: str, quiet: bool) -> list[str]:
+        raise NotImplementedError
+
+    def build_env(self) -> dict:
+        return os.environ.copy()
+
+
+class GooseRunner(AgentRunner):
+    """goose run --recipe で実行する"""
+
+    name = "goose"
+
+    def build_command(self, recipe_file: str, quiet: bool) -> list[str]:
+        cmd = [self.options.get("command", "goose"), "run", "--recipe", recipe_file]
+        if quiet:
+            cmd.append("-q")
+        return cmd
+
+    def build_env(self) -> dict:
+        env = super().build_env()
+        env["GOOSE_TEMPERATURE"] = str(self.options.get("temperature", 0.3))
+        return env
+
+
+class FakeRunner(AgentRunner):
+    """LLMを使わない決定的なエージェント（負荷試験用）
+
+    runner_options は todo/fake_agent.py の DEFAULT_OPTIONS を参照
+    """
+
+    name = "fake"
+
+    def build_command(self, recipe_file: str, quiet: bool) -> list[str]:
+        # worktreeをcwdにして起動するので、モジュールではなくファイルとして実行する
+        return [
+            sys.executable,
+            os.path.abspath(fake_agent.__file__),
+            "--recipe",
+            recipe_file,
+            "--options",
+            json.dumps(self.options),
+        ]
+
+
+RUNNERS = {runner.name: runner for runner in (GooseRunner, FakeRunner)}
+
+
+def get_runner(name: str, options: dict | None = None) -> AgentRunner:
+    """runner名からAgentRunnerを作成（未知の名前はValueError）"""
+    try:
+        return RUNNERS[name or GooseRunner.name](options)
+    except KeyError:
+        raise ValueError("未知のrunnerです: {}（{}）".format(name, ", ".join(RUNNERS)))
@@ -0,0 +1,131 @@
+"""
+Todoの全文検索（SQLite FTS5）
+
+title・prompt・context・output を trigram トークナイザのFTS5テーブル（models.TodoSearchIndex）で索引する。
+trigramは空白で区切られない日本語でも部分一致で検索でき、LIKE '%q%' と違って全行の本文を読まない。
+
+- 索引は todo_todo のトリガーで更新するので、QuerySet.update() / bulk_create() / delete() や
+  他プロセス（task_worker）の更新も反映される
+- SQLiteではテーブルを作り直すマイグレーション（列の変更など）でトリガーが消えるので、
+  post_migrate で ensure_search_index() を実行し、トリガーを作り直して索引を再構築する
+- trigramは3文字未満の語を検索できないので、短い語だけ LIKE で絞り込む
+"""
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, TextField, Value
+
+COLUMNS = ["title", "prompt", "context", "output"]
+
+TRIGGERS = ["todo_todo_fts_insert", "todo_todo_fts_delete", "todo_todo_fts_update"]
+
+# trigramトークナイザで検索できる最短の語の長さ
+MIN_TERM_LENGTH = 3
+
+SNIPPET_START = "【"
+SNIPPET_END = "】"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 16
+
+
+def trigger_sql() -> list[str]:
+    """todo_todo の変更をFTS5テーブルに反映するトリガー"""
+    columns = ", ".join(COLUMNS)
+    new_values = ", ".join("new.{}".format(c) for c in COLUMNS)
+    old_values = ", ".join("old.{}".format(c) for c in COLUMNS)
+    changed = " OR ".join("old.{0} IS NOT new.{0}".format(c) for c in COLUMNS)
+    insert = "INSERT INTO todo_todo_fts (rowid, {}) VALUES (new.id, {});".format(columns, new_values)
+    delete = "INSERT INTO todo_todo_fts (todo_todo_fts, rowid, {}) VALUES ('delete', old.id, {});".format(
+        columns, old_values
+    )
+    return [
+        "CREATE TRIGGER IF NOT EXISTS todo_todo_fts_insert AFTER INSERT ON todo_todo BEGIN {} END".format(insert),
+        "CREATE TRIGGER IF NOT EXISTS todo_todo_fts_delete AFTER DELETE ON todo_todo BEGIN {} END".format(delete),
+        # 検索対象の列が変わった場合のみ索引し直す（status などの更新では何もしない）
+        "CREATE TRIGGER IF NOT EXISTS todo_todo_fts_update AFTER UPDATE OF {} ON todo_todo "
+        "WHEN {} BEGIN {} {} END".format(columns, changed, delete, insert),
+    ]
+
+
+def ensure_search_index(using: str = "default") -> bool:
+    """
+    トリガーが消えていれば作り直し、索引を再構築する
+
+    Returns:
+        bool: 再構築した場合True
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name = 'todo_todo_fts' OR name IN ({})".format(
+                ", ".join(["%s"] * len(TRIGGERS))
+            ),
+            TRIGGERS,
+        )
+        existing = {name for _, name in cursor.fetchall()}
+        # FTS5テーブルがない（マイグレーション前）
+        if "todo_todo_fts" not in existing:
+            return False
+        if all(name in existing for name in TRIGGERS):
+            return False
+        for sql in trigger_sql():
+            cursor.execute(sql)
+        cursor.execute("INSERT INTO todo_todo_fts (todo_todo_fts) VALUES ('rebuild')")
+    return True
+
+
+def split_terms(q: str) -> tuple[list[str], list[str]]:
+    """検索語を (FTS5で検索する語, LIKEで検索する短い語) に分ける"""
+    terms = list(dict.fromkeys(q.split()))
+    return [t for t in terms if len(t) >= MIN_TERM_LENGTH], [t for t in terms if len(t) < MIN_TERM_LENGTH]
+
+
+def build_match_expression(terms: list[str]) -> str:
+    """語をすべて含む（AND）FTS5のクエリ。各語はフレーズとして扱い、演算子として解釈させない"""
+    return " AND ".join('"{}"'.format(t.replace('"', '""')) for t in terms)
+
+
+class Snippet(Func):
+    """FTS5の snippet()（最も一致した列の一致箇所の前後）"""
+
+    function = "snippet"
+    output_field = TextField()
+
+    def __init__(self, document, **extra):
+        super().__init__(
+            document,
+            Value(-1),
+            Value(SNIPPET_START),
+            Value(SNIPPET_END),
+            Value(SNIPPET_ELLIPSIS),
+            Value(SNIPPET_TOKENS),
+            **extra,
+        )
+
+
+def search_todos(queryset, q: str):
+    """
+    Todoのquerysetを検索語で絞り込む
+
+    すべての語を含むTodoを返し、search_rank（bm25、小さいほど関連度が高い）と
+    search_snippet（一致箇所を【】で囲んだ抜粋）をannotateする。
+    3文字未満の語しかない場合は LIKE で絞り込み、search_rank は0、search_snippet はNoneになる
+    """
+    fts_terms, short_terms = split_terms(q)
+    for term in short_terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term)
+            | Q(prompt__icontains=term)
+            | Q(context__icontains=term)
+            | Q(output__icontains=term)
+        )
+    if not fts_terms:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+            search_snippet=Value(None, output_field=TextField()),
+        )
+    return queryset.filter(search_index__document__match=build_match_expression(fts_terms)).annotate(
+        search_rank=F("search_index__rank"),
+        search_snippet=Snippet(F("search_index__document")),
+    )
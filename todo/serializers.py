@@ -7,7 +7,7 @@ from .utils import get_or_create_todolist_with_parent
 class AgentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Agent
-        fields = ["id", "name", "system_message", "created_at", "updated_at"]
+        fields = ["id", "name", "system_message", "runner", "runner_options", "created_at", "updated_at"]
         read_only_fields = ["created_at", "updated_at"]
 
 
@@ -20,12 +20,38 @@ class TodoListSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
     
     def get_parent(self, obj):
+        # TodoListViewSet は select_related('parent') で読むので、行ごとのクエリは発生しない
         if obj.parent:
             return {'id': obj.parent.id, 'name': obj.parent.name}
         return None
 
 
-class TodoSerializer(serializers.ModelSerializer):
+def get_requested_fields(request) -> set[str] | None:
+    """`?fields=` で指定されたフィールド名の集合（指定なしならNone）"""
+    if request is None:
+        return None
+    value = request.query_params.get("fields")
+    if not value:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """`?fields=id,title,status` で出力するフィールドを絞り込む（未知のフィールド名は400）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = get_requested_fields(self.context.get("request"))
+        if fields is None:
+            return
+        unknown = fields - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({"fields": "未知のフィールドです: {}".format(", ".join(sorted(unknown)))})
+        for name in set(self.fields) - fields:
+            self.fields.pop(name)
+
+
+class TodoSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     agent_name = serializers.CharField(source="agent.name", read_only=True, allow_null=True)
     workdir = serializers.CharField(source="todo_list.workdir", read_only=True)
     todo_list_name = serializers.CharField(source="todo_list.name", read_only=True)  # 追加
@@ -62,10 +88,26 @@ class TodoSerializer(serializers.ModelSerializer):
             "keep_branch",
             "context",
             "validation_command",
+            "validation_status",
+            "validation_output",
+            "validation_duration",
+            "queued_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "created_at",
+            "updated_at",
+            "output",
+            "workdir",
+            "system_prompt",
+            "queued_at",
             "started_at",
             "finished_at",
+            "validation_status",
+            "validation_output",
+            "validation_duration",
         ]
-        read_only_fields = ["created_at", "updated_at", "output", "workdir", "system_prompt", "started_at", "finished_at"]
 
     def create(self, validated_data):
         # workdirが指定されている場合は、TodoListを自動作成/取得（worktreeの場合はparentを設定）
@@ -91,8 +133,95 @@ class TodoSerializer(serializers.ModelSerializer):
         return data
 
 
+class TodoListItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Todo一覧用の読み取り専用シリアライザ
+
+    prompt・context・output の全文は返さず、先頭 PREVIEW_LENGTH 文字のプレビューのみ返す。
+    プレビューはクエリ側で切り詰める（TodoViewSet.get_queryset の annotate）ので、全文はDBから読まない
+    """
+
+    PREVIEW_LENGTH = 200
+
+    agent_name = serializers.CharField(source="agent.name", read_only=True, allow_null=True)
+    workdir = serializers.CharField(source="todo_list.workdir", read_only=True)
+    todo_list_name = serializers.CharField(source="todo_list.name", read_only=True)
+    prompt_preview = serializers.CharField(read_only=True)
+    output_preview = serializers.CharField(read_only=True, allow_null=True)
+    # 全文検索（?q=）の場合のみ
+    search_snippet = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Todo
+        fields = [
+            "id",
+            "todo_list",
+            "workdir",
+            "agent",
+            "agent_name",
+            "todo_list_name",
+            "title",
+            "priority",
+            "prompt_preview",
+            "output_preview",
+            "status",
+            "timeout",
+            "created_at",
+            "updated_at",
+            "branch_name",
+            "validation_status",
+            "started_at",
+            "finished_at",
+            "search_snippet",
+        ]
+        read_only_fields = fields
+
+
+class TodoBulkFilterSerializer(serializers.Serializer):
+    """TodoBulkSerializer の filter（指定したキーのAND）"""
+
+    todo_list = serializers.IntegerField(required=False)
+    workdir = serializers.CharField(required=False)
+    status = serializers.ChoiceField(choices=Todo.Status.choices, required=False)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            unknown = set(data) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError("未知のキーです: {}".format(", ".join(sorted(unknown))))
+        return super().to_internal_value(data)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("filterには todo_list, workdir, status のいずれかを指定してください")
+        return data
+
+
+class TodoBulkSerializer(serializers.Serializer):
+    """POST /api/todos/bulk/ のリクエスト
+
+    対象は ids（Todo IDのリスト）または filter（todo_list, workdir, status）のいずれかで指定する
+    """
+
+    ACTIONS = ["start", "cancel", "set_priority", "set_agent", "delete"]
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = TodoBulkFilterSerializer(required=False)
+    priority = serializers.IntegerField(required=False)
+    agent = serializers.PrimaryKeyRelatedField(queryset=Agent.objects.all(), required=False, allow_null=True)
+
+    def validate(self, data):
+        if ("ids" in data) == ("filter" in data):
+            raise serializers.ValidationError("idsとfilterのいずれか一方を指定してください")
+        if data["action"] == "set_priority" and "priority" not in data:
+            raise serializers.ValidationError({"priority": "set_priorityにはpriorityが必須です"})
+        if data["action"] == "set_agent" and "agent" not in data:
+            raise serializers.ValidationError({"agent": "set_agentにはagentが必須です"})
+        return data
+
+
 class ExtensionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Extension
-        fields = ["id", "name", "type", "cmd", "args", "envs", "timeout", "created_at", "updated_at"]
+        fields = ["id", "name", "type", "cmd", "args", "envs", "timeout", "pooled", "created_at", "updated_at"]
         read_only_fields = ["created_at", "updated_at"]
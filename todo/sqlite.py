@@ -0,0 +1,47 @@
+"""
+SQLiteの接続設定
+
+APIサーバー・task_worker・run_taskの子プロセス・MCPサーバー（stdio）がそれぞれ同じ db.sqlite3 に書き込む。
+SQLiteの既定（journal_mode=DELETE）では書き込み中は読み込みもできず、待ちきれなかった接続が
+"database is locked" になる。接続ごとに次のPRAGMAを設定する（apps.ready で connection_created に接続）。
+
+- journal_mode=WAL: 書き込み中も読み込みができる（設定はDBファイルに保存される）
+- busy_timeout: ロックが解放されるまで待つ時間（ミリ秒）
+- synchronous=NORMAL: WALではコミットごとのfsyncを省いても破損しない（電源断で直近のコミットが失われることはある）
+- mmap_size・cache_size: 読み込みのキャッシュ
+
+値は settings の SQLITE_*（config/settings.py と mcp_server.py の settings.configure）で変更できる。
+ベンチマーク: python manage.py bench_sqlite
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+SYNCHRONOUS = {"off", "normal", "full", "extra"}
+
+
+def pragmas() -> list[str]:
+    """settingsから接続時に実行するPRAGMAを作る"""
+    journal_mode = settings.SQLITE_JOURNAL_MODE.lower()
+    if journal_mode not in JOURNAL_MODES:
+        raise ImproperlyConfigured("SQLITE_JOURNAL_MODE が不正です: {}".format(settings.SQLITE_JOURNAL_MODE))
+    synchronous = settings.SQLITE_SYNCHRONOUS.lower()
+    if synchronous not in SYNCHRONOUS:
+        raise ImproperlyConfigured("SQLITE_SYNCHRONOUS が不正です: {}".format(settings.SQLITE_SYNCHRONOUS))
+    return [
+        "PRAGMA journal_mode = {}".format(journal_mode),
+        "PRAGMA busy_timeout = {:d}".format(settings.SQLITE_BUSY_TIMEOUT),
+        "PRAGMA synchronous = {}".format(synchronous),
+        "PRAGMA mmap_size = {:d}".format(settings.SQLITE_MMAP_SIZE),
+        "PRAGMA cache_size = {:d}".format(settings.SQLITE_CACHE_SIZE),
+    ]
+
+
+def configure_connection(sender, connection, **kwargs):
+    """新しいSQLiteの接続にPRAGMAを設定する"""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma in pragmas():
+            cursor.execute(pragma)
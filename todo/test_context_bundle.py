@@ -0,0 +1,107 @@
+"""Tests for context_bundle module"""
+
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from todo import context_bundle
+from todo.context_bundle import ContentStore, build_context_bundle
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """ref_files用のファイルをコミットしたgitリポジトリ"""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    (repo / "a.py").write_text("print('a')\n")
+    (repo / "b.md").write_text("# B\n```\ncode\n```\n")
+    (repo / "big.txt").write_text("x" * 2000)
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-q", "-m", "init"],
+        cwd=repo,
+        check=True,
+    )
+    return str(repo)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / "store"), max_bytes=10 * 1024 * 1024)
+
+
+class TestBuildContextBundle:
+    """build_context_bundle のユニットテスト"""
+
+    def test_bundle_contents(self, repo, store):
+        """正常系: 参照ファイルの内容がパスごとに添付される"""
+        bundle = build_context_bundle(repo, ["a.py", "b.md"], store, max_file_bytes=1000, max_bundle_bytes=10000)
+
+        assert bundle.paths == ["a.py", "b.md"]
+        assert "### a.py\n```\nprint('a')\n```" in bundle.text
+        # 内容にフェンスが含まれる場合はより長いフェンスを使う
+        assert "### b.md\n````\n# B\n```\ncode\n```\n````" in bundle.text
+
+    def test_skip_large_and_missing(self, repo, store):
+        """正常系: 大きすぎるファイル・HEADにないファイルは含めない"""
+        bundle = build_context_bundle(
+            repo, ["a.py", "big.txt", "missing.py"], store, max_file_bytes=1000, max_bundle_bytes=10000
+        )
+        assert bundle.paths == ["a.py"]
+
+    def test_skip_dirty(self, repo, store):
+        """正常系: 作業ツリーで変更されているファイルは含めない"""
+        with open(os.path.join(repo, "a.py"), "w") as f:
+            f.write("changed\n")
+        bundle = build_context_bundle(repo, ["a.py", "b.md"], store, max_file_bytes=1000, max_bundle_bytes=10000)
+        assert bundle.paths == ["b.md"]
+
+    def test_bundle_budget(self, repo, store):
+        """正常系: バンドル全体の上限を超えるファイルは含めない"""
+        bundle = build_context_bundle(repo, ["a.py", "b.md"], store, max_file_bytes=1000, max_bundle_bytes=15)
+        assert bundle.paths == ["a.py"]
+
+    def test_cache_reused(self, repo, store):
+        """正常系: 2回目はblobを取得し直さずバンドルを再利用する"""
+        first = build_context_bundle(repo, ["a.py", "b.md"], store, max_file_bytes=1000, max_bundle_bytes=10000)
+        with patch.object(context_bundle, "fetch_blobs", wraps=context_bundle.fetch_blobs) as fetch:
+            second = build_context_bundle(
+                repo, ["a.py", "b.md"], store, max_file_bytes=1000, max_bundle_bytes=10000
+            )
+        assert second == first
+        fetch.assert_not_called()
+
+    def test_blob_cache_shared_across_bundles(self, repo, store):
+        """正常系: 異なる組み合わせでも取得済みのblobは再取得しない"""
+        build_context_bundle(repo, ["a.py"], store, max_file_bytes=1000, max_bundle_bytes=10000)
+        with patch.object(context_bundle, "fetch_blobs", wraps=context_bundle.fetch_blobs) as fetch:
+            build_context_bundle(repo, ["a.py", "b.md"], store, max_file_bytes=1000, max_bundle_bytes=10000)
+        assert len(fetch.call_args.args[1]) == 1
+
+
+class TestContentStore:
+    """ContentStore のユニットテスト"""
+
+    def test_put_get(self, store):
+        store.put("abcdef", b"data")
+        assert store.get("abcdef") == b"data"
+        assert store.get("missing") is None
+
+    def test_evict_lru(self, tmp_path):
+        """正常系: 上限を超えたら最終アクセスが古いものから削除する"""
+        store = ContentStore(str(tmp_path / "store"), max_bytes=10)
+        store.put("aa1", b"12345")
+        store.put("aa2", b"12345")
+        os.utime(store.path("aa1"), (1, 1))
+        os.utime(store.path("aa2"), (2, 2))
+        # aa1に触れて最近使ったことにする
+        store.get("aa1")
+        store.put("aa3", b"12345")
+        store.evict()
+
+        assert store.get("aa1") == b"12345"
+        assert store.get("aa2") is None
+        assert store.get("aa3") == b"12345"
@@ -0,0 +1,61 @@
+"""Tests for emoji module"""
+
+from unittest.mock import patch
+
+from todo import emoji as emoji_module
+from todo.emoji import classify_emoji, diff_tokens, select_emoji, tokenize
+
+
+class TestTokenize:
+    """tokenize のユニットテスト"""
+
+    def test_english(self):
+        """英単語は小文字化し、複数形のsを落とす"""
+        assert tokenize("Fixed Tests") == ["fixed", "test"]
+
+    def test_japanese_bigrams(self):
+        """日本語は文字bigramに分割する"""
+        assert tokenize("バグ修正") == ["バグ", "グ修", "修正"]
+
+
+class TestClassifyEmoji:
+    """classify_emoji のユニットテスト"""
+
+    def test_bug(self):
+        result = classify_emoji("ログイン時に例外が発生する不具合を直して")
+        assert result.emoji == ":bug:"
+        assert result.confident
+
+    def test_docs_by_paths(self):
+        """変更ファイルがドキュメントのみならmemo"""
+        result = classify_emoji("手順を追記", paths=["README.md", "docs/setup.md"])
+        assert result.emoji == ":memo:"
+        assert result.confident
+
+    def test_tests_by_paths(self):
+        result = classify_emoji("カバレッジを上げる", paths=["todo/test_views.py"])
+        assert result.emoji == ":white_check_mark:"
+
+    def test_unknown_is_not_confident(self):
+        """手がかりがなければ確信度は低い"""
+        result = classify_emoji("よろしく")
+        assert not result.confident
+
+    def test_deletion_only(self):
+        assert "remove" in diff_tokens(["a.py"], added=0, deleted=10)
+
+
+class TestSelectEmoji:
+    """select_emoji のユニットテスト"""
+
+    def test_confident_skips_llm(self):
+        """確信度が高ければLLMに問い合わせない"""
+        with patch.object(emoji_module, "select_emoji_llm") as llm:
+            assert select_emoji("テストを追加", paths=["todo/test_views.py"]) == ":white_check_mark:"
+        llm.assert_not_called()
+
+    def test_low_confidence_falls_back_to_llm(self):
+        """確信度が低ければLLMに問い合わせる"""
+        with patch.object(emoji_module, "select_emoji_llm", return_value=":tada:") as llm:
+            assert select_emoji("よろしく") == ":tada:"
+        llm.assert_called_once()
@@ -0,0 +1,738 @@
+"""Tests for run_task management command"""
+
+import io
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from todo.management.commands.run_task import Command, read_log_tail
+
+
+@pytest.fixture(autouse=True)
+def cache_roots(settings, tmp_path):
+    """絵文字・コンテキスト・gitのキャッシュをテストごとの一時ディレクトリに置く（~/.cache/mcp-todo に書かない）"""
+    settings.EMOJI_CACHE_ROOT = str(tmp_path / "cache" / "emoji")
+    settings.CONTEXT_STORE_ROOT = str(tmp_path / "cache" / "context")
+    settings.CACHES = {
+        **settings.CACHES,
+        "git": {**settings.CACHES["git"], "LOCATION": str(tmp_path / "cache" / "git")},
+    }
+    return settings
+
+
+@pytest.fixture
+def agent(db):
+    from todo.models import Agent, Extension
+
+    agent = Agent.objects.create(name="test_agent", system_message="system")
+    agent.extensions.add(
+        Extension.objects.create(name="heavy", cmd="heavy-mcp", args=["--stdio"], envs={"A": "1"}, pooled=True),
+        Extension.objects.create(name="light", cmd="light-mcp"),
+    )
+    return agent
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """1コミット済みのgitリポジトリ"""
+    for key in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(key, "t")
+    for key in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(key, "t@example.com")
+    repo = tmp_path / "repo"
+    (repo / "src").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=repo, check=True)
+    (repo / "src" / "a.py").write_text("a = 1\n")
+    (repo / "old.txt").write_text("old\n")
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "init"], cwd=repo, check=True)
+    return repo
+
+
+def git_out(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, capture_output=True, text=True, check=True).stdout
+
+
+@pytest.fixture
+def todo(db, agent):
+    from todo.models import Todo, TodoList
+
+    todo_list = TodoList.objects.create(workdir="/test/workdir")
+    return Todo.objects.create(todo_list=todo_list, agent=agent, title="Task", prompt="do it")
+
+
+class TestBuildExtensions:
+    """build_extensions のユニットテスト"""
+
+    def test_without_pool(self, agent, settings):
+        """プール未設定: Agentのextensionsはstdioで起動する"""
+        settings.EXTENSION_POOL_URL = ""
+        extensions = Command().build_extensions(agent)
+
+        assert extensions[0]["name"] == "developer"
+        assert extensions[1] == {
+            "type": "stdio",
+            "name": "heavy",
+            "cmd": "heavy-mcp",
+            "args": ["--stdio"],
+            "envs": {"A": "1"},
+            "timeout": 300,
+        }
+        assert extensions[2]["type"] == "stdio"
+
+    def test_with_pool(self, agent, settings):
+        """プールが提供しているpooledなExtensionのみプール経由"""
+        settings.EXTENSION_POOL_URL = "http://127.0.0.1:8765/"
+        with patch(
+            "todo.management.commands.run_task.get_pooled_extension_names", return_value={"heavy", "light"}
+        ):
+            extensions = Command().build_extensions(agent)
+
+        assert extensions[1] == {
+            "type": "streamable_http",
+            "name": "heavy",
+            "uri": "http://127.0.0.1:8765/heavy/mcp",
+            "timeout": 300,
+        }
+        # pooled=False のものはプールが提供していてもstdio
+        assert extensions[2]["type"] == "stdio"
+
+    def test_pool_unreachable(self, agent, settings):
+        """プールに到達できない場合はstdioにフォールバック"""
+        settings.EXTENSION_POOL_URL = "http://127.0.0.1:8765"
+        with patch("todo.management.commands.run_task.get_pooled_extension_names", return_value=set()):
+            extensions = Command().build_extensions(agent)
+
+        assert [e["type"] for e in extensions] == ["builtin", "stdio", "stdio"]
+
+    def test_builtin_name_not_duplicated(self, agent, settings):
+        """境界値: builtinと同名のExtension（プール経由を含む）は追加しない"""
+        from todo.models import Extension
+
+        settings.EXTENSION_POOL_URL = "http://127.0.0.1:8765"
+        agent.extensions.add(Extension.objects.create(name="developer", cmd="developer-mcp", pooled=True))
+        with patch(
+            "todo.management.commands.run_task.get_pooled_extension_names", return_value={"developer", "heavy"}
+        ):
+            extensions = Command().build_extensions(agent)
+
+        assert [e["name"] for e in extensions] == ["developer", "heavy", "light"]
+        assert extensions[0]["type"] == "builtin"
+
+    def test_recipe_contains_extensions(self, todo, agent, settings):
+        """レシピにextensionsが含まれる"""
+        settings.EXTENSION_POOL_URL = ""
+        recipe = yaml.safe_load(Command().build_recipe(todo, agent))
+
+        assert [e["name"] for e in recipe["extensions"]] == ["developer", "heavy", "light"]
+
+
+class TestExtensionPoolApp:
+    """ExtensionPool.build_app のルーティングのテスト"""
+
+    def test_unknown_extension(self):
+        """異常系: プールに設定されていないExtension名は404"""
+        from starlette.testclient import TestClient
+
+        from todo.extension_pool import ExtensionPool, PooledExtension
+
+        pool = ExtensionPool([PooledExtension("heavy", "heavy-mcp", [], {}, 300)])
+        client = TestClient(pool.build_app())
+
+        assert client.get("/health").json()["heavy"]["running"] is False
+        res = client.post("/nothing/mcp", json={})
+        assert res.status_code == 404
+        assert res.json() == {"error": "Extensionがありません: nothing"}
+
+
+class TestAgentLogs:
+    """エージェント出力のログファイル処理のユニットテスト"""
+
+    def test_read_log_tail_small(self, tmp_path):
+        """正常系: max_bytes以下ならそのまま返す"""
+        path = tmp_path / "stdout.log"
+        path.write_text("hello\nworld\n")
+        assert read_log_tail(str(path), 100) == "hello\nworld\n"
+
+    def test_read_log_tail_truncated(self, tmp_path):
+        """正常系: 末尾のみ返し、全文のパスを付ける"""
+        path = tmp_path / "stdout.log"
+        path.write_text("a" * 1000 + "END")
+        tail = read_log_tail(str(path), 10)
+        assert tail.endswith("a" * 7 + "END")
+        assert str(path) in tail
+
+    def test_read_log_tail_multibyte_boundary(self, tmp_path):
+        """正常系: 途中で切れたマルチバイト文字は捨てる"""
+        path = tmp_path / "stdout.log"
+        path.write_text("あいう", encoding="utf-8")
+        assert read_log_tail(str(path), 7).endswith("いう")
+
+    def test_follow_logs(self, tmp_path):
+        """正常系: プロセス終了まで追記分を表示し、最後まで読み切る"""
+        stdout_path = tmp_path / "stdout.log"
+        stderr_path = tmp_path / "stderr.log"
+        script = "import sys, time\nprint('out1', flush=True)\ntime.sleep(0.3)\nprint('out2')\nprint('err', file=sys.stderr)"
+        with open(stdout_path, "wb") as out, open(stderr_path, "wb") as err:
+            process = subprocess.Popen([sys.executable, "-c", script], stdout=out, stderr=err)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        Command(stdout=stdout, stderr=stderr).follow_logs(process, str(stdout_path), str(stderr_path), interval=0.05)
+
+        assert stdout.getvalue() == "out1\nout2\n"
+        assert stderr.getvalue() == "err\n"
+
+
+class TestChooseEmoji:
+    """choose_emoji のユニットテスト"""
+
+    def test_cached(self):
+        """正常系: キャッシュ済みならLLMを呼ばずにそのまま使う"""
+        from django.conf import settings
+
+        from todo.context_bundle import ContentStore
+        from todo.emoji import cache_emoji
+
+        cache_emoji("summary", ":bug:", ContentStore(settings.EMOJI_CACHE_ROOT, settings.EMOJI_CACHE_MAX_BYTES))
+        with patch("todo.management.commands.run_task.select_emoji_llm") as select:
+            assert Command().choose_emoji("summary") == (":bug:", False)
+        select.assert_not_called()
+
+    def test_async_placeholder(self, settings, monkeypatch):
+        """正常系: 非同期モードでは仮の絵文字で即座にコミットし、後から差し替える"""
+        settings.EMOJI_ASYNC = True
+        monkeypatch.setenv("OLLAMA_HOST", "http://localhost:11434")
+        monkeypatch.setenv("OLLAMA_MODEL", "model")
+        with patch("todo.management.commands.run_task.select_emoji_llm") as select:
+            assert Command().choose_emoji("summary") == (":robot:", True)
+        select.assert_not_called()
+
+    def test_sync_caches_result(self, settings):
+        """正常系: 同期モードではLLMの結果をキャッシュし、2回目は呼ばない"""
+        settings.EMOJI_ASYNC = False
+        with patch("todo.management.commands.run_task.select_emoji_llm", return_value=":sparkles:") as select:
+            assert Command().choose_emoji("summary") == (":sparkles:", False)
+            assert Command().choose_emoji("summary") == (":sparkles:", False)
+        assert select.call_count == 1
+
+
+class TestCommitChanges:
+    """commit_changes のユニットテスト"""
+
+    @pytest.fixture(autouse=True)
+    def local_emoji(self, settings):
+        settings.EMOJI_ASYNC = False
+        with patch("todo.management.commands.run_task.select_emoji_llm", return_value=":sparkles:"):
+            yield
+
+    def test_commit_all_changes(self, repo, todo):
+        """正常系: 変更・追加・削除がすべてコミットされ、作業ツリーはクリーンになる"""
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "src" / "new.py").write_text("b = 1\n")
+        (repo / "old.txt").unlink()
+
+        Command(stdout=io.StringIO()).commit_changes(str(repo), todo, "done")
+
+        assert git_out(repo, "status", "--porcelain") == ""
+        assert set(git_out(repo, "show", "--name-only", "--format=", "HEAD").split()) == {
+            "old.txt",
+            "src/a.py",
+            "src/new.py",
+        }
+        message = git_out(repo, "log", "-1", "--format=%B")
+        assert message.endswith("Task\n\nTodo ID: {}\nOutput: done\n\n".format(todo.id))
+        # ブランチが進み、reflogにも記録される
+        assert git_out(repo, "rev-parse", "main") == git_out(repo, "rev-parse", "HEAD")
+        assert "commit: " in git_out(repo, "reflog", "-1", "main")
+
+    def test_no_changes(self, repo, todo):
+        """正常系: 変更がなければコミットしない"""
+        head = git_out(repo, "rev-parse", "HEAD")
+        stdout = io.StringIO()
+        Command(stdout=stdout).commit_changes(str(repo), todo, "done")
+
+        assert git_out(repo, "rev-parse", "HEAD") == head
+        assert "コミットする変更がありませんでした" in stdout.getvalue()
+        todo.refresh_from_db()
+        assert todo.output == "done"
+
+    def test_edit_files_only(self, repo, todo):
+        """正常系: edit_files_only ならedit_files配下の変更のみコミットする"""
+        todo.edit_files = ["src"]
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "stray.log").write_text("log\n")
+
+        command = Command(stdout=io.StringIO())
+        command.edit_files_only = True
+        command.commit_changes(str(repo), todo, "done")
+
+        assert git_out(repo, "show", "--name-only", "--format=", "HEAD").split() == ["src/a.py"]
+        assert git_out(repo, "status", "--porcelain") == "?? stray.log\n"
+
+    def test_edit_files_only_ignores_staged(self, repo, todo):
+        """正常系: 範囲外でステージ済みのファイル（エージェントの git add・他のTodoの変更）はコミットしない"""
+        todo.edit_files = ["src/a.py"]
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "src" / "other.py").write_text("other = 1\n")
+        (repo / "old.txt").write_text("changed\n")
+        subprocess.run(["git", "add", "src/other.py", "old.txt", "src/a.py"], cwd=repo, check=True)
+
+        command = Command(stdout=io.StringIO())
+        command.edit_files_only = True
+        command.commit_changes(str(repo), todo, "done")
+
+        assert git_out(repo, "show", "--name-only", "--format=", "HEAD").split() == ["src/a.py"]
+        # 範囲外のステージはそのまま残り、コミットしたパスは差分にならない
+        assert sorted(git_out(repo, "status", "--porcelain").splitlines()) == ["A  src/other.py", "M  old.txt"]
+
+    def move_head_before_update_ref(self, repo, same_tree):
+        """最初のupdate_refの直前にブランチの先頭を書き換える（decorate_commit・他のコミットの代わり）"""
+        from todo import git_utils
+
+        real_update_ref = git_utils.update_ref
+        calls = []
+
+        def update_ref(workdir, ref, new, old=None, reason=""):
+            if not calls:
+                if same_tree:
+                    moved = git_out(repo, "commit-tree", "HEAD^{tree}", "-m", "reworded").strip()
+                else:
+                    moved = git_out(repo, "commit-tree", git_utils.EMPTY_TREE, "-p", "HEAD", "-m", "other").strip()
+                git_out(repo, "update-ref", "refs/heads/main", moved)
+            calls.append(old)
+            return real_update_ref(workdir, ref, new, old, reason)
+
+        return patch("todo.git_utils.update_ref", update_ref), calls
+
+    def test_retry_after_reword(self, repo, todo):
+        """正常系: resolve_headの後に先頭のメッセージだけが書き換えられたら、新しい先頭の上にコミットし直す"""
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        patcher, calls = self.move_head_before_update_ref(repo, same_tree=True)
+        with patcher:
+            Command(stdout=io.StringIO()).commit_changes(str(repo), todo, "done")
+
+        assert len(calls) == 2
+        assert git_out(repo, "log", "-2", "--format=%s").splitlines()[1] == "reworded"
+        assert git_out(repo, "show", "--name-only", "--format=", "HEAD").split() == ["src/a.py"]
+        assert git_out(repo, "status", "--porcelain") == ""
+
+    def test_moved_with_other_changes(self, repo, todo):
+        """異常系: 先頭が別の変更で進んでいたらコミットせずCommandError（他の変更を巻き戻さない）"""
+        from django.core.management.base import CommandError
+
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        patcher, calls = self.move_head_before_update_ref(repo, same_tree=False)
+        with patcher, pytest.raises(CommandError):
+            Command(stdout=io.StringIO(), stderr=io.StringIO()).commit_changes(str(repo), todo, "done")
+
+        assert len(calls) == 1
+        assert git_out(repo, "log", "-1", "--format=%s").strip() == "other"
+        todo.refresh_from_db()
+        assert todo.output == "done"
+
+
+class TestDecorateCommit:
+    """decorate_commit のユニットテスト"""
+
+    @pytest.fixture(autouse=True)
+    def selected_emoji(self):
+        with patch("todo.management.commands.decorate_commit.get_cached_emoji", return_value=":sparkles:"):
+            yield
+
+    def decorate(self, repo, commit, tmp_path):
+        from django.core.management import call_command
+
+        input_file = tmp_path / "summary.txt"
+        input_file.write_text("summary")
+        call_command(
+            "decorate_commit",
+            workdir=str(repo),
+            commit=commit,
+            branch="main",
+            input_file=str(input_file),
+            stdout=io.StringIO(),
+        )
+
+    def placeholder_commit(self, repo):
+        from todo.emoji import PLACEHOLDER
+
+        commit = git_out(repo, "commit-tree", "HEAD^{tree}", "-p", "HEAD", "-m", PLACEHOLDER + " Task").strip()
+        git_out(repo, "update-ref", "refs/heads/main", commit)
+        return commit
+
+    def test_rewrite_tip(self, repo, tmp_path):
+        """正常系: 先頭が対象コミットのままなら絵文字を差し替える"""
+        self.placeholder_commit(repo)
+        self.decorate(repo, git_out(repo, "rev-parse", "HEAD").strip(), tmp_path)
+        assert git_out(repo, "log", "-1", "--format=%s").strip() == ":sparkles: Task"
+
+    def test_waits_for_commit(self, repo, tmp_path):
+        """正常系: コミット中（ロック中）は書き換えを待ち、先に進んだブランチは書き換えずnoteにする"""
+        import threading
+
+        from todo import git_utils
+
+        commit = self.placeholder_commit(repo)
+        with git_utils.branch_lock(str(repo)):
+            thread = threading.Thread(target=self.decorate, args=(repo, commit, tmp_path))
+            thread.start()
+            thread.join(0.5)
+            assert thread.is_alive()
+            next_commit = git_out(repo, "commit-tree", "HEAD^{tree}", "-p", "HEAD", "-m", "next").strip()
+            git_out(repo, "update-ref", "refs/heads/main", next_commit, commit)
+        thread.join()
+
+        assert git_out(repo, "rev-parse", "HEAD").strip() == next_commit
+        assert git_out(repo, "notes", "--ref", "refs/notes/emoji", "show", commit).strip() == ":sparkles:"
+
+
+class TestRunValidation:
+    """run_validation のユニットテスト"""
+
+    @pytest.fixture(autouse=True)
+    def log_root(self, tmp_path, settings):
+        settings.AGENT_LOG_ROOT = str(tmp_path / "logs")
+
+    def run(self, repo, todo, command):
+        todo.validation_command = command
+        Command(stdout=io.StringIO()).run_validation(str(repo), todo)
+
+    def test_passed_and_cached(self, repo, todo, tmp_path):
+        """正常系: 成功を記録し、同じtreeでは再実行しない"""
+        counter = tmp_path / "count"
+        command = "echo ok; echo x >> {}".format(counter)
+        self.run(repo, todo, command)
+        self.run(repo, todo, command)
+
+        todo.refresh_from_db()
+        assert todo.validation_status == "passed"
+        assert todo.validation_output == "ok\n"
+        assert todo.validation_duration is not None
+        assert counter.read_text() == "x\n"
+
+    def test_tree_change_reruns(self, repo, todo, tmp_path):
+        """正常系: treeが変われば再実行する"""
+        counter = tmp_path / "count"
+        command = "echo x >> {}".format(counter)
+        self.run(repo, todo, command)
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        subprocess.run(["git", "commit", "-qam", "change"], cwd=repo, check=True)
+        self.run(repo, todo, command)
+
+        assert counter.read_text() == "x\nx\n"
+
+    def test_failed(self, repo, todo):
+        """異常系: 失敗したらCommandErrorとなり、結果が保存される"""
+        from django.core.management.base import CommandError
+
+        with pytest.raises(CommandError):
+            self.run(repo, todo, "echo ng; exit 1")
+
+        todo.refresh_from_db()
+        assert todo.validation_status == "failed"
+        assert todo.validation_output == "ng\n"
+
+    def test_timeout(self, repo, todo, settings):
+        """異常系: タイムアウトはキャッシュしない"""
+        from django.core.management.base import CommandError
+
+        from todo.models import ValidationResult
+
+        settings.VALIDATION_TIMEOUT = 1
+        with pytest.raises(CommandError):
+            self.run(repo, todo, "sleep 10")
+
+        todo.refresh_from_db()
+        assert todo.validation_status == "timeout"
+        assert not ValidationResult.objects.exists()
+
+
+class TestSnapshot:
+    """スナップショットref（refs/todo/<id>/snapshot）のユニットテスト"""
+
+    def test_create_and_restore(self, repo, todo):
+        """正常系: 変更・追加・削除を保存し、indexとstashに触れずに復元できる"""
+        from todo import git_utils
+
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "src" / "new.py").write_text("b = 1\n")
+        (repo / "old.txt").unlink()
+        index_before = git_out(repo, "diff", "--cached", "--name-only")
+
+        ref = git_utils.snapshot_ref(todo.id)
+        commit = git_utils.create_snapshot(str(repo), ref, "interrupted")
+
+        assert git_out(repo, "rev-parse", ref).strip() == commit
+        assert git_out(repo, "diff", "--cached", "--name-only") == index_before
+        assert git_out(repo, "stash", "list") == ""
+
+        git_utils.discard_changes(str(repo))
+        assert git_out(repo, "status", "--porcelain") == ""
+
+        Command(stdout=io.StringIO()).restore_snapshot(str(repo), todo, commit)
+        assert (repo / "src" / "a.py").read_text() == "a = 2\n"
+        assert (repo / "src" / "new.py").read_text() == "b = 1\n"
+        assert not (repo / "old.txt").exists()
+        # 復元に成功したらrefは削除される
+        assert git_out(repo, "for-each-ref", "refs/todo/") == ""
+
+    def test_no_changes(self, repo, todo):
+        """正常系: 変更がなければスナップショットを作らない"""
+        from todo import git_utils
+
+        assert git_utils.create_snapshot(str(repo), git_utils.snapshot_ref(todo.id), "interrupted") is None
+        assert git_out(repo, "for-each-ref", "refs/todo/") == ""
+
+    def test_create_limited(self, repo, todo):
+        """正常系: limit_toを指定すると範囲外の変更（ステージ済みを含む）を保存しない"""
+        from todo import git_utils
+
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "src" / "new.py").write_text("b = 1\n")
+        (repo / "old.txt").write_text("new\n")
+        subprocess.run(["git", "add", "old.txt"], cwd=repo, check=True)
+
+        ref = git_utils.snapshot_ref(todo.id)
+        commit = git_utils.create_snapshot(str(repo), ref, "interrupted", ["src"])
+
+        assert git_out(repo, "diff", "--name-only", "HEAD", commit).split() == ["src/a.py", "src/new.py"]
+        # 本来のindexは変更しない
+        assert git_out(repo, "diff", "--cached", "--name-only").split() == ["old.txt"]
+        assert git_utils.create_snapshot(str(repo), ref, "interrupted", ["missing.py"]) is None
+
+    def test_gc_snapshots(self, repo, todo):
+        """正常系: Todoから参照されていないrefのみ削除する"""
+        from django.core.management import call_command
+
+        from todo import git_utils
+
+        todo.todo_list.workdir = str(repo)
+        todo.todo_list.save()
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        todo.stash_id = git_utils.create_snapshot(str(repo), git_utils.snapshot_ref(todo.id), "keep")
+        todo.save()
+        (repo / "src" / "a.py").write_text("a = 3\n")
+        git_utils.create_snapshot(str(repo), git_utils.snapshot_ref(todo.id, "workdir"), "stale")
+
+        call_command("gc_snapshots", days=0, stdout=io.StringIO())
+
+        assert git_out(repo, "for-each-ref", "--format=%(refname)", "refs/todo/") == "refs/todo/{}/snapshot\n".format(
+            todo.id
+        )
+
+
+class TestBatch:
+    """一括実行のユニットテスト"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, settings):
+        settings.AGENT_LOG_ROOT = str(tmp_path / "logs")
+        settings.EMOJI_ASYNC = False
+        settings.EXTENSION_POOL_URL = ""
+        with patch("todo.management.commands.run_task.select_emoji_llm", return_value=":sparkles:"):
+            yield
+
+    @pytest.fixture
+    def todos(self, todo):
+        from todo.models import Todo
+
+        todo.edit_files = ["src/a.py"]
+        todo.save()
+        second = Todo.objects.create(
+            todo_list=todo.todo_list, agent=todo.agent, title="Second", prompt="p2", edit_files=["old.txt"]
+        )
+        return [todo, second]
+
+    def fake_agent(self, repo, stdout_text):
+        """作業ツリーを変更し、stdout.logに出力を書くエージェントの代わり"""
+
+        def run_agent(command, worktree_path, recipe_file, agent_quiet, log_dir):
+            (repo / "src" / "a.py").write_text("a = 2\n")
+            (repo / "old.txt").write_text("new\n")
+            with open(log_dir + "/stdout.log", "w") as f:
+                f.write(stdout_text)
+            return stdout_text
+
+        return patch.object(Command, "run_agent", run_agent)
+
+    def run(self, repo, todos):
+        command = Command(stdout=io.StringIO())
+        command.edit_files_only = False
+        command.run_batch(todos, todos[0].agent, str(repo), True)
+        return command.batch_results
+
+    def test_split_batch_output(self, tmp_path):
+        """正常系: 完了マーカーごとに出力を分割し、残りは未完了のTodoに割り当てる"""
+        from todo.management.commands.run_task import split_batch_output
+
+        path = tmp_path / "stdout.log"
+        path.write_text("a1\nTODO-DONE #1\nb1\n`TODO-DONE #2`\nrest\n")
+        outputs, done = split_batch_output(str(path), [1, 2, 3], 1000)
+
+        assert done == {1, 2}
+        assert outputs == {1: "a1\nTODO-DONE #1\n", 2: "b1\n`TODO-DONE #2`\n", 3: "rest\n"}
+
+    def test_commit_per_todo(self, repo, todos):
+        """正常系: edit_filesごとにTodo単位でコミットし、出力もTodoごとに保存する"""
+        stdout_text = "work1\nTODO-DONE #{}\nwork2\nTODO-DONE #{}\n".format(todos[0].id, todos[1].id)
+        with self.fake_agent(repo, stdout_text):
+            results = self.run(repo, todos)
+
+        assert results == {todos[0].id: "", todos[1].id: ""}
+        assert git_out(repo, "show", "--name-only", "--format=", "HEAD~1").split() == ["src/a.py"]
+        assert git_out(repo, "show", "--name-only", "--format=", "HEAD").split() == ["old.txt"]
+        for todo in todos:
+            todo.refresh_from_db()
+        assert todos[0].output == "work1\nTODO-DONE #{}\n".format(todos[0].id)
+        assert todos[1].output.startswith("work2\n")
+
+    def test_missing_marker(self, repo, todos):
+        """異常系: マーカーが出力されなかったTodoは失敗とし、コミットしない"""
+        stdout_text = "work1\nTODO-DONE #{}\n".format(todos[0].id)
+        with self.fake_agent(repo, stdout_text):
+            results = self.run(repo, todos)
+
+        assert results[todos[0].id] == ""
+        assert "完了マーカー" in results[todos[1].id]
+        assert git_out(repo, "show", "--name-only", "--format=", "HEAD").split() == ["src/a.py"]
+        assert git_out(repo, "status", "--porcelain") == " M old.txt\n"
+
+    def test_error_snapshot_per_todo(self, repo, todos):
+        """異常系: 一括実行で失敗したTodoの変更はTodoごとにedit_filesの範囲でスナップショットに保存する"""
+        from todo.management.commands.task_worker import Command as WorkerCommand
+
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "old.txt").write_text("new\n")
+        result = {"returncode": 1, "results": {todos[0].id: "failed 1", todos[1].id: "failed 2"}}
+        WorkerCommand(stdout=io.StringIO()).handle_batch_result(todos, result, str(repo), str(repo))
+
+        for todo in todos:
+            todo.refresh_from_db()
+            assert todo.status == "error"
+            assert todo.finished_at is not None
+        assert git_out(repo, "diff", "--name-only", "HEAD", todos[0].stash_id).split() == ["src/a.py"]
+        assert git_out(repo, "diff", "--name-only", "HEAD", todos[1].stash_id).split() == ["old.txt"]
+        assert todos[0].interrupted_files == [{"status": "M", "path": "src/a.py"}]
+        assert git_out(repo, "status", "--porcelain") == ""
+
+    def test_timeout_batch(self, repo, todos):
+        """異常系: 一括実行がタイムアウトしたら全Todoをtimeoutにし、finished_atとTodoごとのスナップショットを保存する"""
+        from unittest.mock import MagicMock
+
+        from todo.management.commands.task_worker import Command as WorkerCommand
+
+        (repo / "src" / "a.py").write_text("a = 2\n")
+        (repo / "old.txt").write_text("new\n")
+        worker = WorkerCommand(stdout=io.StringIO())
+        worker.running_workdirs = {
+            str(repo): {
+                "process": MagicMock(),
+                "todo": todos[0],
+                "start_time": 0,
+                "parent_conn": MagicMock(),
+                "output_queue": MagicMock(),
+                "stdout_lines": [],
+                "stderr_lines": [],
+                "worktree_path": str(repo),
+                "batch": todos[1:],
+            }
+        }
+        with patch.object(WorkerCommand, "terminate_process"):
+            worker.check_running_processes()
+
+        assert worker.running_workdirs == {}
+        for todo in todos:
+            todo.refresh_from_db()
+            assert todo.status == "timeout"
+            assert todo.finished_at is not None
+            assert "Snapshot saved: refs/todo/{}/snapshot".format(todo.id) in todo.output
+        assert git_out(repo, "diff", "--name-only", "HEAD", todos[0].stash_id).split() == ["src/a.py"]
+        assert git_out(repo, "diff", "--name-only", "HEAD", todos[1].stash_id).split() == ["old.txt"]
+
+    def test_collect_batch(self, todos):
+        """正常系: 同じTodoList・Agent・ブランチのqueuedのTodoを予算内で集める"""
+        from todo.management.commands.task_worker import Command as WorkerCommand
+        from todo.models import Todo
+
+        Todo.objects.filter(pk__in=[t.pk for t in todos]).update(status=Todo.Status.QUEUED)
+        Todo.objects.create(
+            todo_list=todos[0].todo_list, agent=todos[0].agent, prompt="x" * 100, status=Todo.Status.QUEUED
+        )
+        Todo.objects.create(todo_list=todos[0].todo_list, prompt="other agent", status=Todo.Status.QUEUED)
+
+        worker = WorkerCommand()
+        worker.batch_size = 5
+        worker.batch_budget = 50
+        assert worker.collect_batch(todos[0]) == [todos[1]]
+
+        worker.batch_size = 1
+        assert worker.collect_batch(todos[0]) == []
+
+
+class TestRunners:
+    """AgentRunner のユニットテスト"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, settings):
+        settings.AGENT_LOG_ROOT = str(tmp_path / "logs")
+        settings.EXTENSION_POOL_URL = ""
+
+    def run_fake(self, repo, todo, options):
+        from todo.runners import get_runner
+
+        command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        command.runner = get_runner("fake", options)
+        recipe = repo.parent / "recipe.yaml"
+        recipe.write_text(command.build_recipe(todo, todo.agent, str(repo)))
+        return command.run_agent(str(repo), str(recipe), True, command.get_log_dir(todo))
+
+    def test_unknown_runner(self):
+        from todo.runners import get_runner
+
+        with pytest.raises(ValueError):
+            get_runner("unknown")
+        assert get_runner("").name == "goose"
+
+    def test_goose_command(self):
+        from todo.runners import get_runner
+
+        runner = get_runner("goose", {"temperature": 0.1})
+        assert runner.build_command("r.yaml", True) == ["goose", "run", "--recipe", "r.yaml", "-q"]
+        assert runner.build_env()["GOOSE_TEMPERATURE"] == "0.1"
+
+    def test_fake_edits_edit_files(self, repo, todo):
+        """正常系: fakeは編集対象ファイルを編集し、指定行数を出力する"""
+        todo.edit_files = ["src/a.py"]
+        output = self.run_fake(repo, todo, {"output_lines": 3, "line_bytes": 4})
+
+        assert output == "xxx\nxxx\nxxx\n"
+        assert git_out(repo, "status", "--porcelain") == " M src/a.py\n"
+
+    def test_fake_is_deterministic(self, repo, todo):
+        """正常系: 同じレシピなら同じ編集内容になる"""
+        self.run_fake(repo, todo, {"output_lines": 0})
+        first = (repo / "fake" / "task.txt").read_text()
+        (repo / "fake" / "task.txt").unlink()
+        self.run_fake(repo, todo, {"output_lines": 0})
+
+        assert (repo / "fake" / "task.txt").read_text() == first
+
+    def test_fake_failure(self, repo, todo):
+        """異常系: fail_rate=1なら失敗する"""
+        from django.core.management.base import CommandError
+
+        with pytest.raises(CommandError):
+            self.run_fake(repo, todo, {"fail_rate": 1})
+
+    def test_seed_fake_todos(self, repo, db):
+        from django.core.management import call_command
+
+        from todo.models import Agent, Todo
+
+        call_command("seed_fake_todos", workdir=str(repo), count=30, files=5, stdout=io.StringIO())
+
+        assert Agent.objects.get(name="fake").runner == "fake"
+        assert Todo.objects.filter(status=Todo.Status.QUEUED, agent__name="fake").count() == 30
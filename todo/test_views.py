@@ -0,0 +1,1206 @@
+"""Tests for todo views"""
+
+import asyncio
+import subprocess
+import time
+from unittest.mock import patch
+
+import pytest
+
+from todo import async_views
+
+
+def get_branch_statuses(workdir):
+    return asyncio.run(async_views.get_branch_statuses(workdir))
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """1コミット済みのgitリポジトリ"""
+    for key in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(key, "t")
+    for key in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(key, "t@example.com")
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=repo, check=True)
+    (repo / "a.txt").write_text("a\n")
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "init"], cwd=repo, check=True)
+    return repo
+
+
+@pytest.fixture(autouse=True)
+def git_cache_settings(settings):
+    """gitキャッシュをテストごとに空のメモリキャッシュにする"""
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "git": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "git-test"},
+    }
+    from django.core.cache import caches
+
+    caches["git"].clear()
+    return settings
+
+
+@pytest.fixture(autouse=True)
+def events_path(settings, tmp_path):
+    """ステータス変更の通知をテストごとの一時ファイルに書く"""
+    settings.TODO_EVENTS_PATH = str(tmp_path / "events" / "events.jsonl")
+    settings.TODO_EVENTS_POLL_INTERVAL = 0.01
+    return settings.TODO_EVENTS_PATH
+
+
+def run_git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, capture_output=True, check=True)
+
+
+class TestGetBranchStatuses:
+    """get_branch_statuses のユニットテスト"""
+
+    def test_can_delete(self, repo, tmp_path):
+        """正常系: マージ済みかつ未チェックアウトのブランチのみ削除可能"""
+        run_git(repo, "branch", "merged")
+        run_git(repo, "checkout", "-q", "-b", "unmerged")
+        (repo / "b.txt").write_text("b\n")
+        run_git(repo, "add", "b.txt")
+        run_git(repo, "commit", "-q", "-m", "b")
+        run_git(repo, "checkout", "-q", "main")
+        run_git(repo, "worktree", "add", "-q", "-b", "in-worktree", str(tmp_path / "wt"))
+
+        assert get_branch_statuses(str(repo)) == [
+            {"name": "in-worktree", "can_delete": False},
+            {"name": "main", "can_delete": False},
+            {"name": "merged", "can_delete": True},
+            {"name": "unmerged", "can_delete": False},
+        ]
+
+    def test_constant_git_calls(self, repo):
+        """正常系: ブランチ数によらずgitの実行回数は一定"""
+        for i in range(20):
+            run_git(repo, "branch", "ai/{}".format(i))
+
+        with patch("todo.async_views.asyncio.create_subprocess_exec", wraps=asyncio.create_subprocess_exec) as run:
+            branches = get_branch_statuses(str(repo))
+
+        assert len(branches) == 21
+        assert all(b["can_delete"] for b in branches if b["name"] != "main")
+        assert run.call_count == 2
+
+    def test_unborn_head(self, tmp_path):
+        """境界値: コミット前のリポジトリではブランチなし"""
+        subprocess.run(["git", "init", "-q", "-b", "main"], cwd=tmp_path, check=True)
+        assert get_branch_statuses(str(tmp_path)) == []
+
+    def test_not_repository(self, tmp_path):
+        """異常系: gitリポジトリでなければ空リスト"""
+        assert get_branch_statuses(str(tmp_path)) == []
+
+
+class TestGitCache:
+    """git_cache のユニットテスト"""
+
+    def test_hit_without_git(self, repo):
+        """正常系: refが変わらなければgitを起動しない"""
+        assert asyncio.run(async_views.get_git_branches(str(repo))) == ["main"]
+        with patch("todo.async_views.asyncio.create_subprocess_exec") as run:
+            assert asyncio.run(async_views.get_git_branches(str(repo))) == ["main"]
+        run.assert_not_called()
+
+    def test_invalidated_by_ref_change(self, repo, tmp_path):
+        """正常系: ブランチ・worktreeの追加で無効になる"""
+        def get_git_worktrees(workdir):
+            return asyncio.run(async_views.get_git_worktrees(workdir))
+
+        assert [b["name"] for b in get_branch_statuses(str(repo))] == ["main"]
+        run_git(repo, "branch", "feature/x")
+        assert [b["name"] for b in get_branch_statuses(str(repo))] == ["feature/x", "main"]
+        run_git(repo, "branch", "-D", "feature/x")
+        assert [b["name"] for b in get_branch_statuses(str(repo))] == ["main"]
+
+        assert len(get_git_worktrees(str(repo))) == 1
+        run_git(repo, "worktree", "add", "-q", "-b", "wt", str(tmp_path / "wt"))
+        assert len(get_git_worktrees(str(repo))) == 2
+        # worktree側から見ても同じ共通ディレクトリの指紋を使う
+        assert len(get_git_worktrees(str(tmp_path / "wt"))) == 2
+
+    def test_invalidated_by_nested_branch(self, repo):
+        """正常系: 既存の階層の下に深いブランチ（run_taskの "ai/<日付>/<時刻>/<id>"）を追加すると無効になる"""
+        from todo.git_cache import fingerprint
+
+        run_git(repo, "branch", "ai/2026-10-19/11-00-00/0001")
+        assert [b["name"] for b in get_branch_statuses(str(repo))] == ["ai/2026-10-19/11-00-00/0001", "main"]
+        paths = [path for path, _ in fingerprint(str(repo))]
+        assert str(repo / ".git" / "refs" / "heads" / "ai" / "2026-10-19" / "11-00-00") in paths
+
+        time.sleep(0.01)
+        run_git(repo, "branch", "ai/2026-10-19/12-00-00/abcd")
+        assert [b["name"] for b in get_branch_statuses(str(repo))] == [
+            "ai/2026-10-19/11-00-00/0001",
+            "ai/2026-10-19/12-00-00/abcd",
+            "main",
+        ]
+        time.sleep(0.01)
+        run_git(repo, "branch", "ai/2026-10-19/11-00-00/0002")
+        assert len(get_branch_statuses(str(repo))) == 4
+
+    def test_find_git_dirs_worktree(self, repo, tmp_path):
+        """正常系: worktreeでは .git ファイルから共通ディレクトリを求める"""
+        from todo.git_cache import find_git_dirs
+
+        run_git(repo, "worktree", "add", "-q", "-b", "wt", str(tmp_path / "wt"))
+        git_dir, common_dir = find_git_dirs(str(tmp_path / "wt"))
+        assert common_dir == str(repo / ".git")
+        assert git_dir == str(repo / ".git" / "worktrees" / "wt")
+        assert find_git_dirs(str(repo / "sub")) == (str(repo / ".git"), str(repo / ".git"))
+
+    def test_not_repository(self, tmp_path):
+        """異常系: gitリポジトリでなければキャッシュせずに元の関数を実行"""
+        with pytest.raises(ValueError):
+            asyncio.run(async_views.check_git_repository(str(tmp_path)))
+
+
+@pytest.fixture
+def todolist(db, repo):
+    from todo.models import TodoList
+
+    return TodoList.objects.create(workdir=str(repo))
+
+
+class TestAsyncGitViews:
+    """gitを実行するAPI（async_views、ルーターより前に登録された非同期ビュー）のテスト"""
+
+    def test_branches(self, client, todolist, repo):
+        """正常系: ブランチ・worktree一覧"""
+        run_git(repo, "branch", "merged")
+        res = client.get("/api/todolists/{}/branches/".format(todolist.pk))
+        assert res.status_code == 200
+        assert res.json() == {
+            "branches": [{"name": "main", "can_delete": False}, {"name": "merged", "can_delete": True}]
+        }
+
+        res = client.get("/api/todolists/{}/worktrees/".format(todolist.pk))
+        assert res.json() == {"workdir": str(repo), "worktrees": [{"path": str(repo), "branch": "main"}]}
+
+    def test_create_branch(self, client, todolist, repo):
+        """正常系: ブランチを作成し、既存の名前はエラー"""
+        url = "/api/todolists/{}/create_branch/".format(todolist.pk)
+        res = client.post(url, {"new_branch_name": "feature", "base_branch": "main"}, content_type="application/json")
+        assert res.status_code == 200
+        assert "feature" in subprocess.run(["git", "branch"], cwd=repo, capture_output=True, text=True).stdout
+
+        res = client.post(url, {"new_branch_name": "feature", "base_branch": "main"}, content_type="application/json")
+        assert res.status_code == 400
+        assert "既に存在します" in res.json()["error"]
+
+    def test_todo_create_branch(self, client, todolist, repo):
+        """正常系: Todoのbranch_nameを作成したブランチに更新"""
+        from todo.models import Todo
+
+        todo = Todo.objects.create(todo_list=todolist, title="t", prompt="p")
+        res = client.post(
+            "/api/todos/{}/create_branch/".format(todo.pk), {"new_branch_name": "fix"}, content_type="application/json"
+        )
+        assert res.status_code == 200
+        todo.refresh_from_db()
+        assert todo.branch_name == "fix"
+        assert client.get("/api/todos/{}/branches/".format(todo.pk)).json() == {"branches": ["fix", "main"]}
+
+    def test_add_and_remove_worktree(self, client, todolist, repo, settings, tmp_path):
+        """正常系: ブランチがなければ作成してworktreeを追加し、削除はボディなしの200"""
+        settings.WORKTREE_ROOT = str(tmp_path / "worktrees")
+        res = client.post(
+            "/api/todolists/{}/worktrees/add/".format(todolist.pk),
+            {"name": "wt1", "branch": "feature"},
+            content_type="application/json",
+        )
+        assert res.status_code == 200
+        assert res.json()["branch_created"] is True
+        assert (tmp_path / "worktrees" / "wt1").exists()
+
+        res = client.delete("/api/todolists/{}/worktrees/wt1/".format(todolist.pk))
+        assert res.status_code == 200
+        assert res.content == b""
+        assert not (tmp_path / "worktrees" / "wt1").exists()
+
+    def test_invalid_names(self, client, todolist):
+        """異常系: ブランチ名・worktree名の検証（同じ規則・同じメッセージ）"""
+        url = "/api/todolists/{}/create_branch/".format(todolist.pk)
+        res = client.post(url, {"new_branch_name": "a b", "base_branch": "main"}, content_type="application/json")
+        assert res.json() == {"error": "new_branch_nameは英数字、ハイフン、アンダースコアのみ使用できます"}
+        res = client.post(url, {"base_branch": "main"}, content_type="application/json")
+        assert res.json() == {"error": "new_branch_nameは必須です"}
+
+        url = "/api/todolists/{}/worktrees/add/".format(todolist.pk)
+        res = client.post(url, {"name": "a/b", "branch": "x"}, content_type="application/json")
+        assert res.json() == {"error": "nameに / を含めることはできません"}
+        res = client.post(url, {"name": "a.b", "branch": "x"}, content_type="application/json")
+        assert res.status_code == 400
+        assert res.json() == {"error": "nameは英数字、ハイフン、アンダースコアのみ使用できます"}
+
+    def test_errors(self, client, todolist, settings, tmp_path):
+        """異常系: 存在しないTodoList・worktree・不正なメソッド"""
+        settings.WORKTREE_ROOT = str(tmp_path / "worktrees")
+        assert client.get("/api/todolists/999999/branches/").status_code == 404
+        assert client.delete("/api/todolists/{}/worktrees/nothing/".format(todolist.pk)).status_code == 404
+        assert client.post("/api/todolists/{}/branches/".format(todolist.pk)).status_code == 405
+
+
+class TestRunGit:
+    """async_views.run_git のユニットテスト"""
+
+    def test_output(self, repo):
+        """正常系: 終了コードと出力を返す"""
+        from todo.async_views import run_git as async_run_git
+
+        returncode, stdout, _ = asyncio.run(async_run_git(str(repo), "rev-parse", "--abbrev-ref", "HEAD"))
+        assert (returncode, stdout.strip()) == (0, "main")
+
+    def test_timeout_kills(self, repo):
+        """異常系: タイムアウトしたらプロセスを止めてTimeoutExpired"""
+        from todo.async_views import run_git as async_run_git
+
+        start = time.monotonic()
+        with pytest.raises(subprocess.TimeoutExpired):
+            asyncio.run(async_run_git(str(repo), "-c", "alias.slow=!sleep 5", "slow", timeout=0.2))
+        assert time.monotonic() - start < 3
+
+    def test_cancel_kills(self, repo):
+        """異常系: キャンセル（クライアント切断）されたらプロセスを止める"""
+        from todo.async_views import run_git as async_run_git
+
+        async def main():
+            task = asyncio.create_task(async_run_git(str(repo), "-c", "alias.slow=!sleep 5", "slow"))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(main())
+        assert time.monotonic() - start < 3
+
+    def test_semaphore_per_repository(self, repo, tmp_path):
+        """正常系: worktreeは元のリポジトリと同じSemaphoreを使う"""
+        from todo.async_views import _repo_semaphore
+
+        run_git(repo, "worktree", "add", "-q", "-b", "wt", str(tmp_path / "wt"))
+        other = tmp_path / "other"
+        other.mkdir()
+        subprocess.run(["git", "init", "-q"], cwd=other, check=True)
+
+        async def main():
+            assert _repo_semaphore(str(repo)) is _repo_semaphore(str(tmp_path / "wt"))
+            assert _repo_semaphore(str(repo)) is not _repo_semaphore(str(other))
+
+        asyncio.run(main())
+
+
+class TestTodoList:
+    """GET /api/todos/ のテスト"""
+
+    @pytest.fixture
+    def todos(self, db):
+        from todo.models import Agent, Todo, TodoList
+
+        todos = []
+        for i in range(3):
+            todo_list = TodoList.objects.create(workdir="/work/{}".format(i), name="list{}".format(i))
+            agent = Agent.objects.create(name="agent{}".format(i))
+            todos.append(
+                Todo.objects.create(
+                    todo_list=todo_list, agent=agent, title="t{}".format(i), prompt="p" * 1000, output="o" * 1000
+                )
+            )
+        return todos
+
+    def test_constant_queries(self, client, todos, django_assert_num_queries):
+        """正常系: 件数によらずクエリ数は一定（ETag用のバージョン + 一覧）"""
+        with django_assert_num_queries(2):
+            res = client.get("/api/todos/")
+        item = res.json()["results"][0]
+        assert item["agent_name"].startswith("agent")
+        assert item["workdir"].startswith("/work/")
+        assert len(item["prompt_preview"]) == 200
+        assert len(item["output_preview"]) == 200
+        assert "prompt" not in item and "context" not in item
+
+    def test_fields(self, client, todos):
+        """正常系: ?fields= で出力するフィールドを絞り込む"""
+        res = client.get("/api/todos/?fields=id,title,status")
+        assert set(res.json()["results"][0]) == {"id", "title", "status"}
+
+        res = client.get("/api/todos/{}/?fields=id,prompt".format(todos[0].pk))
+        assert res.json() == {"id": todos[0].pk, "prompt": "p" * 1000}
+
+    def test_unknown_fields(self, client, todos):
+        """異常系: 未知のフィールド名は400"""
+        res = client.get("/api/todos/?fields=id,nothing")
+        assert res.status_code == 400
+
+    def test_todo_list_filter(self, client, todos):
+        """正常系: ?todo_list= でフィルタ"""
+        res = client.get("/api/todos/?todo_list={}".format(todos[1].todo_list_id))
+        assert [t["id"] for t in res.json()["results"]] == [todos[1].pk]
+
+
+class TestKeysetPagination:
+    """キーセットページネーション（todo.pagination）のテスト"""
+
+    @pytest.fixture
+    def many_todos(self, db):
+        from django.utils import timezone
+
+        from todo.models import Todo, TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work")
+        now = timezone.now()
+        todos = Todo.objects.bulk_create(
+            [Todo(todo_list=todo_list, title="t{}".format(i), prompt="p") for i in range(7)]
+        )
+        # 同じ updated_at の行を含めても取りこぼさない
+        for i, todo in enumerate(todos):
+            Todo.objects.filter(pk=todo.pk).update(updated_at=now - timezone.timedelta(minutes=i // 2))
+        return todos
+
+    def collect(self, client, url):
+        ids = []
+        pages = 0
+        while url:
+            res = client.get(url).json()
+            ids += [t["id"] for t in res["results"]]
+            url = res["next"]
+            pages += 1
+        return ids, pages
+
+    def test_follow_next(self, client, many_todos):
+        """正常系: nextをたどると全件を重複なく順に取得できる"""
+        from todo.models import Todo
+
+        ids, pages = self.collect(client, "/api/todos/?limit=3&order_by=-updated_at")
+        expected = list(Todo.objects.order_by("-updated_at", "-id").values_list("id", flat=True))
+        assert ids == expected
+        assert pages == 3
+
+        ids, _ = self.collect(client, "/api/todos/?limit=2")
+        assert ids == sorted(t.pk for t in many_todos)
+
+    def test_previous(self, client, many_todos):
+        """正常系: previousで前のページに戻る"""
+        first = client.get("/api/todos/?limit=3&order_by=created_at").json()
+        assert first["previous"] is None
+        second = client.get(first["next"]).json()
+        back = client.get(second["previous"]).json()
+        assert [t["id"] for t in back["results"]] == [t["id"] for t in first["results"]]
+        assert back["previous"] is None
+
+    def test_count_and_queries(self, client, many_todos, django_assert_num_queries):
+        """正常系: 総件数は ?count=1 の場合のみ数え、キャッシュする"""
+        from django.core.cache import cache
+
+        cache.clear()
+        # ETag用のバージョン + 一覧
+        with django_assert_num_queries(2):
+            res = client.get("/api/todos/?limit=3").json()
+        assert "count" not in res
+        assert client.get("/api/todos/?limit=3&count=1").json()["count"] == 7
+        with django_assert_num_queries(2):
+            assert client.get("/api/todos/?limit=3&count=1").json()["count"] == 7
+
+    def test_offset_compatible(self, client, many_todos):
+        """正常系: offset指定時は従来のlimit/offset方式"""
+        res = client.get("/api/todos/?limit=3&offset=3").json()
+        assert res["count"] == 7
+        assert [t["id"] for t in res["results"]] == sorted(t.pk for t in many_todos)[3:6]
+
+    def test_invalid_cursor(self, client, many_todos):
+        """異常系: 不正なカーソルは400"""
+        assert client.get("/api/todos/?cursor=broken").status_code == 400
+
+
+class TestConditionalGet:
+    """ETag / Last-Modified / 304 のテスト"""
+
+    @pytest.fixture
+    def todo(self, db):
+        from todo.models import Agent, Todo, TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work", name="w")
+        return Todo.objects.create(
+            todo_list=todo_list, agent=Agent.objects.create(name="a"), title="t", prompt="p"
+        )
+
+    def test_detail_not_modified(self, client, todo, django_assert_num_queries):
+        """正常系: If-None-Matchが一致すれば304（シリアライザを実行しない）"""
+        res = client.get("/api/todos/{}/".format(todo.pk))
+        etag = res.headers["ETag"]
+        assert res.headers["Last-Modified"]
+        assert res.headers["Cache-Control"] == "no-cache"
+
+        with django_assert_num_queries(1):
+            res = client.get("/api/todos/{}/".format(todo.pk), HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 304
+        assert res.headers["ETag"] == etag
+
+    def test_detail_changed(self, client, todo):
+        """正常系: Todo・関連するAgentが更新されればETagが変わる"""
+        url = "/api/todos/{}/".format(todo.pk)
+        etag = client.get(url).headers["ETag"]
+
+        todo.agent.name = "renamed"
+        todo.agent.save()
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["agent_name"] == "renamed"
+        assert res.headers["ETag"] != etag
+
+        # ?fields= で表現が変わればETagも別
+        assert client.get(url + "?fields=id").headers["ETag"] != res.headers["ETag"]
+
+    def test_restart_after_finish(self, client, todo, settings):
+        """正常系: 完了済みのTodoもno-cacheで、再開（start）すると再検証で新しい内容を返す"""
+        from todo.models import Todo
+
+        settings.TODO_ARCHIVED_MAX_AGE = 1234
+        todo.status = Todo.Status.COMPLETED
+        todo.save()
+        url = "/api/todos/{}/".format(todo.pk)
+        res = client.get(url)
+        assert res.headers["Cache-Control"] == "no-cache"
+        etag = res.headers["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        assert client.post(url + "start/").status_code == 200
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["status"] == "queued"
+        assert res.headers["ETag"] != etag
+
+    @pytest.mark.django_db(transaction=True)
+    def test_version_triggers_after_rebuild(self):
+        """異常系: テーブルを作り直すマイグレーションで消えたトリガーをpost_migrateで作り直す"""
+        from django.core.management.sql import emit_post_migrate_signal
+        from django.db import connection
+
+        from todo.models import CollectionVersion, Todo, TodoList
+
+        def version():
+            return CollectionVersion.objects.get(name="todo").version
+
+        old_field = Todo._meta.get_field("title")
+        new_field = Todo._meta.get_field("title").clone()
+        new_field.set_attributes_from_name("title")
+        new_field.max_length = 300
+        try:
+            with connection.schema_editor() as editor:
+                editor.alter_field(Todo, old_field, new_field)
+            todo_list = TodoList.objects.create(workdir="/work")
+            before = version()
+            Todo.objects.create(todo_list=todo_list, prompt="p")
+            assert version() == before
+
+            emit_post_migrate_signal(0, False, "default")
+            after = version()
+            assert after > before
+            Todo.objects.filter(todo_list=todo_list).update(prompt="q")
+            assert version() == after + 1
+        finally:
+            with connection.schema_editor() as editor:
+                editor.alter_field(Todo, new_field, old_field)
+            emit_post_migrate_signal(0, False, "default")
+
+    def test_list_version(self, client, todo):
+        """正常系: 一覧はテーブルの更新（QuerySet.update・削除を含む）でETagが変わる"""
+        from todo.models import Todo
+
+        etag = client.get("/api/todos/").headers["ETag"]
+        assert client.get("/api/todos/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        Todo.objects.filter(pk=todo.pk).update(priority=5)
+        res = client.get("/api/todos/", HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        etag = res.headers["ETag"]
+
+        Todo.objects.filter(pk=todo.pk).delete()
+        assert client.get("/api/todos/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_todolist(self, client, todo):
+        """正常系: TodoListの詳細・一覧も条件付きGETに対応"""
+        url = "/api/todolists/{}/".format(todo.todo_list_id)
+        etag = client.get(url).headers["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        etag = client.get("/api/todolists/").headers["ETag"]
+        assert client.get("/api/todolists/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+class TestBulk:
+    """POST /api/todos/bulk/ のテスト"""
+
+    @pytest.fixture
+    def todos(self, db):
+        from todo.models import Todo, TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work")
+        other = TodoList.objects.create(workdir="/other")
+        statuses = ["waiting", "queued", "running", "completed"]
+        todos = [Todo.objects.create(todo_list=todo_list, prompt="p", status=s) for s in statuses]
+        todos.append(Todo.objects.create(todo_list=other, prompt="p", status="waiting"))
+        return todos
+
+    def post(self, client, data):
+        return client.post("/api/todos/bulk/", data, content_type="application/json")
+
+    def test_cancel(self, client, todos, django_assert_max_num_queries):
+        """正常系: cancelと同じ遷移（queued→waiting、それ以外→cancelled）を1往復で行う"""
+        from todo.models import Todo
+
+        ids = [t.pk for t in todos[:4]]
+        with django_assert_max_num_queries(6):
+            res = self.post(client, {"action": "cancel", "ids": ids + [999999]})
+        assert res.status_code == 200
+        body = res.json()
+        assert body["count"] == 4
+        assert [r.get("status") for r in body["results"]] == ["cancelled", "waiting", "cancelled", "cancelled", None]
+        assert body["results"][-1]["ok"] is False
+        assert dict(Todo.objects.filter(pk__in=ids).values_list("id", "status")) == {
+            r["id"]: r["status"] for r in body["results"][:4]
+        }
+
+    def test_filter(self, client, todos):
+        """正常系: filterで対象を指定してstart・set_priority"""
+        from todo.models import Todo
+
+        res = self.post(client, {"action": "start", "filter": {"workdir": "/work", "status": "waiting"}})
+        assert [r["id"] for r in res.json()["results"]] == [todos[0].pk]
+        assert Todo.objects.get(pk=todos[0].pk).status == "queued"
+        assert Todo.objects.get(pk=todos[4].pk).status == "waiting"
+
+        res = self.post(client, {"action": "set_priority", "priority": 7, "filter": {"workdir": "/work"}})
+        assert res.json()["count"] == 4
+        assert set(Todo.objects.filter(todo_list=todos[0].todo_list).values_list("priority", flat=True)) == {7}
+
+    def test_set_agent_and_delete(self, client, todos):
+        """正常系: set_agent・delete"""
+        from todo.models import Agent, Todo
+
+        agent = Agent.objects.create(name="a")
+        self.post(client, {"action": "set_agent", "agent": agent.pk, "ids": [todos[0].pk]})
+        assert Todo.objects.get(pk=todos[0].pk).agent == agent
+
+        res = self.post(client, {"action": "delete", "ids": [todos[0].pk, todos[1].pk]})
+        assert res.json()["count"] == 2
+        assert not Todo.objects.filter(pk__in=[todos[0].pk, todos[1].pk]).exists()
+
+        # TodoListを結合するfilterでも削除できる
+        res = self.post(client, {"action": "delete", "filter": {"workdir": "/other"}})
+        assert res.json()["count"] == 1
+        assert not Todo.objects.filter(pk=todos[4].pk).exists()
+        assert Todo.objects.count() == 2
+
+    def test_delete_search_index(self, client, todos):
+        """正常系: deleteで全文検索の索引からも消える"""
+        from django.db import connection
+
+        from todo.models import Todo
+        from todo.search import search_todos
+
+        Todo.objects.filter(pk__in=[todos[0].pk, todos[1].pk]).update(prompt="ログイン処理の修正")
+        assert search_todos(Todo.objects.all(), "ログイン").count() == 2
+
+        self.post(client, {"action": "delete", "ids": [todos[0].pk, todos[1].pk]})
+        assert not search_todos(Todo.objects.all(), "ログイン").exists()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid FROM todo_todo_fts WHERE rowid IN (%s, %s)", [todos[0].pk, todos[1].pk]
+            )
+            assert cursor.fetchall() == []
+
+    def test_delete_publishes_once(
+        self, client, todos, events_path, django_capture_on_commit_callbacks, django_assert_max_num_queries
+    ):
+        """正常系: deleteは件数によらず一定回数のクエリ（対象のSELECTとDELETE）で消し、Todoごとに1回だけ "deleted" を通知する"""
+        import json
+
+        ids = [t.pk for t in todos[:3]]
+        with django_capture_on_commit_callbacks(execute=True), django_assert_max_num_queries(5):
+            self.post(client, {"action": "delete", "ids": ids})
+        with open(events_path) as f:
+            published = [json.loads(line) for line in f]
+        assert [(e["id"], e["status"]) for e in published] == [(pk, "deleted") for pk in ids]
+
+    def test_invalid(self, client, todos):
+        """異常系: idsとfilterの両方・未指定、値の不足、未知のfilterキーは400"""
+        assert self.post(client, {"action": "start"}).status_code == 400
+        assert self.post(client, {"action": "start", "ids": [1], "filter": {"status": "waiting"}}).status_code == 400
+        assert self.post(client, {"action": "set_priority", "ids": [1]}).status_code == 400
+        assert self.post(client, {"action": "start", "filter": {"title": "x"}}).status_code == 400
+        assert self.post(client, {"action": "start", "filter": {}}).status_code == 400
+        assert self.post(client, {"action": "start", "filter": {"todo_list": "abc"}}).status_code == 400
+        assert self.post(client, {"action": "start", "filter": {"status": "unknown"}}).status_code == 400
+        assert self.post(client, {"action": "start", "filter": {"workdir": ["/work"]}}).status_code == 400
+        assert self.post(client, {"action": "archive", "ids": [1]}).status_code == 400
+
+
+class TestDashboard:
+    """GET /api/dashboard/ のテスト"""
+
+    @pytest.fixture
+    def todos(self, db):
+        from django.core.cache import cache
+        from django.utils import timezone
+
+        from todo.models import Todo, TodoList
+
+        cache.clear()
+        work = TodoList.objects.create(workdir="/work", name="work")
+        other = TodoList.objects.create(workdir="/other")
+        finished_at = timezone.now()
+        for s in ["waiting", "queued", "queued", "running", "completed"]:
+            Todo.objects.create(
+                todo_list=work, prompt="p", status=s, finished_at=finished_at if s == "completed" else None
+            )
+        Todo.objects.create(todo_list=other, prompt="p", status="running")
+        return work, other, finished_at
+
+    def test_counts(self, client, todos, django_assert_num_queries):
+        """正常系: TodoListごとのステータス別件数を1クエリで集計し、2回目はキャッシュを使う"""
+        work, other, finished_at = todos
+        # バージョン + 集計
+        with django_assert_num_queries(2):
+            body = client.get("/api/dashboard/").json()
+        with django_assert_num_queries(1):
+            cached = client.get("/api/dashboard/").json()
+        assert cached["generated_at"] == body["generated_at"]
+
+        first, second = body["todo_lists"]
+        assert first["id"] == work.pk and first["name"] == "work"
+        assert first["counts"]["queued"] == 2 and first["counts"]["cancelled"] == 0
+        assert first["total"] == 5 and first["running"] == 1
+        assert first["oldest_queued_age"] >= 0
+        assert first["last_completed_at"] is not None
+        assert second["id"] == other.pk and second["oldest_queued_at"] is None
+        assert body["totals"]["running"] == 2 and body["totals"]["total"] == 6
+
+    def test_oldest_queued_at(self, client, todos):
+        """正常系: 待ち時間はqueuedになった時刻から数え、queuedのままの編集では変わらない"""
+        import datetime
+
+        from django.utils import timezone
+
+        from todo.models import Todo
+
+        work, _, _ = todos
+        queued_at = timezone.now() - datetime.timedelta(hours=1)
+        oldest = Todo.objects.filter(todo_list=work, status="queued").first()
+        Todo.objects.filter(pk=oldest.pk).update(queued_at=queued_at)
+
+        # queuedのままの編集（updated_at が新しくなる）・一括のstartでは queued_at は変わらない
+        res = client.patch("/api/todos/{}/".format(oldest.pk), {"priority": 3}, content_type="application/json")
+        assert res.json()["queued_at"] is not None
+        client.post("/api/todos/bulk/", {"action": "start", "ids": [oldest.pk]}, content_type="application/json")
+        oldest.refresh_from_db()
+        assert oldest.queued_at == queued_at
+        assert oldest.updated_at > queued_at
+
+        item = client.get("/api/dashboard/").json()["todo_lists"][0]
+        assert item["oldest_queued_age"] >= 3600
+
+        # queued以外になれば消え、再開すると新しい時刻になる
+        oldest.status = Todo.Status.RUNNING
+        oldest.save(update_fields=["status", "updated_at"])
+        oldest.refresh_from_db()
+        assert oldest.queued_at is None
+        client.post("/api/todos/{}/start/".format(oldest.pk))
+        oldest.refresh_from_db()
+        assert oldest.queued_at > queued_at
+
+    def test_invalidated_by_update(self, client, todos):
+        """正常系: Todoが更新されるとTTL内でも再集計する"""
+        from todo.models import Todo
+
+        assert client.get("/api/dashboard/").json()["totals"]["counts"]["waiting"] == 1
+        Todo.objects.filter(status="queued").update(status="waiting")
+        assert client.get("/api/dashboard/").json()["totals"]["counts"]["waiting"] == 3
+
+
+class TestSearch:
+    """全文検索（GET /api/todos/?q=）のテスト"""
+
+    @pytest.fixture
+    def todos(self, db):
+        from todo.models import Todo, TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work")
+        return [
+            Todo.objects.create(todo_list=todo_list, title="ログイン画面の修正", prompt="バグを直す"),
+            Todo.objects.create(todo_list=todo_list, prompt="ログイン処理にリトライを追加", output="done"),
+            Todo.objects.create(todo_list=todo_list, prompt="README を更新", context="ログ出力の説明"),
+        ]
+
+    def search(self, client, q, **params):
+        return client.get("/api/todos/", {"q": q, **params}).json()["results"]
+
+    def test_ranked_with_snippet(self, client, todos):
+        """正常系: 一致したTodoを関連度順（タイトル優先）に抜粋付きで返す"""
+        results = self.search(client, "ログイン")
+        assert [r["id"] for r in results] == [todos[0].pk, todos[1].pk]
+        assert "【ログイン】" in results[0]["search_snippet"]
+
+    def test_terms(self, client, todos):
+        """正常系: 複数の語はAND、3文字未満の語はLIKEで絞り込む"""
+        assert [r["id"] for r in self.search(client, "ログイン リトライ")] == [todos[1].pk]
+        assert [r["id"] for r in self.search(client, "ログ 説明")] == [todos[2].pk]
+        assert {r["id"] for r in self.search(client, "ログ")} == {t.pk for t in todos}
+        assert self.search(client, '"OR" NEAR(') == []
+
+    def test_index_follows_updates(self, client, todos):
+        """正常系: save・QuerySet.update・deleteが索引に反映される"""
+        from todo.models import Todo
+
+        todos[2].title = "タイムアウトの調整"
+        todos[2].save()
+        assert [r["id"] for r in self.search(client, "タイムアウト")] == [todos[2].pk]
+
+        Todo.objects.filter(pk=todos[0].pk).update(prompt="キャッシュを追加")
+        assert [r["id"] for r in self.search(client, "キャッシュ")] == [todos[0].pk]
+
+        Todo.objects.filter(pk=todos[1].pk).delete()
+        assert [r["id"] for r in self.search(client, "ログイン")] == [todos[0].pk]
+
+    def test_pagination(self, client, todos):
+        """正常系: 関連度順でもカーソルで続きを取得できる"""
+        first = client.get("/api/todos/", {"q": "ログ", "limit": 2}).json()
+        second = client.get(first["next"]).json()
+        assert len(first["results"]) == 2 and len(second["results"]) == 1
+        assert {r["id"] for r in first["results"] + second["results"]} == {t.pk for t in todos}
+
+    def test_ensure_search_index(self, todos):
+        """正常系: 消えたトリガーを作り直して索引を再構築する"""
+        from django.db import connection
+
+        from todo.models import Todo
+        from todo.search import ensure_search_index, search_todos
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER todo_todo_fts_update")
+        Todo.objects.filter(pk=todos[2].pk).update(prompt="スケジューラの改善")
+        assert not search_todos(Todo.objects.all(), "スケジューラ").exists()
+
+        assert ensure_search_index() is True
+        assert ensure_search_index() is False
+        assert list(search_todos(Todo.objects.all(), "スケジューラ").values_list("id", flat=True)) == [todos[2].pk]
+
+
+class TestTodoAdminSearch:
+    """管理画面の検索のテスト"""
+
+    def test_search(self, admin_client, db):
+        """正常系: 管理画面の検索は全文検索を使う"""
+        from todo.models import Todo, TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work")
+        Todo.objects.create(todo_list=todo_list, prompt="ログイン処理の修正")
+        Todo.objects.create(todo_list=todo_list, prompt="README")
+        res = admin_client.get("/admin/todo/todo/", {"q": "ログイン"})
+        assert res.status_code == 200
+        assert res.context["cl"].result_count == 1
+
+
+class TestEvents:
+    """ステータス変更の通知（SSE）のテスト"""
+
+    @pytest.fixture
+    def todo_list(self, db):
+        from todo.models import TodoList
+
+        return TodoList.objects.create(workdir="/work")
+
+    def read_events(self, path):
+        import json
+
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_publish_on_save_and_delete(self, todo_list, events_path, django_capture_on_commit_callbacks):
+        """正常系: 保存・削除がコミット後に通知される"""
+        from todo.models import Todo
+
+        with django_capture_on_commit_callbacks(execute=True):
+            todo = Todo.objects.create(todo_list=todo_list, prompt="p")
+            todo.status = "queued"
+            todo.save()
+            pk = todo.pk
+            todo.delete()
+        assert [(e["id"], e["todo_list"], e["status"]) for e in self.read_events(events_path)] == [
+            (pk, todo_list.pk, "waiting"),
+            (pk, todo_list.pk, "queued"),
+            (pk, todo_list.pk, "deleted"),
+        ]
+
+    def test_publish_on_bulk(self, client, todo_list, events_path, django_capture_on_commit_callbacks):
+        """正常系: 一括操作（QuerySet.update）も通知される"""
+        from todo.models import Todo
+
+        todos = [Todo.objects.create(todo_list=todo_list, prompt="p") for _ in range(2)]
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(
+                "/api/todos/bulk/", {"action": "start", "ids": [t.pk for t in todos]}, content_type="application/json"
+            )
+        assert [(e["id"], e["status"]) for e in self.read_events(events_path)] == [(t.pk, "queued") for t in todos]
+
+    def test_reader(self, events_path, settings):
+        """正常系: 追記分だけを読み、Last-Event-IDから再開し、ローテーションに追従する"""
+        from todo.events import EventLogReader, _write
+
+        reader = EventLogReader(events_path)
+        assert reader.poll() == []
+        _write([{"id": 1}, {"id": 2}])
+        received = reader.poll()
+        assert [e["id"] for _, e in received] == [1, 2]
+        assert reader.poll() == []
+
+        _write([{"id": 3}])
+        resumed = EventLogReader(events_path, last_event_id=received[0][0])
+        assert [e["id"] for _, e in resumed.poll()] == [2, 3]
+        # 不明なIDは末尾から
+        assert EventLogReader(events_path, last_event_id="1-x").poll() == []
+
+        settings.TODO_EVENTS_MAX_BYTES = 1
+        _write([{"id": 4}])
+        settings.TODO_EVENTS_MAX_BYTES = 1024
+        _write([{"id": 5}])
+        assert [e["id"] for _, e in reader.poll()] == [3, 4, 5]
+
+    def test_stream(self, client, todo_list, events_path):
+        """正常系: SSEで送り、todo_listで絞り込む"""
+        import json
+
+        from todo.events import _write
+
+        res = client.get("/api/todolists/{}/events/".format(todo_list.pk))
+        assert res["Content-Type"] == "text/event-stream"
+        stream = iter(res.streaming_content)
+        assert next(stream).startswith(b"retry:")
+
+        _write([{"id": 1, "todo_list": todo_list.pk + 1}, {"id": 2, "todo_list": todo_list.pk, "status": "running"}])
+        chunk = next(stream).decode()
+        assert chunk.startswith("id: ") and "event: todo" in chunk
+        assert json.loads(chunk.split("data: ")[1]) == {"id": 2, "todo_list": todo_list.pk, "status": "running"}
+        res.close()
+
+    def test_stream_not_found(self, client, db):
+        """異常系: 存在しないTodoListは404"""
+        assert client.get("/api/todolists/999999/events/").status_code == 404
+
+
+class TestTodoListHierarchy:
+    """GET /api/todolists/ の一覧・tree のテスト"""
+
+    @pytest.fixture
+    def lists(self, db):
+        from todo.models import Todo, TodoList
+
+        repo = TodoList.objects.create(workdir="/repo", name="repo")
+        wt1 = TodoList.objects.create(workdir="/repo-wt/a", name="a", parent=repo)
+        wt2 = TodoList.objects.create(workdir="/repo-wt/b", name="b", parent=repo)
+        nested = TodoList.objects.create(workdir="/repo-wt/a/c", name="c", parent=wt1)
+        other = TodoList.objects.create(workdir="/other", name="other")
+        for todo_list, status in [(repo, "waiting"), (wt1, "running"), (wt1, "completed"), (nested, "running")]:
+            Todo.objects.create(todo_list=todo_list, prompt="p", status=status)
+        Todo.objects.create(todo_list=other, prompt="p", status="running")
+        return repo, wt1, wt2, nested, other
+
+    def test_list(self, client, lists, django_assert_num_queries):
+        """正常系: limitなしは全件の配列、parentは行ごとのクエリなしで返す"""
+        repo, wt1, wt2, nested, other = lists
+        # ETag用のバージョン + 一覧
+        with django_assert_num_queries(2):
+            res = client.get("/api/todolists/").json()
+        assert [item["id"] for item in res] == [t.pk for t in lists]
+        assert res[1]["parent"] == {"id": repo.pk, "name": "repo"}
+
+    def test_paginate_and_search(self, client, lists):
+        """正常系: limitを指定するとページングし、q・parentで絞り込める"""
+        repo, wt1, wt2, nested, other = lists
+        first = client.get("/api/todolists/", {"limit": 2}).json()
+        assert [item["id"] for item in first["results"]] == [repo.pk, wt1.pk]
+        second = client.get(first["next"]).json()
+        assert [item["id"] for item in second["results"]] == [wt2.pk, nested.pk]
+
+        assert [item["id"] for item in client.get("/api/todolists/", {"q": "repo-wt"}).json()] == [
+            wt1.pk,
+            wt2.pk,
+            nested.pk,
+        ]
+        assert [item["id"] for item in client.get("/api/todolists/", {"parent": "none"}).json()] == [repo.pk, other.pk]
+        assert [item["id"] for item in client.get("/api/todolists/", {"parent": wt1.pk}).json()] == [nested.pk]
+
+    def test_tree(self, client, lists, django_assert_num_queries):
+        """正常系: 子孫を含む木と件数の合計を1クエリで返す"""
+        repo, wt1, wt2, nested, other = lists
+        with django_assert_num_queries(1):
+            tree = client.get("/api/todolists/{}/tree/".format(repo.pk)).json()
+        assert tree["id"] == repo.pk and tree["depth"] == 0
+        assert tree["total"] == 1
+        assert tree["rollup"]["total"] == 4
+        assert tree["rollup"]["counts"]["running"] == 2
+        assert [child["id"] for child in tree["children"]] == [wt1.pk, wt2.pk]
+        a = tree["children"][0]
+        assert a["counts"]["completed"] == 1 and a["rollup"]["total"] == 3
+        assert [child["id"] for child in a["children"]] == [nested.pk]
+        assert tree["children"][1]["rollup"]["total"] == 0
+
+    def test_tree_cycle(self, client, lists):
+        """正常系: parentが循環していても終了する"""
+        from todo.models import TodoList
+
+        repo, wt1, *_ = lists
+        TodoList.objects.filter(pk=repo.pk).update(parent=wt1)
+        tree = client.get("/api/todolists/{}/tree/".format(repo.pk)).json()
+        assert tree["rollup"]["total"] == 4
+
+    def test_tree_not_found(self, client, db):
+        """異常系: 存在しないTodoListは404"""
+        assert client.get("/api/todolists/999999/tree/").status_code == 404
+
+
+class TestRenderers:
+    """orjsonのレンダラー・パーサーのテスト"""
+
+    def test_compatible_with_json_renderer(self):
+        """正常系: 標準のJSONRendererと同じJSONを返す"""
+        import datetime
+        import decimal
+        import json
+
+        from django.utils import timezone
+        from rest_framework.renderers import JSONRenderer
+
+        from todo.renderers import ORJSONRenderer
+
+        data = {
+            "at": datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+            "local": timezone.localtime(),
+            "price": decimal.Decimal("1.50"),
+            "text": "日本語\n\"quoted\"",
+            1: None,
+        }
+        expected = json.loads(JSONRenderer().render(data))
+        assert json.loads(ORJSONRenderer().render(data)) == expected
+        assert expected["at"] == "2026-01-02T03:04:05Z"
+        assert ORJSONRenderer().render(None) == b""
+        assert b"\n  " in ORJSONRenderer().render({"a": 1}, "application/json; indent=4")
+
+    def test_api(self, client, db):
+        """正常系・異常系: APIのJSONの読み書き、不正なJSONは400"""
+        from todo.models import TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work")
+        res = client.post(
+            "/api/todos/", {"todo_list": todo_list.pk, "prompt": "日本語のプロンプト"}, content_type="application/json"
+        )
+        assert res.status_code == 201
+        assert res["Content-Type"] == "application/json"
+        assert res.json()["prompt"] == "日本語のプロンプト"
+        assert client.post("/api/todos/", "{", content_type="application/json").status_code == 400
+
+
+class TestQueryPlans:
+    """主要なクエリの実行計画（bench_queries）のテスト"""
+
+    def test_no_full_scan(self, django_db_blocker, tmp_path):
+        """正常系: task_worker・一覧APIのクエリがインデックスを使う"""
+        import io
+
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        # テスト用DBではなく一時ファイルのDBを使う
+        with django_db_blocker.unblock():
+            call_command(
+                "bench_queries", todos=2000, todolists=20, repeat=1, path=str(tmp_path / "bench.sqlite3"), stdout=out
+            )
+        output = out.getvalue()
+        assert "USING INDEX todo_queue_idx" in output
+        assert "USING INDEX todo_queue_list_idx" in output
+        assert "全件スキャンはありません" in output
+
+    def test_is_rowid_order(self, db):
+        """正常系: 条件なしの主キー順だけをrowid順の走査として扱う"""
+        from todo.management.commands.bench_queries import is_rowid_order
+        from todo.models import Todo
+
+        assert is_rowid_order(Todo.objects.order_by("id")[:10])
+        assert not is_rowid_order(Todo.objects.order_by("id"))
+        assert not is_rowid_order(Todo.objects.filter(status="queued").order_by("id")[:10])
+        assert not is_rowid_order(Todo.objects.order_by("-created_at")[:10])
+
+
+class TestSQLiteSettings:
+    """SQLiteの接続設定（todo/sqlite.py）のテスト"""
+
+    def test_pragmas(self, django_db_blocker, tmp_path, settings):
+        """正常系: 新しい接続にsettingsのPRAGMAが設定される"""
+        from django.db import connections
+
+        settings.SQLITE_BUSY_TIMEOUT = 1234
+        connections.settings["pragmas"] = dict(
+            connections.settings["default"], NAME=str(tmp_path / "pragmas.sqlite3"), TEST={}
+        )
+        try:
+            with django_db_blocker.unblock(), connections["pragmas"].cursor() as cursor:
+                values = {}
+                for pragma in ["journal_mode", "busy_timeout", "synchronous", "mmap_size", "cache_size"]:
+                    cursor.execute("PRAGMA {}".format(pragma))
+                    values[pragma] = cursor.fetchone()[0]
+        finally:
+            connections["pragmas"].close()
+            del connections["pragmas"]
+            del connections.settings["pragmas"]
+        assert values == {
+            "journal_mode": "wal",
+            "busy_timeout": 1234,
+            "synchronous": 1,  # NORMAL
+            "mmap_size": settings.SQLITE_MMAP_SIZE,
+            "cache_size": settings.SQLITE_CACHE_SIZE,
+        }
+
+    def test_invalid_setting(self, settings):
+        """異常系: 不正なjournal_modeはImproperlyConfigured"""
+        from django.core.exceptions import ImproperlyConfigured
+
+        from todo.sqlite import pragmas
+
+        settings.SQLITE_JOURNAL_MODE = "wal; DROP TABLE todo_todo"
+        with pytest.raises(ImproperlyConfigured):
+            pragmas()
+
+    # 他のテストが起動したスレッドが残っているとforkで警告が出る（子プロセスはDBに書き込むだけ）
+    @pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+    def test_bench_sqlite(self, django_db_blocker):
+        """正常系: 同時書き込みのベンチマークが両方の設定の結果を表示する"""
+        import io
+
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        with django_db_blocker.unblock():
+            call_command("bench_sqlite", writers=2, duration=0.2, stdout=out)
+        output = out.getvalue()
+        assert "sqlite default" in output
+        assert "settings" in output
+
+
+class TestArchive:
+    """完了済みTodoのアーカイブ（todo/archive.py、archive_todos、?archived=1）のテスト"""
+
+    @pytest.fixture
+    def todos(self, db):
+        import datetime
+
+        from django.utils import timezone
+
+        from todo.models import Todo, TodoList
+
+        todo_list = TodoList.objects.create(workdir="/work")
+        old = timezone.now() - datetime.timedelta(days=40)
+        archived = [
+            Todo.objects.create(todo_list=todo_list, prompt="old {}".format(i), status=s, output="output archive")
+            for i, s in enumerate(["completed", "cancelled", "error", "timeout"])
+        ]
+        Todo.objects.filter(pk__in=[t.pk for t in archived[:3]]).update(finished_at=old, created_at=old)
+        # finished_at がなければ updated_at で判断する
+        Todo.objects.filter(pk=archived[3].pk).update(updated_at=old, created_at=old)
+        kept = [
+            Todo.objects.create(todo_list=todo_list, prompt="recent", status="completed", finished_at=timezone.now()),
+            Todo.objects.create(todo_list=todo_list, prompt="queued", status="queued"),
+        ]
+        # 未完了なら古くても残す
+        Todo.objects.filter(pk=kept[1].pk).update(updated_at=old, created_at=old)
+        return archived, kept
+
+    def test_archive_todos(self, todos):
+        """正常系: 終了から指定日数が経ったTodoだけを元のidと値のまま移す"""
+        from todo.archive import archive_todos
+        from todo.models import ArchivedTodo, Todo
+        from todo.search import search_todos
+
+        archived, kept = todos
+        assert archive_todos(30, batch_size=3) == 4
+        assert set(Todo.objects.values_list("pk", flat=True)) == {t.pk for t in kept}
+        rows = {t.pk: t for t in ArchivedTodo.objects.all()}
+        assert set(rows) == {t.pk for t in archived}
+        first = rows[archived[0].pk]
+        assert first.output == "output archive" and first.prompt == "old 0"
+        # created_at は元の値のまま
+        assert (first.archived_at - first.created_at).days >= 40
+        # 全文検索の索引からも消える
+        assert not search_todos(Todo.objects.all(), "archive").exists()
+        assert archive_todos(30) == 0
+
+    def test_max_batches(self, todos):
+        """正常系: max_batches でバッチ数を制限する"""
+        from todo.archive import archive_todos
+        from todo.models import ArchivedTodo
+
+        assert archive_todos(30, batch_size=3, max_batches=1) == 3
+        assert ArchivedTodo.objects.count() == 3
+
+    def test_command(self, todos):
+        """正常系: archive_todos コマンド（--dry-run では移さない）"""
+        import io
+
+        from django.core.management import call_command
+
+        from todo.models import ArchivedTodo
+
+        out = io.StringIO()
+        call_command("archive_todos", days=30, dry_run=True, stdout=out)
+        assert "4件" in out.getvalue()
+        assert ArchivedTodo.objects.count() == 0
+        call_command("archive_todos", days=30, batch_size=2, pause=0, stdout=out)
+        assert ArchivedTodo.objects.count() == 4
+
+    def test_worker_policy(self, todos, settings):
+        """正常系: TODO_ARCHIVE_DAYS を設定するとtask_workerが1ループに1バッチずつアーカイブする"""
+        import io
+
+        from todo.management.commands.task_worker import Command
+        from todo.models import ArchivedTodo
+
+        command = Command(stdout=io.StringIO())
+        command.next_archive_at = 0.0
+        command.archive_finished()
+        assert ArchivedTodo.objects.count() == 0
+
+        settings.TODO_ARCHIVE_DAYS = 30
+        settings.TODO_ARCHIVE_BATCH_SIZE = 3
+        command.archive_finished()
+        assert ArchivedTodo.objects.count() == 3
+        assert command.next_archive_at == 0.0
+        command.archive_finished()
+        assert ArchivedTodo.objects.count() == 4
+        assert command.next_archive_at > 0
+
+    def test_api(self, client, todos, settings):
+        """正常系・異常系: ?archived=1 で一覧・詳細を読める（更新・検索はできない）"""
+        from todo.archive import archive_todos
+
+        archived, kept = todos
+        archive_todos(30)
+        pk = archived[0].pk
+
+        ids = [t["id"] for t in client.get("/api/todos/?archived=1").json()["results"]]
+        assert ids == sorted(t.pk for t in archived)
+        ids = [t["id"] for t in client.get("/api/todos/?archived=1&status=error").json()["results"]]
+        assert ids == [archived[2].pk]
+        assert pk not in [t["id"] for t in client.get("/api/todos/").json()["results"]]
+
+        res = client.get("/api/todos/{}/?archived=1".format(pk))
+        assert res.status_code == 200
+        assert res.json()["output"] == "output archive"
+        assert res["Cache-Control"] == "private, max-age={}".format(settings.TODO_ARCHIVED_MAX_AGE)
+        assert client.get("/api/todos/{}/".format(pk)).status_code == 404
+        assert client.post("/api/todos/{}/start/?archived=1".format(pk)).status_code == 404
+        assert client.get("/api/todos/?archived=1&q=archive").status_code == 400
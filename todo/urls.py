@@ -1,13 +1,26 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'todos', views.TodoViewSet, basename='todo')
 router.register(r'todolists', views.TodoListViewSet, basename='todolist')
 router.register(r'agents', views.AgentViewSet, basename='agent')
 router.register(r'extensions', views.ExtensionViewSet, basename='extension')
+router.register(r'dashboard', views.DashboardViewSet, basename='dashboard')
 
 urlpatterns = [
+    # ルーターの todos/{pk}/ より前に登録する
+    path('todos/events/', views.todo_events),
+    path('todolists/<int:pk>/events/', views.todolist_events),
+    # gitを実行するアクション（非同期ビュー）
+    path('todolists/<int:pk>/worktrees/', async_views.todolist_worktrees),
+    path('todolists/<int:pk>/worktrees/add/', async_views.todolist_add_worktree),
+    path('todolists/<int:pk>/worktrees/<str:name>/', async_views.todolist_remove_worktree),
+    path('todolists/<int:pk>/branches/', async_views.todolist_branches),
+    path('todolists/<int:pk>/create_branch/', async_views.todolist_create_branch),
+    path('todos/<int:pk>/worktrees/', async_views.todo_worktrees),
+    path('todos/<int:pk>/branches/', async_views.todo_branches),
+    path('todos/<int:pk>/create_branch/', async_views.todo_create_branch),
     path('', include(router.urls)),
 ]
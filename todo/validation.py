@@ -0,0 +1,65 @@
+"""
+validation_commandの実行
+
+エージェント終了後に、Todoのvalidation_commandをrunner側で実行して完了判定する。
+結果は (コマンド, treeハッシュ) をキーにValidationResultへキャッシュし、
+同じtreeに対して同じコマンドを二度実行しない。
+"""
+
+import os
+import signal
+import subprocess
+import time
+
+from todo import git_utils
+from todo.models import ValidationStatus
+
+
+def get_clean_tree(workdir: str) -> str | None:
+    """作業ツリーがHEADと一致していればHEADのtreeハッシュを返す
+
+    未コミットの変更・未追跡ファイルがある場合はtreeハッシュが作業ツリーを表さないのでNone
+    """
+    snapshot = git_utils.status_snapshot(workdir)
+    if snapshot.changed or snapshot.staged or snapshot.unmerged:
+        return None
+    return git_utils.tree_of(workdir, git_utils.resolve_head(workdir))
+
+
+def run_validation_command(command: str, workdir: str, timeout: int, log_path: str) -> tuple[str, float]:
+    """validation_commandをシェルで実行し、出力（stdout/stderr）をlog_pathに書き出す
+
+    タイムアウト時はプロセスグループごと停止する
+
+    Returns:
+        (ValidationStatus, 実行時間（秒）)
+    """
+    start = time.monotonic()
+    with open(log_path, "wb") as log:
+        try:
+            process = subprocess.Popen(
+                command,
+                shell=True,
+                cwd=workdir,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except OSError as e:
+            log.write(str(e).encode())
+            return ValidationStatus.ERROR, time.monotonic() - start
+
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.wait()
+            status = ValidationStatus.TIMEOUT
+        else:
+            status = ValidationStatus.PASSED if returncode == 0 else ValidationStatus.FAILED
+
+    return status, time.monotonic() - start